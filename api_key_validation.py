@@ -0,0 +1,147 @@
+# Fast API key validation shared by every Streamlit session
+# Uses each provider's model-listing endpoint as a probe instead of a full completion,
+# checks both providers in parallel, and caches results by key fingerprint
+
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_clients import key_fingerprint
+
+
+GROQ_MODELS_URL = "https://api.groq.com/openai/v1/models"
+GOOGLE_MODELS_URL = "https://generativelanguage.googleapis.com/v1beta/models?pageSize=1"
+
+PROBE_TIMEOUT_SECONDS = 5
+VALIDATION_TTL_SECONDS = 10 * 60
+UNREACHABLE_TTL_SECONDS = 30
+
+_results = {}
+_in_flight = {}
+_lock = threading.Lock()
+# Probes run on their own pool so a check waiting on its two probes can never starve them
+_probe_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="api-key-probe")
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="api-key-validation")
+
+
+def _probe(url, headers, timeout, rejected_statuses):
+    """GET url and classify the key: True (valid), False (rejected) or None (couldn't tell)"""
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return 200 <= response.status < 300
+    except urllib.error.HTTPError as e:
+        return False if e.code in rejected_statuses else None
+    except (urllib.error.URLError, OSError):
+        return None
+
+
+def probe_groq(api_key, timeout=PROBE_TIMEOUT_SECONDS):
+    """Check a Groq key by listing models (no tokens are spent)"""
+    return _probe(
+        GROQ_MODELS_URL,
+        {"Authorization": f"Bearer {api_key}"},
+        timeout,
+        rejected_statuses=(401, 403)
+    )
+
+
+def probe_google(api_key, timeout=PROBE_TIMEOUT_SECONDS):
+    """Check a Gemini key by listing models (no tokens are spent)"""
+    return _probe(
+        GOOGLE_MODELS_URL,
+        {"x-goog-api-key": api_key},
+        timeout,
+        rejected_statuses=(400, 401, 403)
+    )
+
+
+PROBES = {"groq": probe_groq, "google": probe_google}
+
+
+def _cached(provider, api_key):
+    """Return the unexpired (result,) entry for a key, or None on a miss; caller must hold _lock"""
+    entry = _results.get((provider, key_fingerprint(api_key)))
+    if entry is not None and entry[1] > time.monotonic():
+        return (entry[0],)
+    return None
+
+
+def _check(provider, api_key, timeout):
+    """Probe one key: True (valid), False (rejected) or None (provider unreachable).
+
+    Unreachable results are cached only briefly so a flaky network is retried soon.
+    """
+    if not api_key:
+        return False
+    with _lock:
+        cached = _cached(provider, api_key)
+    if cached is not None:
+        return cached[0]
+
+    result = PROBES[provider](api_key, timeout)
+    ttl = VALIDATION_TTL_SECONDS if result is not None else UNREACHABLE_TTL_SECONDS
+    with _lock:
+        _results[(provider, key_fingerprint(api_key))] = (result, time.monotonic() + ttl)
+    return result
+
+
+def validate_api_keys(groq_key, google_key, timeout=PROBE_TIMEOUT_SECONDS):
+    """Validate both keys concurrently.
+
+    Returns {"groq": ..., "google": ...} where each value is True (valid),
+    False (rejected or missing) or None (the provider could not be reached).
+    """
+    return start_validation(groq_key, google_key, timeout).result()
+
+
+def start_validation(groq_key, google_key, timeout=PROBE_TIMEOUT_SECONDS):
+    """Begin validating in the background and return a Future of the results dict.
+
+    Concurrent callers asking about the same pair of keys share one in-flight check.
+    """
+    pair = (key_fingerprint(groq_key), key_fingerprint(google_key))
+    with _lock:
+        future = _in_flight.get(pair)
+        if future is not None:
+            return future
+
+        groq_future = _probe_executor.submit(_check, "groq", groq_key, timeout)
+        google_future = _probe_executor.submit(_check, "google", google_key, timeout)
+        future = _executor.submit(
+            lambda: {"groq": groq_future.result(), "google": google_future.result()}
+        )
+        _in_flight[pair] = future
+
+    future.add_done_callback(lambda _: _forget_in_flight(pair))
+    return future
+
+
+def _forget_in_flight(pair):
+    with _lock:
+        _in_flight.pop(pair, None)
+
+
+def cached_results(groq_key, google_key):
+    """Return the cached results dict if both keys have an unexpired answer, else None"""
+    results = {}
+    with _lock:
+        for provider, api_key in (("groq", groq_key), ("google", google_key)):
+            if not api_key:
+                results[provider] = False
+                continue
+            cached = _cached(provider, api_key)
+            if cached is None:
+                return None
+            results[provider] = cached[0]
+    return results
+
+
+def invalidate(*api_keys):
+    """Forget cached answers for the given keys so the next check probes again"""
+    with _lock:
+        for api_key in api_keys:
+            for provider in PROBES:
+                _results.pop((provider, key_fingerprint(api_key)), None)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Batch Travel Planner
+Plans trips from a JSONL file of requests with a worker pool and streams results to JSONL.
+
+Each input line is a JSON object such as:
+    {"id": "jp-7", "destination": "Japan", "duration": 7}
+
+Completed request IDs are appended to a checkpoint file, so re-running the same
+command after a crash skips everything that already finished. Failed requests
+are not checkpointed and are retried on the next run.
+
+Usage:
+    python batch_plan.py requests.jsonl results.jsonl --workers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Add the current directory to Python path to import main
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import TravelPlanner
+from llm_cache import DEFAULT_CACHE_PATH
+
+
+def load_checkpoint(checkpoint_path):
+    """Load the set of request IDs that completed in earlier runs"""
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, 'r') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def read_requests(input_path, done_ids):
+    """Stream (request_id, request) pairs from the input file, skipping checkpointed IDs"""
+    with open(input_path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Warning: Skipping invalid JSON on line {line_number}: {e}")
+                continue
+
+            # Fall back to the line number so requests without an ID can still be resumed
+            request_id = str(request.get("id", line_number))
+            if request_id not in done_ids:
+                yield request_id, request
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class BatchPlanner:
+    """Runs plan_trip for a stream of requests on a thread pool, one TravelPlanner per worker"""
+
+    def __init__(self, workers=4, preferences_file="user_preferences.json", use_cache=True, pipelined=False,
+                 cache_path=DEFAULT_CACHE_PATH):
+        self.workers = workers
+        self.preferences_file = preferences_file
+        self.cache_path = cache_path
+        self.use_cache = use_cache
+        self.pipelined = pipelined
+        self._local = threading.local()
+
+    def _planner(self):
+        """Per-thread TravelPlanner so workers never share session memory"""
+        if not hasattr(self._local, "planner"):
+            self._local.planner = TravelPlanner(
+                preferences_file=self.preferences_file, cache_path=self.cache_path, verbose=False
+            )
+        return self._local.planner
+
+    def plan(self, request_id, request):
+        """Plan one request and return the output record"""
+        start = time.perf_counter()
+        record = {
+            "id": request_id,
+            "destination": request.get("destination"),
+            "duration": request.get("duration")
+        }
+        try:
+            destination = str(request["destination"]).strip()
+            duration = int(request["duration"])
+            if not destination or duration <= 0:
+                raise ValueError("destination must be non-empty and duration positive")
+
+            planner = self._planner()
+            # Every request is planned independently of the ones before it on this worker
+            planner.memory.clear()
+            record["result"] = planner.plan_trip(
+                destination, duration, use_cache=self.use_cache, pipelined=self.pipelined
+            )
+            record["status"] = "ok"
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["latency_s"] = round(time.perf_counter() - start, 3)
+        return record
+
+    def run(self, input_path, output_path, checkpoint_path):
+        """Plan every pending request, returning the collected statistics"""
+        done_ids = load_checkpoint(checkpoint_path)
+        if done_ids:
+            print(f"↩️ Resuming: {len(done_ids)} requests already completed")
+
+        latencies = []
+        succeeded = 0
+        failed = 0
+        start = time.perf_counter()
+        max_in_flight = self.workers * 2
+
+        with open(output_path, 'a') as output, open(checkpoint_path, 'a') as checkpoint, \
+                ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+
+            def drain(return_when):
+                nonlocal pending, succeeded, failed
+                finished, pending = wait(pending, return_when=return_when)
+                for future in finished:
+                    record = future.result()
+                    output.write(json.dumps(record) + "\n")
+                    output.flush()
+                    latencies.append(record["latency_s"])
+                    if record["status"] == "ok":
+                        succeeded += 1
+                        checkpoint.write(record["id"] + "\n")
+                        checkpoint.flush()
+                    else:
+                        failed += 1
+                        print(f"❌ {record['id']}: {record['error']}")
+
+                    completed = succeeded + failed
+                    if completed % 10 == 0:
+                        print(f"📦 {completed} requests processed ({failed} failed)")
+
+            # Keep a bounded number of requests in flight so huge input files stream through
+            for request_id, request in read_requests(input_path, done_ids):
+                pending.add(pool.submit(self.plan, request_id, request))
+                if len(pending) >= max_in_flight:
+                    drain(FIRST_COMPLETED)
+            while pending:
+                drain(FIRST_COMPLETED)
+
+        elapsed = time.perf_counter() - start
+        total = succeeded + failed
+        return {
+            "total": total,
+            "succeeded": succeeded,
+            "failed": failed,
+            "error_rate": failed / total if total else 0.0,
+            "elapsed_s": elapsed,
+            "throughput_per_min": total / elapsed * 60 if elapsed > 0 else 0.0,
+            "latency_p50_s": percentile(latencies, 50),
+            "latency_p90_s": percentile(latencies, 90),
+            "latency_p99_s": percentile(latencies, 99)
+        }
+
+
+def print_summary(stats):
+    """Print the end-of-run report"""
+    print("\n" + "=" * 60)
+    print("📊 BATCH SUMMARY")
+    print("=" * 60)
+    print(f"Requests:    {stats['total']} ({stats['succeeded']} succeeded, {stats['failed']} failed)")
+    print(f"Error rate:  {stats['error_rate']:.1%}")
+    print(f"Elapsed:     {stats['elapsed_s']:.1f}s")
+    print(f"Throughput:  {stats['throughput_per_min']:.1f} plans/min")
+    print(f"Latency:     p50 {stats['latency_p50_s']:.2f}s | "
+          f"p90 {stats['latency_p90_s']:.2f}s | p99 {stats['latency_p99_s']:.2f}s")
+
+
+def main():
+    """Parse arguments and run the batch"""
+    parser = argparse.ArgumentParser(description="Plan many trips from a JSONL file of requests")
+    parser.add_argument("input", help="JSONL file with one trip request per line")
+    parser.add_argument("output", help="JSONL file that results are appended to")
+    parser.add_argument("--workers", type=int, default=4, help="Number of trips planned concurrently")
+    parser.add_argument("--checkpoint", help="Checkpoint file of completed IDs (default: <output>.checkpoint)")
+    parser.add_argument("--preferences-file", default="user_preferences.json",
+                        help="Preferences applied to every plan")
+    parser.add_argument("--no-cache", action="store_true", help="Force fresh completions for every stage")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="Overlap the itinerary and packing stages")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+
+    print(f"🚀 Planning trips from {args.input} with {args.workers} workers...")
+    runner = BatchPlanner(
+        workers=args.workers,
+        preferences_file=args.preferences_file,
+        use_cache=not args.no_cache,
+        pipelined=args.pipelined
+    )
+    try:
+        stats = runner.run(args.input, args.output, checkpoint_path)
+    except KeyboardInterrupt:
+        print(f"\n🛑 Interrupted. Re-run the same command to resume from {checkpoint_path}")
+        return 1
+
+    print_summary(stats)
+    return 0 if stats["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Fake LLMs for offline benchmarking
+Deterministic stand-ins for ChatGroq and Gemini with configurable latency
+distributions, output sizes and failure rates. They plug into any generator
+through its llm= argument, so the real prompts, chains, caching and pipeline
+code all run unchanged without network access.
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import PrivateAttr
+
+
+# Vocabulary for generated itinerary text; includes activity words so downstream
+# stages see realistic content
+FILLER_WORDS = (
+    "morning visit museum lunch local restaurant afternoon walk old town hike trail "
+    "beach swim evening dinner market temple garden train bus taxi ticket cost "
+    "sunset viewpoint cafe gallery park boat tour shopping street food castle"
+).split()
+
+
+class FakeLLMError(RuntimeError):
+    """Simulated provider failure, shaped like a retryable HTTP 503"""
+
+    status_code = 503
+
+
+class FakeLatencyLLM(LLM):
+    """Offline LLM whose latency, output length and failure rate are configurable.
+
+    latency_distribution is "fixed", "uniform" (mean +/- jitter) or "lognormal"
+    (median latency_mean, shape latency_sigma). prefill_seconds_per_1k_tokens adds
+    time proportional to the prompt length (about 4 characters per token). When
+    streaming, ttft_fraction of the latency passes before the first token and the
+    rest is spread over tokens.
+    """
+
+    name_tag: str = "fake"
+    latency_mean: float = 0.5
+    latency_distribution: str = "fixed"
+    latency_jitter: float = 0.1
+    latency_sigma: float = 0.5
+    ttft_fraction: float = 0.2
+    output_tokens: int = 200
+    failure_rate: float = 0.0
+    prefill_seconds_per_1k_tokens: float = 0.0
+    seed: int = 0
+
+    _rng: Any = PrivateAttr(default=None)
+    _rng_lock: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def _llm_type(self):
+        return f"fake-latency-{self.name_tag}"
+
+    def _sample(self, prompt=""):
+        """Draw (latency, fails) for one call"""
+        with self._rng_lock:
+            if self.latency_distribution == "uniform":
+                latency = self._rng.uniform(self.latency_mean - self.latency_jitter,
+                                            self.latency_mean + self.latency_jitter)
+            elif self.latency_distribution == "lognormal":
+                latency = self._rng.lognormvariate(0, self.latency_sigma) * self.latency_mean
+            else:
+                latency = self.latency_mean
+            fails = self._rng.random() < self.failure_rate
+        latency += len(prompt) / 4 / 1000 * self.prefill_seconds_per_1k_tokens
+        return max(0.0, latency), fails
+
+    def _reply(self, prompt):
+        """Deterministic completion shaped like what each stage expects"""
+        duration = re.search(r"Trip Duration:\s*(\d+)\s*days", prompt)
+        if duration and "Day-by-day Outline:" in prompt:
+            days = int(duration.group(1))
+            per_day = max(3, self.output_tokens // max(days, 1))
+            return "\n".join(
+                f"Day {day}: " + " ".join(FILLER_WORDS[(day + i) % len(FILLER_WORDS)] for i in range(per_day))
+                for day in range(1, days + 1)
+            )
+
+        offset = len(prompt) % len(FILLER_WORDS)
+        return " ".join(FILLER_WORDS[(offset + i) % len(FILLER_WORDS)] for i in range(self.output_tokens))
+
+    def _call(self, prompt: str, stop: Optional[list] = None, run_manager=None, **kwargs):
+        latency, fails = self._sample(prompt)
+        time.sleep(latency)
+        if fails:
+            raise FakeLLMError(f"{self.name_tag}: simulated provider failure")
+        return self._reply(prompt)
+
+    async def _acall(self, prompt: str, stop: Optional[list] = None, run_manager=None, **kwargs):
+        latency, fails = self._sample(prompt)
+        await asyncio.sleep(latency)
+        if fails:
+            raise FakeLLMError(f"{self.name_tag}: simulated provider failure")
+        return self._reply(prompt)
+
+    def _stream(self, prompt: str, stop: Optional[list] = None, run_manager=None, **kwargs):
+        latency, fails = self._sample(prompt)
+        time.sleep(latency * self.ttft_fraction)
+        if fails:
+            raise FakeLLMError(f"{self.name_tag}: simulated provider failure")
+
+        tokens = self._reply(prompt).split(" ")
+        delay = latency * (1 - self.ttft_fraction) / max(len(tokens), 1)
+        for index, token in enumerate(tokens):
+            if index:
+                time.sleep(delay)
+            chunk = GenerationChunk(text=token if index == 0 else " " + token)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def groq_like(**overrides):
+    """Fast provider profile, roughly shaped like llama-3.1-8b-instant on Groq"""
+    settings = {"name_tag": "groq", "latency_mean": 0.4, "output_tokens": 150}
+    settings.update(overrides)
+    return FakeLatencyLLM(**settings)
+
+
+def gemini_like(**overrides):
+    """Slower, longer-output provider profile, roughly shaped like gemini-1.5-flash"""
+    settings = {"name_tag": "gemini", "latency_mean": 1.2, "output_tokens": 400}
+    settings.update(overrides)
+    return FakeLatencyLLM(**settings)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Packing Prompt Benchmark
+Compares the packing stage fed the full detailed itinerary and chat history with the
+compact prompt built from locally extracted activity/environment tags. Itineraries
+come from the real pipeline running on fake LLMs (see fake_llms.py), whose latency
+grows with prompt length, so the prompt-token savings show up as packing latency.
+
+Usage:
+    python benchmarks/packing_prompt_benchmark.py --trips 12 --prefill-ms-per-token 0.5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_llms import groq_like, gemini_like
+from main import (
+    TravelPlanner, OutlineGenerator, DetailedItineraryGenerator, PackingChecklistGenerator, approximate_token_ids
+)
+from packing_features import extract_packing_features, format_packing_features
+
+DESTINATIONS = ["Japan", "Peru", "Iceland", "Morocco", "Italy", "Vietnam", "Kenya", "Norway"]
+DURATIONS = [3, 5, 7, 10]
+
+
+def sample_trips(args, workdir):
+    """Plan trips on zero-latency fakes, keeping one session so chat history builds up as in the app"""
+    planner = TravelPlanner(preferences_file=os.path.join(workdir, "prefs.json"), cache_path=None,
+                            checkpoint_path=None, verbose=False)
+    groq = groq_like(latency_mean=0, output_tokens=args.output_tokens)
+    gemini = gemini_like(latency_mean=0, output_tokens=args.output_tokens * 2)
+    planner.outline_generator = OutlineGenerator(llm=groq)
+    planner.detailed_generator = DetailedItineraryGenerator(llm=gemini)
+    planner.packing_generator = PackingChecklistGenerator(llm=groq)
+
+    trips = []
+    for i in range(args.trips):
+        destination = DESTINATIONS[i % len(DESTINATIONS)]
+        _, chat_history = planner._planning_context()
+        result = planner.plan_trip(destination, DURATIONS[i % len(DURATIONS)])
+        trips.append((destination, result["detailed_itinerary"], chat_history))
+    return trips
+
+
+def measure(trips, args):
+    """Prompt tokens and packing-stage latency for the full and compact prompts"""
+    # Milliseconds per token and seconds per 1,000 tokens are the same number
+    llm = groq_like(latency_mean=args.base_latency, prefill_seconds_per_1k_tokens=args.prefill_ms_per_token)
+    generator = PackingChecklistGenerator(llm=llm)
+    rows = {"full": [], "compact": []}
+    extraction_times = []
+
+    for destination, itinerary, chat_history in trips:
+        full_prompt = generator.prompt_template.format(
+            itinerary=itinerary, destination=destination, chat_history=chat_history
+        )
+        start = time.perf_counter()
+        generator.generate_packing_checklist(itinerary, destination, chat_history, use_cache=False)
+        rows["full"].append((len(approximate_token_ids(full_prompt)), time.perf_counter() - start))
+
+        start = time.perf_counter()
+        trip_features = format_packing_features(extract_packing_features(itinerary))
+        extraction_times.append(time.perf_counter() - start)
+        compact_prompt = generator.features_prompt_template.format(
+            trip_features=trip_features, destination=destination
+        )
+        start = time.perf_counter()
+        generator.generate_packing_checklist_from_features(itinerary, destination, use_cache=False)
+        rows["compact"].append((len(approximate_token_ids(compact_prompt)), time.perf_counter() - start))
+
+    return rows, extraction_times
+
+
+def main():
+    """Parse arguments, run both variants and print the comparison"""
+    parser = argparse.ArgumentParser(description="Compare full and feature-extracted packing prompts")
+    parser.add_argument("--trips", type=int, default=12, help="Number of sample trips")
+    parser.add_argument("--output-tokens", type=int, default=150, help="Words per fake Groq completion")
+    parser.add_argument("--base-latency", type=float, default=0.05, help="Packing model latency excluding prompt")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.5,
+                        help="Extra packing latency per prompt token, in milliseconds")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        trips = sample_trips(args, workdir)
+    rows, extraction_times = measure(trips, args)
+
+    print(f"🎒 Packing prompt benchmark: {len(trips)} trips of {min(DURATIONS)}-{max(DURATIONS)} days")
+    print("=" * 60)
+    print(f"{'prompt':<10}{'mean tokens':>14}{'max tokens':>13}{'p50 latency s':>17}")
+    for name, values in rows.items():
+        tokens = [value[0] for value in values]
+        latencies = [value[1] for value in values]
+        print(f"{name:<10}{statistics.mean(tokens):>14.0f}{max(tokens):>13}{statistics.median(latencies):>17.3f}")
+    print("=" * 60)
+
+    full_tokens = sum(value[0] for value in rows["full"])
+    compact_tokens = sum(value[0] for value in rows["compact"])
+    full_latency = statistics.median(value[1] for value in rows["full"])
+    compact_latency = statistics.median(value[1] for value in rows["compact"])
+    print(f"Prompt tokens saved: {1 - compact_tokens / full_tokens:.0%}")
+    print(f"Packing latency saved (p50): {1 - compact_latency / full_latency:.0%}")
+    print(f"Local extraction: {statistics.mean(extraction_times) * 1000:.2f} ms per itinerary")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+plan_trip Benchmark
+Runs the full planning pipeline offline against fake LLMs with injected latency
+(see fake_llms.py) and reports latency percentiles, throughput and peak memory for
+the sequential (plan_trip), concurrent (aplan_many) and streaming (plan_trip_stream)
+paths. The response cache is disabled so every run exercises every stage. A final
+check plans one trip twice on a cached planner and fails if the repeat calls a model.
+
+Usage:
+    python benchmarks/plan_trip_benchmark.py --trips 20 --concurrency 8
+    python benchmarks/plan_trip_benchmark.py --distribution lognormal --failure-rate 0.05 --json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from batch_plan import percentile
+from fake_llms import groq_like, gemini_like
+from main import TravelPlanner, OutlineGenerator, DetailedItineraryGenerator, PackingChecklistGenerator
+from resilience import ResilientCaller, STAGE_DEADLINES
+
+DESTINATIONS = ["Japan", "Peru", "Iceland", "Morocco", "Italy", "Vietnam", "Kenya", "Norway"]
+PATHS = ("sequential", "concurrent", "streaming")
+
+
+def build_planner(args, workdir, cache_path=None):
+    """TravelPlanner wired to fake Groq- and Gemini-like models, with caching (by default) and checkpoints disabled"""
+    planner = TravelPlanner(
+        preferences_file=os.path.join(workdir, "prefs.json"),
+        cache_path=cache_path,
+        checkpoint_path=None,
+        day_concurrency=args.day_concurrency or None,
+        verbose=False
+    )
+    shared = {
+        "latency_distribution": args.distribution,
+        "failure_rate": args.failure_rate,
+        "seed": args.seed
+    }
+    groq = groq_like(latency_mean=args.groq_latency, output_tokens=args.output_tokens, **shared)
+    gemini = gemini_like(latency_mean=args.gemini_latency, output_tokens=args.output_tokens * 2, **shared)
+
+    def resilience(stage):
+        return ResilientCaller(
+            deadline=STAGE_DEADLINES[stage], max_attempts=args.max_attempts, hedge=args.hedge,
+            base_delay=args.retry_delay
+        )
+
+    # Each fake doubles as the other stage's hedging backup, as the real providers do
+    planner.outline_generator = OutlineGenerator(
+        cache=planner.cache, llm=groq, backup_llm=gemini, resilience=resilience("outline")
+    )
+    planner.detailed_generator = DetailedItineraryGenerator(
+        cache=planner.cache, llm=gemini, backup_llm=groq, resilience=resilience("detailed_itinerary")
+    )
+    planner.packing_generator = PackingChecklistGenerator(
+        cache=planner.cache, llm=groq, backup_llm=gemini, resilience=resilience("packing_checklist")
+    )
+    # Build chains and memory up front so lazy imports are not counted against the first path
+    for generator in (planner.outline_generator, planner.detailed_generator, planner.packing_generator):
+        generator.chain
+    planner.memory
+    return planner
+
+
+def trip_requests(args):
+    """The same deterministic list of trips for every path"""
+    return [
+        {"destination": DESTINATIONS[i % len(DESTINATIONS)], "duration": args.duration}
+        for i in range(args.trips)
+    ]
+
+
+def run_sequential(planner, requests, args):
+    """plan_trip one trip at a time; returns (latencies, errors, extras)"""
+    latencies, errors = [], 0
+    for request in requests:
+        # Keep prompt sizes comparable across runs instead of letting chat history grow
+        planner.memory.clear()
+        start = time.perf_counter()
+        try:
+            planner.plan_trip(request["destination"], request["duration"], pipelined=args.pipelined)
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors += 1
+    return latencies, errors, {}
+
+
+def run_concurrent(planner, requests, args):
+    """aplan_many on one event loop; per-trip latency is measured inside the loop"""
+    latencies = []
+
+    async def timed(destination, duration):
+        start = time.perf_counter()
+        result = await original(destination, duration, use_cache=True, pipelined=args.pipelined)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    # Time each trip without changing aplan_many itself
+    original = planner.aplan_trip
+    planner.aplan_trip = lambda destination, duration, **options: timed(destination, duration)
+    try:
+        results = asyncio.run(planner.aplan_many(
+            requests, max_concurrency=args.concurrency, return_exceptions=True, pipelined=args.pipelined
+        ))
+    finally:
+        del planner.aplan_trip
+    errors = sum(1 for result in results if isinstance(result, Exception))
+    return latencies, errors, {}
+
+
+def run_streaming(planner, requests, args):
+    """plan_trip_stream one trip at a time, also tracking time to the first token"""
+    latencies, first_tokens, errors = [], [], 0
+    for request in requests:
+        planner.memory.clear()
+        start = time.perf_counter()
+        first_token = None
+        try:
+            for event in planner.plan_trip_stream(request["destination"], request["duration"]):
+                if first_token is None and event["type"] == "token":
+                    first_token = time.perf_counter() - start
+            latencies.append(time.perf_counter() - start)
+            first_tokens.append(first_token)
+        except Exception:
+            errors += 1
+    return latencies, errors, {"first_tokens": first_tokens}
+
+
+RUNNERS = {"sequential": run_sequential, "concurrent": run_concurrent, "streaming": run_streaming}
+
+
+def measure(path, args, workdir):
+    """Run one path on a fresh planner and collect its statistics"""
+    planner = build_planner(args, workdir)
+    requests = trip_requests(args)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    latencies, errors, extras = RUNNERS[path](planner, requests, args)
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = {
+        "path": path,
+        "trips": len(requests),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_per_min": round(len(latencies) / wall * 60, 2) if wall else 0.0,
+        "peak_traced_mb": round(peak / 1e6, 2)
+    }
+    for pct in (50, 90, 99):
+        stats[f"p{pct}_s"] = round(percentile(latencies, pct), 3)
+    if extras.get("first_tokens"):
+        stats["p50_first_token_s"] = round(percentile(extras["first_tokens"], 50), 3)
+    return stats
+
+
+def check_repeat_hits_cache(args, workdir):
+    """Model calls made by a repeated, identical plan_trip on one cached planner (should be 0).
+
+    Chat history is kept, as in the app, so the check covers the history growing between plans.
+    """
+    planner = build_planner(args, workdir, cache_path=os.path.join(workdir, "cache.sqlite3"))
+    request = trip_requests(args)[0]
+    planner.plan_trip(request["destination"], request["duration"], pipelined=args.pipelined)
+    misses = planner.cache.misses
+    planner.plan_trip(request["destination"], request["duration"], pipelined=args.pipelined)
+    return planner.cache.misses - misses
+
+
+def print_report(results, args):
+    """Print a table of the collected statistics"""
+    print(f"🧪 plan_trip benchmark: {args.trips} trips of {args.duration} days, "
+          f"{args.distribution} latency (groq {args.groq_latency}s, gemini {args.gemini_latency}s), "
+          f"failure rate {args.failure_rate:.0%}, {args.max_attempts} attempts"
+          f"{', hedged' if args.hedge else ''}")
+    print("=" * 86)
+    print(f"{'path':<12}{'ok':>5}{'err':>5}{'p50 s':>9}{'p90 s':>9}{'p99 s':>9}"
+          f"{'trips/min':>11}{'peak MB':>10}{'first tok s':>13}")
+    for stats in results:
+        first_token = stats.get("p50_first_token_s")
+        print(f"{stats['path']:<12}{stats['trips'] - stats['errors']:>5}{stats['errors']:>5}"
+              f"{stats['p50_s']:>9.3f}{stats['p90_s']:>9.3f}{stats['p99_s']:>9.3f}"
+              f"{stats['throughput_per_min']:>11.1f}{stats['peak_traced_mb']:>10.2f}"
+              f"{first_token if first_token is not None else '-':>13}")
+    print("=" * 86)
+    if resource is None:
+        return
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss_mb = max_rss / 1e6 if sys.platform == "darwin" else max_rss / 1e3
+    print(f"Process max RSS: {max_rss_mb:.1f} MB")
+
+
+def main():
+    """Parse arguments, run the selected paths and report"""
+    parser = argparse.ArgumentParser(description="Benchmark plan_trip offline with fake latency-injecting LLMs")
+    parser.add_argument("--trips", type=int, default=10, help="Trips planned per path")
+    parser.add_argument("--duration", type=int, default=5, help="Days per trip")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS), help="Paths to benchmark")
+    parser.add_argument("--concurrency", type=int, default=4, help="max_concurrency for aplan_many")
+    parser.add_argument("--day-concurrency", type=int, default=4,
+                        help="Per-day fan-out of the detailed itinerary (0 for one whole-trip completion)")
+    parser.add_argument("--pipelined", action="store_true", help="Overlap the detail and packing stages")
+    parser.add_argument("--groq-latency", type=float, default=0.2, help="Mean seconds per Groq-like call")
+    parser.add_argument("--gemini-latency", type=float, default=0.6, help="Mean seconds per Gemini-like call")
+    parser.add_argument("--distribution", choices=("fixed", "uniform", "lognormal"), default="fixed",
+                        help="Latency distribution of the fake models")
+    parser.add_argument("--output-tokens", type=int, default=150, help="Words per Groq-like completion")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability that a call fails")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency and failure sampling")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per model call (1 disables retries)")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="Base backoff delay between retries")
+    parser.add_argument("--hedge", action="store_true", help="Hedge slow calls to the other fake provider")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [measure(path, args, workdir) for path in args.paths]
+        repeat_calls = check_repeat_hits_cache(args, workdir)
+
+    print_report(results, args)
+    if repeat_calls:
+        print(f"❌ Repeated plan_trip made {repeat_calls} model calls instead of hitting the cache")
+    else:
+        print("✅ Repeated plan_trip served entirely from the cache")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results, "repeat_model_calls": repeat_calls}, f, indent=2)
+        print(f"Results written to {args.json}")
+    return 1 if repeat_calls else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
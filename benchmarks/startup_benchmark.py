@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Measures how long it takes to import main.py, construct a TravelPlanner, and build
+each generator's LLM client and chains on first use. No network calls are made.
+
+Usage:
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter each time so import costs are never served from sys.modules
+MEASURE_SCRIPT = """
+import json, os, sys, tempfile, time
+sys.path.insert(0, {repo_root!r})
+# Client construction only validates that keys are present; nothing is sent
+os.environ.setdefault("GROQ_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+timings = {{}}
+
+start = time.perf_counter()
+import main
+timings["import main"] = time.perf_counter() - start
+
+workdir = tempfile.mkdtemp()
+start = time.perf_counter()
+planner = main.TravelPlanner(
+    preferences_file=os.path.join(workdir, "prefs.json"),
+    cache_path=os.path.join(workdir, "cache.sqlite3"),
+    checkpoint_path=os.path.join(workdir, "checkpoints.sqlite3"),
+    verbose=False
+)
+timings["TravelPlanner()"] = time.perf_counter() - start
+
+start = time.perf_counter()
+planner.get_all_preferences()
+timings["preferences menu"] = time.perf_counter() - start
+
+for name in ("outline_generator", "detailed_generator", "packing_generator"):
+    start = time.perf_counter()
+    getattr(planner, name).chain
+    timings[name + " first use"] = time.perf_counter() - start
+
+start = time.perf_counter()
+planner.memory
+timings["memory first use"] = time.perf_counter() - start
+
+print(json.dumps(timings))
+"""
+
+
+def measure_once():
+    """Run the measurement script in a fresh interpreter and return its timings"""
+    script = MEASURE_SCRIPT.format(repo_root=REPO_ROOT)
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", script],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    """Collect timings over several runs and print the medians"""
+    parser = argparse.ArgumentParser(description="Measure TravelPlanner import and construction time")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters to measure")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.runs)]
+
+    print(f"⏱️ Startup timings (median of {args.runs} runs)")
+    print("=" * 50)
+    for step in runs[0]:
+        values = [run[step] for run in runs]
+        print(f"{step:<32} {statistics.median(values) * 1000:8.1f} ms")
+
+    cold_start = statistics.median(run["import main"] + run["TravelPlanner()"] for run in runs)
+    print("=" * 50)
+    print(f"{'Cold start (import + construct)':<32} {cold_start * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# Stage-level checkpoints for plans in progress
+# Each completed stage of a plan is saved under a plan ID derived from the plan's inputs,
+# so a retry after a failure resumes from the first incomplete stage; a plan's checkpoints
+# are discarded when it finishes and abandoned ones expire
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_CHECKPOINT_PATH = "plan_checkpoints.sqlite3"
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+# Expired checkpoints are swept at most this often
+PURGE_INTERVAL_SECONDS = 60 * 60
+
+
+def plan_id(destination, duration, preferences, chat_history, variant):
+    """Stable ID of a plan request; the same request (and session history) gets the same ID"""
+    payload = json.dumps(
+        {
+            "destination": " ".join(destination.split()),
+            "duration": duration,
+            "preferences": preferences,
+            "chat_history": chat_history,
+            "variant": variant
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """SQLite-backed stage outputs (any JSON value) keyed by plan ID and stage.
+
+    Failures to read or write are reported as warnings and treated as a missing
+    checkpoint, so checkpointing never makes a plan fail.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.resumed = 0
+        self._last_purge = 0.0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                plan_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (plan_id, stage)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_checkpoints_created_at ON checkpoints (created_at)"
+        )
+        self._conn.commit()
+        self.purge_stale()
+
+    def load(self, plan_id):
+        """{stage: value} of the unexpired checkpoints saved for plan_id"""
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds else 0
+        with self._lock:
+            try:
+                rows = self._conn.execute(
+                    "SELECT stage, value FROM checkpoints WHERE plan_id = ? AND created_at >= ?",
+                    (plan_id, cutoff)
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not read plan checkpoints: {e}")
+                return {}
+        if rows:
+            self.resumed += 1
+        return {stage: json.loads(value) for stage, value in rows}
+
+    def save(self, plan_id, stage, value):
+        """Record a completed stage"""
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (plan_id, stage, value, created_at) VALUES (?, ?, ?, ?)",
+                    (plan_id, stage, json.dumps(value), now)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not save plan checkpoint: {e}")
+        if now - self._last_purge > PURGE_INTERVAL_SECONDS:
+            self.purge_stale()
+
+    def discard(self, plan_id):
+        """Drop a plan's checkpoints once it has finished"""
+        with self._lock:
+            try:
+                self._conn.execute("DELETE FROM checkpoints WHERE plan_id = ?", (plan_id,))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not discard plan checkpoints: {e}")
+
+    def purge_stale(self):
+        """Delete checkpoints older than the TTL (plans that were never retried) and return how many"""
+        self._last_purge = time.time()
+        if not self.ttl_seconds:
+            return 0
+        with self._lock:
+            try:
+                cursor = self._conn.execute(
+                    "DELETE FROM checkpoints WHERE created_at < ?", (self._last_purge - self.ttl_seconds,)
+                )
+                self._conn.commit()
+                return cursor.rowcount
+            except sqlite3.Error as e:
+                print(f"Warning: Could not purge plan checkpoints: {e}")
+                return 0
+
+    def stats(self):
+        """Plans resumed from checkpoints and the plans and stages currently saved"""
+        with self._lock:
+            try:
+                plans, stages = self._conn.execute(
+                    "SELECT COUNT(DISTINCT plan_id), COUNT(*) FROM checkpoints"
+                ).fetchone()
+            except sqlite3.Error:
+                plans = stages = None
+        return {"resumed": self.resumed, "plans": plans, "stages": stages}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,159 @@
+# Structured latency, token and cost metrics for the planning pipeline
+# Generators record one "call" span per model invocation and TravelPlanner one "stage" span
+# per pipeline stage; spans feed rolling per-stage windows, an optional JSON-lines file and
+# any registered callbacks
+
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+DEFAULT_METRICS_PATH = "planner_metrics.jsonl"
+# Spans kept per (kind, stage) for the rolling percentiles
+ROLLING_WINDOW = 200
+# USD per million (prompt, completion) tokens, for rough cost estimates
+MODEL_PRICES = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "gemini-1.5-flash": (0.075, 0.30)
+}
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Approximate USD cost of one call, or None for models without a known price"""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+def _percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None when empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class JsonlSink:
+    """Callback that appends each span as one JSON line"""
+
+    def __init__(self, path=DEFAULT_METRICS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        line = json.dumps(span, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+
+class MetricsRecorder:
+    """Collects spans, keeps rolling windows per stage and forwards spans to callbacks.
+
+    A span is a plain dict. Every span has "kind" ("stage" or "call"), "stage",
+    "timestamp", "wall_time" and "error"; call spans also carry "model",
+    "prompt_tokens", "completion_tokens", "cost_usd", "cache_hit", "coalesced"
+    (the result was shared from an identical in-flight call), "retries" and
+    "hedged", and streamed spans carry "time_to_first_token".
+    """
+
+    def __init__(self, sink_path=None, callbacks=(), window=ROLLING_WINDOW):
+        self.window = window
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._callbacks = list(callbacks)
+        if sink_path:
+            self._callbacks.append(JsonlSink(sink_path))
+
+    def add_callback(self, callback):
+        """Call callback(span) for every span recorded from now on"""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        with self._lock:
+            self._callbacks.remove(callback)
+
+    def record(self, span):
+        """Store a finished span and hand it to every callback"""
+        span.setdefault("timestamp", time.time())
+        span.setdefault("error", None)
+        with self._lock:
+            window = self._windows.get((span["kind"], span["stage"]))
+            if window is None:
+                window = self._windows[(span["kind"], span["stage"])] = deque(maxlen=self.window)
+            window.append(span)
+            callbacks = list(self._callbacks)
+
+        for callback in callbacks:
+            try:
+                callback(span)
+            except Exception as e:
+                # A broken sink must never fail a plan
+                print(f"Warning: Metrics callback failed: {e}")
+
+    @contextmanager
+    def stage_span(self, stage, **fields):
+        """Time a pipeline stage; the yielded span dict can be filled in before it is recorded"""
+        span = {"kind": "stage", "stage": stage, "timestamp": time.time(), **fields}
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            # Includes GeneratorExit, so a stream abandoned mid-stage is not counted as a full run
+            span["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span["wall_time"] = time.perf_counter() - start
+            self.record(span)
+
+    def spans(self, kind=None, stage=None):
+        """Spans in the rolling windows, optionally filtered by kind and stage"""
+        with self._lock:
+            return [
+                span
+                for (span_kind, span_stage), window in self._windows.items()
+                if kind in (None, span_kind) and stage in (None, span_stage)
+                for span in window
+            ]
+
+    def summary(self):
+        """Rolling statistics per stage.
+
+        Wall time and time-to-first-token percentiles come from stage spans; call
+        counts, average tokens, cache hit rate, coalesced calls, retries and cost
+        come from call spans.
+        """
+        with self._lock:
+            stages = sorted({stage for _, stage in self._windows})
+        summary = {}
+        for stage in stages:
+            stage_spans = [span for span in self.spans("stage", stage) if span["error"] is None]
+            calls = self.spans("call", stage)
+            misses = [span for span in calls if not span.get("cache_hit") and not span.get("coalesced")]
+            wall_times = [span["wall_time"] for span in stage_spans]
+            first_tokens = [span["time_to_first_token"] for span in stage_spans
+                            if span.get("time_to_first_token") is not None]
+            summary[stage] = {
+                "runs": len(stage_spans),
+                "p50": _percentile(wall_times, 50),
+                "p95": _percentile(wall_times, 95),
+                "ttft_p50": _percentile(first_tokens, 50),
+                "ttft_p95": _percentile(first_tokens, 95),
+                "calls": len(calls),
+                "errors": sum(1 for span in calls if span["error"] is not None),
+                "retries": sum(span.get("retries", 0) for span in calls),
+                "hedged": sum(1 for span in calls if span.get("hedged")),
+                "coalesced": sum(1 for span in calls if span.get("coalesced")),
+                "cache_hit_rate": (sum(1 for span in calls if span.get("cache_hit")) / len(calls)
+                                   if calls else None),
+                "avg_prompt_tokens": sum(span["prompt_tokens"] for span in misses) / len(misses) if misses else None,
+                "avg_completion_tokens": (sum(span["completion_tokens"] for span in misses) / len(misses)
+                                          if misses else None),
+                "cost_usd": sum(span.get("cost_usd") or 0 for span in calls)
+            }
+        return summary
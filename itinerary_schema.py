@@ -0,0 +1,241 @@
+# Structured itinerary output: JSON schemas, validation and compact in-memory types
+# The outline and per-day itinerary prompts ask for JSON in the shapes below; replies are
+# validated and parsed into slotted dataclasses that later stages and the UI work from
+
+import json
+import re
+from dataclasses import dataclass, asdict
+
+
+# Shapes requested in the prompts (doubled braces because they go through PromptTemplate)
+OUTLINE_JSON_SHAPE = '{{"days": [{{"day": 1, "title": "short theme", "summary": "one or two sentences"}}]}}'
+DAY_JSON_SHAPE = (
+    '{{"day": 1, "title": "short theme", "slots": [{{"time": "09:00", "activity": "what to do", '
+    '"place": "specific place or restaurant", "cost_usd": 20, "transport": "how to get there"}}], '
+    '"estimated_cost_usd": 120}}'
+)
+
+_CODE_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+class ItinerarySchemaError(ValueError):
+    """A model reply is not valid JSON in the requested shape"""
+
+
+@dataclass
+class OutlineDay:
+    """One day of the structured outline"""
+    __slots__ = ("day", "title", "summary")
+    day: int
+    title: str
+    summary: str
+
+
+@dataclass
+class TimeSlot:
+    """One scheduled activity within a day"""
+    __slots__ = ("time", "activity", "place", "cost_usd", "transport")
+    time: str
+    activity: str
+    place: str
+    cost_usd: object  # float, or None when unknown
+    transport: object  # str, or None when not needed
+
+
+@dataclass
+class DayPlan:
+    """Detailed plan for one day"""
+    __slots__ = ("day", "title", "slots", "estimated_cost_usd")
+    day: int
+    title: str
+    slots: list
+    estimated_cost_usd: object
+
+    def cost(self):
+        """The model's estimate for the day, else the sum of the known slot costs"""
+        if self.estimated_cost_usd is not None:
+            return self.estimated_cost_usd
+        return sum(slot.cost_usd for slot in self.slots if slot.cost_usd is not None)
+
+
+@dataclass
+class Itinerary:
+    """Structured detailed itinerary for a whole trip"""
+    __slots__ = ("destination", "days")
+    destination: str
+    days: list
+
+    def total_cost(self):
+        return sum(day.cost() for day in self.days)
+
+    def to_dict(self):
+        """Plain dicts and lists, e.g. for JSON output"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Inverse of to_dict"""
+        return cls(
+            destination=data["destination"],
+            days=[
+                DayPlan(
+                    day=day["day"],
+                    title=day["title"],
+                    slots=[TimeSlot(**slot) for slot in day["slots"]],
+                    estimated_cost_usd=day["estimated_cost_usd"]
+                )
+                for day in data["days"]
+            ]
+        )
+
+
+def _load_json(text):
+    """Parse the JSON object in a model reply, tolerating code fences and surrounding prose"""
+    text = _CODE_FENCE_PATTERN.sub("", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ItinerarySchemaError("no JSON object in reply")
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError as e:
+        raise ItinerarySchemaError(f"invalid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise ItinerarySchemaError("reply is not a JSON object")
+    return data
+
+
+def _field(data, key, types, where, required=True):
+    """Fetch data[key], checking its type"""
+    value = data.get(key)
+    if value is None and not required:
+        return None
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise ItinerarySchemaError(f"{where}: {key!r} is missing or has the wrong type")
+    return value
+
+
+def _text(data, key, where, required=True):
+    value = _field(data, key, str, where, required)
+    if value is not None:
+        value = value.strip()
+    if required and not value:
+        raise ItinerarySchemaError(f"{where}: {key!r} is empty")
+    return value or None
+
+
+def _cost(value):
+    """Coerce a cost to float; strings like "$25" are accepted, anything unreadable becomes None"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        match = _NUMBER_PATTERN.search(value)
+        if match:
+            return float(match.group().replace(",", "."))
+    return None
+
+
+def parse_outline_json(text, duration=None):
+    """Validate an outline reply and return its days as OutlineDay objects in day order.
+
+    With duration given, the days must be numbered exactly 1 to duration.
+    """
+    data = _load_json(text)
+    entries = _field(data, "days", list, "outline")
+    days = []
+    for index, entry in enumerate(entries, 1):
+        where = f"outline day {index}"
+        if not isinstance(entry, dict):
+            raise ItinerarySchemaError(f"{where} is not an object")
+        days.append(OutlineDay(
+            day=_field(entry, "day", int, where),
+            title=_text(entry, "title", where),
+            summary=_text(entry, "summary", where, required=False) or ""
+        ))
+
+    if not days:
+        raise ItinerarySchemaError("outline has no days")
+    days.sort(key=lambda day: day.day)
+    numbers = [day.day for day in days]
+    expected = list(range(1, (duration or len(days)) + 1))
+    if numbers != expected:
+        raise ItinerarySchemaError(f"outline days {numbers} should be numbered 1-{len(expected)}")
+    return days
+
+
+def parse_day_plan_json(text, day_number):
+    """Validate a single-day reply and return it as a DayPlan for day_number"""
+    data = _load_json(text)
+    where = f"day {day_number}"
+    slots = []
+    for index, entry in enumerate(_field(data, "slots", list, where), 1):
+        slot_where = f"{where} slot {index}"
+        if not isinstance(entry, dict):
+            raise ItinerarySchemaError(f"{slot_where} is not an object")
+        slots.append(TimeSlot(
+            time=_text(entry, "time", slot_where),
+            activity=_text(entry, "activity", slot_where),
+            place=_text(entry, "place", slot_where, required=False) or "",
+            cost_usd=_cost(entry.get("cost_usd")),
+            transport=_text(entry, "transport", slot_where, required=False)
+        ))
+    if not slots:
+        raise ItinerarySchemaError(f"{where} has no time slots")
+
+    return DayPlan(
+        day=day_number,
+        title=_text(data, "title", where, required=False) or "",
+        slots=slots,
+        estimated_cost_usd=_cost(data.get("estimated_cost_usd"))
+    )
+
+
+def render_outline(days):
+    """Outline text in the usual "Day N: ..." form, as shown in the UI and history"""
+    return "\n".join(
+        f"Day {day.day}: {day.title} - {day.summary}" if day.summary else f"Day {day.day}: {day.title}"
+        for day in days
+    )
+
+
+def outline_titles(days):
+    """One short line per day; the trip context sent with each per-day prompt"""
+    return "\n".join(f"Day {day.day}: {day.title}" for day in days)
+
+
+def render_day_plan(plan):
+    """Markdown bullets for one day, without its heading"""
+    lines = []
+    for slot in plan.slots:
+        line = f"- **{slot.time}** {slot.activity}"
+        if slot.place:
+            line += f" @ {slot.place}"
+        extras = []
+        if slot.cost_usd is not None:
+            extras.append(f"~${slot.cost_usd:,.0f}")
+        if slot.transport:
+            extras.append(slot.transport)
+        if extras:
+            line += f" ({'; '.join(extras)})"
+        lines.append(line)
+    lines.append(f"Estimated cost: ~${plan.cost():,.0f}")
+    return "\n".join(lines)
+
+
+def render_itinerary(itinerary):
+    """Full detailed itinerary text in the same "Day N: title" layout as the prose pipeline"""
+    return "\n\n".join(
+        f"Day {plan.day}: {plan.title}\n{render_day_plan(plan)}" if plan.title
+        else f"Day {plan.day}\n{render_day_plan(plan)}"
+        for plan in itinerary.days
+    )
+
+
+def packing_digest(itinerary):
+    """Compact per-day activity and place list: all the packing stage needs from the itinerary"""
+    return "\n".join(
+        f"Day {plan.day}: " + "; ".join(
+            f"{slot.activity} ({slot.place})" if slot.place else slot.activity for slot in plan.slots
+        )
+        for plan in itinerary.days
+    )
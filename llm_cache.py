@@ -0,0 +1,155 @@
+# Persistent LLM response cache for the travel planning chains
+# Stores completions in SQLite so repeated trips skip the Groq/Gemini round-trip
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_CACHE_PATH = "llm_cache.sqlite3"
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 5000
+# The session's chat history only repeats earlier trip requests and preferences, which the
+# preferences input already carries, and it grows with every plan; keying on it would
+# keep a session from ever hitting the cache for a trip it planned before
+UNKEYED_INPUTS = frozenset({"chat_history"})
+
+
+def _normalize(value):
+    """Normalize prompt inputs so cosmetic whitespace differences share a key"""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def make_cache_key(stage, inputs, model_params):
+    """Build a stable hash from a chain's stage name, prompt inputs and model parameters.
+
+    Inputs in UNKEYED_INPUTS are left out of the key.
+    """
+    payload = json.dumps(
+        {
+            "stage": stage,
+            "inputs": _normalize({key: value for key, value in inputs.items() if key not in UNKEYED_INPUTS}),
+            "model": _normalize(model_params),
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Disk-backed response cache with TTL expiry and size-bounded LRU eviction"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+
+                value, created_at = row
+                if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self.misses += 1
+                    return None
+
+                self._conn.execute(
+                    "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+                self.hits += 1
+                return value
+            except sqlite3.Error as e:
+                print(f"Warning: Could not read from LLM cache: {e}")
+                self.misses += 1
+                return None
+
+    def set(self, key, value, stage=""):
+        """Store a response and evict the least recently used entries beyond max_entries"""
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, stage, value, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, stage, value, now, now)
+                )
+                if self.max_entries:
+                    count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                    overflow = count - self.max_entries
+                    if overflow > 0:
+                        self._conn.execute(
+                            "DELETE FROM responses WHERE key IN "
+                            "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                            (overflow,)
+                        )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not write to LLM cache: {e}")
+
+    def stats(self):
+        """Return hit/miss counters and the current number of cached entries"""
+        with self._lock:
+            try:
+                entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            except sqlite3.Error:
+                entries = None
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries
+        }
+
+    def clear(self):
+        """Remove every cached response"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self):
+        """Close the underlying SQLite connection"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,89 @@
+# Process-wide registry of LLM clients shared by every TravelPlanner
+# Streamlit sessions, batch workers and the CLI reuse one client (and its open
+# connections) per API key and model instead of building fresh HTTP stacks each time
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+# Clients are kept for this many distinct key/model/setting combinations
+MAX_CLIENTS = 64
+
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+_http_client = None
+
+
+def key_fingerprint(api_key):
+    """Short, non-reversible identifier for an API key"""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _shared_http_client():
+    """One keep-alive connection pool for every Groq client in the process"""
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+        )
+    return _http_client
+
+
+def _get_or_create(registry_key, factory):
+    """Return the cached client for registry_key, creating it with factory on first use"""
+    with _clients_lock:
+        client = _clients.get(registry_key)
+        if client is not None:
+            _clients.move_to_end(registry_key)
+            return client
+
+        client = factory()
+        _clients[registry_key] = client
+        # Drop the least recently used clients, e.g. ones built for since-replaced keys
+        while len(_clients) > MAX_CLIENTS:
+            _clients.popitem(last=False)
+        return client
+
+
+def get_groq_llm(model_name, temperature, api_key=None, **kwargs):
+    """Shared ChatGroq client for this key, model and settings"""
+    api_key = api_key or os.getenv("GROQ_API_KEY")
+    registry_key = ("groq", key_fingerprint(api_key), model_name, temperature, tuple(sorted(kwargs.items())))
+
+    def create():
+        from langchain_groq import ChatGroq
+        return ChatGroq(
+            groq_api_key=api_key,
+            model_name=model_name,
+            temperature=temperature,
+            http_client=_shared_http_client(),
+            **kwargs
+        )
+
+    return _get_or_create(registry_key, create)
+
+
+def get_gemini_llm(model, temperature, api_key=None, **kwargs):
+    """Shared Gemini client for this key, model and settings (its gRPC channel stays open)"""
+    api_key = api_key or os.getenv("GOOGLE_API_KEY")
+    registry_key = ("google", key_fingerprint(api_key), model, temperature, tuple(sorted(kwargs.items())))
+
+    def create():
+        from langchain_google_genai import GoogleGenerativeAI
+        return GoogleGenerativeAI(
+            google_api_key=api_key,
+            model=model,
+            temperature=temperature,
+            **kwargs
+        )
+
+    return _get_or_create(registry_key, create)
+
+
+def clear_clients():
+    """Forget every cached client (e.g. after the API keys change)"""
+    with _clients_lock:
+        _clients.clear()
@@ -1,28 +1,419 @@
 # Travel Itinerary Planner using LangChain
 # A multi-LLM system for comprehensive travel planning
 
-import os
-import json
+import re
+import time
+import asyncio
+import threading
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain.memory import ConversationBufferMemory
-from langchain_groq import ChatGroq
-from langchain_google_genai import GoogleGenerativeAI
+from llm_clients import get_groq_llm, get_gemini_llm
+from llm_cache import LLMResponseCache, make_cache_key, DEFAULT_CACHE_PATH
+from outline_parser import parse_outline_days, day_heading, merge_day_details
+from preferences import PreferenceIndex, PreferenceStore
+from packing_features import extract_packing_features, extract_day_features, combine_day_features, format_packing_features
+from instrumentation import MetricsRecorder, estimate_cost
+from resilience import ResilientCaller, STAGE_DEADLINES, DEFAULT_MAX_ATTEMPTS
+from single_flight import default_single_flight
+from rate_limit import default_rate_limiters
+from checkpoints import CheckpointStore, DEFAULT_CHECKPOINT_PATH, plan_id
+from replan import PlanArtifacts, DayArtifact, outline_hash, day_hash, packing_hash
+from itinerary_schema import (
+    ItinerarySchemaError, Itinerary, OutlineDay, OUTLINE_JSON_SHAPE, DAY_JSON_SHAPE, parse_outline_json,
+    parse_day_plan_json, render_outline, render_itinerary, outline_titles, packing_digest
+)
 
 # Load environment variables
 load_dotenv()
 
+# Token budget for the chat history sent with each prompt in the CLI and Streamlit apps
+DEFAULT_MEMORY_TOKEN_LIMIT = 1000
 
-class OutlineGenerator:
+# Trip lengths offered by the Streamlit form (and precomputed by warmup_cache.py)
+DURATION_OPTIONS = [3, 5, 7, 10, 14, 21, 30]
+
+
+def approximate_token_ids(text):
+    """Cheap tokenizer stand-in (roughly one token per 4 characters) for memory budgeting.
+    
+    Passed to the summary LLM as custom_get_token_ids so that counting history tokens
+    needs no local tokenizer download; only the number of ids returned matters.
+    """
+    return [len(piece) for piece in re.findall(r"\w{1,4}|[^\w\s]", text)]
+
+
+# Metrics stage name for the overlapped itinerary and packing steps of pipelined plans
+PIPELINED_STAGE = "itinerary_and_packing"
+
+# Section headings for each pipeline stage, used when rendering streamed output
+STAGE_TITLES = {
+    "outline": "📋 DAY-BY-DAY OUTLINE",
+    "detailed_itinerary": "📅 DETAILED ITINERARY",
+    "packing_checklist": "🎒 PACKING CHECKLIST"
+}
+
+
+# Serializes the lazy construction of generator clients and chains
+_build_lock = threading.RLock()
+
+
+class BaseGenerator:
+    """Shared chain invocation for the three LLM classes, with optional response caching"""
+    
+    stage = "base"
+    provider = None
+    model_name = None
+    temperature = None
+    # Model on the other provider that hedged requests are sent to
+    backup_provider = None
+    backup_model_name = None
+    # Typical completion size, reserved against the provider's token-per-minute limit
+    expected_completion_tokens = 500
+    
+    def __init__(self, cache=None, llm=None, metrics=None, resilience=None, backup_llm=None, single_flight=None,
+                 rate_limiters=None):
+        self.cache = cache
+        # Optional RateLimiterRegistry whose per-model limiters pace every request to a provider
+        self.rate_limiters = rate_limiters
+        # Optional SingleFlight that coalesces identical in-flight calls (usually shared process-wide)
+        self.single_flight = single_flight
+        # Optional MetricsRecorder that receives one span per model call
+        self.metrics = metrics
+        # Deadline, retry and hedging policy for every model call of this stage
+        self.resilience = resilience or ResilientCaller(deadline=STAGE_DEADLINES.get(self.stage))
+        if llm is not None:
+            # Use a caller-supplied model (e.g. a shared client or a test double)
+            self.llm = llm
+        if backup_llm is not None:
+            self.backup_llm = backup_llm
+    
+    def __getattr__(self, name):
+        """Build the LLM client, prompts and chains the first time any of them is used.
+        
+        Keeps construction (and the langchain imports) off the startup path for
+        callers that never plan a trip.
+        """
+        if name.startswith("_"):
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        # Threads that share a generator wait here for the first one to finish building
+        with _build_lock:
+            if not self.__dict__.get("_built"):
+                self._built = True
+                try:
+                    if "llm" not in self.__dict__:
+                        self.llm = self._create_llm()
+                    self._build_chains()
+                except Exception:
+                    self._built = False
+                    raise
+        if name not in self.__dict__:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        return self.__dict__[name]
+    
+    def _create_llm(self):
+        """Create this stage's LLM client"""
+        raise NotImplementedError
+    
+    def _create_backup_llm(self):
+        """Create the other provider's client used for hedged requests"""
+        raise NotImplementedError
+    
+    def _build_chains(self):
+        """Create this stage's prompt templates and chains"""
+        raise NotImplementedError
+    
+    def model_params(self, chain=None):
+        """Model parameters that, together with the prompt inputs, determine a completion"""
+        chain = chain or self.chain
+        return {
+            "model": self.model_name,
+            "temperature": self.temperature,
+            "template": chain.prompt.template
+        }
+    
+    def _cache_key(self, inputs, chain=None):
+        """Key identifying a completion: stage, prompt inputs and model parameters"""
+        return make_cache_key(self.stage, inputs, self.model_params(chain))
+    
+    def _cached(self, key, chain, inputs, start, use_cache, stream=False):
+        """The cached response for key (recording the hit), or None"""
+        if self.cache is None or not use_cache:
+            return None
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._record_call(chain, inputs, start, cached, cache_hit=True,
+                              time_to_first_token=time.perf_counter() - start if stream else None)
+        return cached
+    
+    def _run_chain(self, use_cache=True, chain=None, **inputs):
+        """Run the chain (self.chain unless another is given), serving repeated inputs from the cache.
+        
+        use_cache=False skips the lookup and forces a fresh completion,
+        which then replaces any cached response for the same inputs.
+        Identical calls already in flight are joined rather than repeated.
+        """
+        chain = chain or self.chain
+        start = time.perf_counter()
+        key = self._cache_key(inputs, chain)
+        cached = self._cached(key, chain, inputs, start, use_cache)
+        if cached is not None:
+            return cached
+        
+        def invoke():
+            info = {}
+            try:
+                result = self.resilience.call(
+                    self._limited(lambda: chain.run(**inputs), chain, inputs), self._backup_call(chain, inputs), info
+                )
+            except Exception as e:
+                self._record_call(chain, inputs, start, error=e, info=info)
+                raise
+            self._record_call(chain, inputs, start, result, info=info)
+            # Answers from the backup model are not cached under this model's key
+            if self.cache is not None and not info["hedged"]:
+                self.cache.set(key, result, stage=self.stage)
+            return result
+        
+        # A caller asking for a fresh generation is never handed another caller's in-flight result
+        if self.single_flight is None or not use_cache:
+            return invoke()
+        flight = {}
+        result = self.single_flight.call(key, invoke, flight)
+        if flight["coalesced"]:
+            self._record_call(chain, inputs, start, result, coalesced=True)
+        return result
+    
+    async def _arun_chain(self, use_cache=True, chain=None, **inputs):
+        """Async counterpart of _run_chain built on the chain's ainvoke path"""
+        chain = chain or self.chain
+        start = time.perf_counter()
+        key = self._cache_key(inputs, chain)
+        cached = self._cached(key, chain, inputs, start, use_cache)
+        if cached is not None:
+            return cached
+        
+        async def run_primary():
+            output = await chain.ainvoke(inputs)
+            return output[chain.output_key]
+        
+        async def invoke():
+            info = {}
+            try:
+                result = await self.resilience.acall(
+                    self._alimited(run_primary, chain, inputs), self._abackup_call(chain, inputs), info
+                )
+            except Exception as e:
+                self._record_call(chain, inputs, start, error=e, info=info)
+                raise
+            self._record_call(chain, inputs, start, result, info=info)
+            if self.cache is not None and not info["hedged"]:
+                self.cache.set(key, result, stage=self.stage)
+            return result
+        
+        if self.single_flight is None or not use_cache:
+            return await invoke()
+        flight = {}
+        result = await self.single_flight.acall(key, invoke, flight)
+        if flight["coalesced"]:
+            self._record_call(chain, inputs, start, result, coalesced=True)
+        return result
+    
+    def _stream_chain(self, use_cache=True, chain=None, **inputs):
+        """Yield text chunks as the model produces them; a cached response is yielded whole"""
+        chain = chain or self.chain
+        start = time.perf_counter()
+        key = self._cache_key(inputs, chain)
+        cached = self._cached(key, chain, inputs, start, use_cache, stream=True)
+        if cached is not None:
+            yield cached
+            return
+        
+        def produce():
+            parts = []
+            time_to_first_token = None
+            info = {}
+            try:
+                # Failures before the first chunk are retried; streams are never hedged
+                open_stream = self._limited_stream(lambda: (chain.prompt | self.llm).stream(inputs), chain, inputs)
+                for chunk in self.resilience.stream(open_stream, info):
+                    # Chat models stream message chunks, completion models stream plain strings
+                    text = getattr(chunk, "content", chunk)
+                    if text:
+                        if time_to_first_token is None:
+                            time_to_first_token = time.perf_counter() - start
+                        parts.append(text)
+                        yield text
+            except Exception as e:
+                self._record_call(chain, inputs, start, error=e, info=info, time_to_first_token=time_to_first_token)
+                raise
+            result = "".join(parts)
+            self._record_call(chain, inputs, start, result, info=info, time_to_first_token=time_to_first_token)
+            if self.cache is not None:
+                self.cache.set(key, result, stage=self.stage)
+        
+        if self.single_flight is None or not use_cache:
+            yield from produce()
+            return
+        flight = {}
+        parts = []
+        time_to_first_token = None
+        for text in self.single_flight.stream(key, produce, flight):
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - start
+            parts.append(text)
+            yield text
+        if flight["coalesced"]:
+            self._record_call(chain, inputs, start, "".join(parts), coalesced=True,
+                              time_to_first_token=time_to_first_token)
+    
+    def _run_structured(self, parse, use_cache=True, chain=None, **inputs):
+        """Run a JSON-producing chain and parse the reply, asking once more if it fails validation"""
+        try:
+            return parse(self._run_chain(use_cache=use_cache, chain=chain, **inputs))
+        except ItinerarySchemaError as e:
+            print(f"Warning: Invalid structured {self.stage} output ({e}), retrying")
+            # A fresh completion also replaces the invalid reply in the cache
+            return parse(self._run_chain(use_cache=False, chain=chain, **inputs))
+    
+    async def _arun_structured(self, parse, use_cache=True, chain=None, **inputs):
+        """Async counterpart of _run_structured"""
+        try:
+            return parse(await self._arun_chain(use_cache=use_cache, chain=chain, **inputs))
+        except ItinerarySchemaError as e:
+            print(f"Warning: Invalid structured {self.stage} output ({e}), retrying")
+            return parse(await self._arun_chain(use_cache=False, chain=chain, **inputs))
+    
+    def _backup_runnable(self, chain):
+        """The chain's prompt piped into the backup model, or None when hedging is off"""
+        if not self.resilience.hedge:
+            return None
+        if "backup_llm" not in self.__dict__:
+            try:
+                self.backup_llm = self._create_backup_llm()
+            except Exception as e:
+                print(f"Warning: Hedging disabled for {self.stage}, backup model unavailable: {e}")
+                self.backup_llm = None
+        if self.backup_llm is None:
+            return None
+        return chain.prompt | self.backup_llm
+    
+    def _backup_call(self, chain, inputs):
+        """Zero-argument callable running the same prompt on the backup model, if hedging"""
+        runnable = self._backup_runnable(chain)
+        if runnable is None:
+            return None
+        
+        def run_backup():
+            output = runnable.invoke(inputs)
+            # Chat models return a message, completion models a plain string
+            return getattr(output, "content", output)
+        return self._limited(run_backup, chain, inputs, backup=True)
+    
+    def _abackup_call(self, chain, inputs):
+        """Async counterpart of _backup_call"""
+        runnable = self._backup_runnable(chain)
+        if runnable is None:
+            return None
+        
+        async def run_backup():
+            output = await runnable.ainvoke(inputs)
+            return getattr(output, "content", output)
+        return self._alimited(run_backup, chain, inputs, backup=True)
+    
+    def _limiter(self, backup=False):
+        """The ProviderLimiter of this stage's model (or its backup model), or None"""
+        if self.rate_limiters is None:
+            return None
+        if backup:
+            return self.rate_limiters.get(self.backup_provider, self.backup_model_name)
+        return self.rate_limiters.get(self.provider, self.model_name)
+    
+    def _reservation(self, chain, inputs):
+        """(tokens to reserve, measure) for one call: the prompt plus the expected completion,
+        settled against the prompt plus the actual completion once it is known"""
+        prompt_tokens = len(approximate_token_ids(chain.prompt.format(**inputs)))
+        
+        def measure(text):
+            return prompt_tokens + len(approximate_token_ids(text or ""))
+        return prompt_tokens + self.expected_completion_tokens, measure
+    
+    def _limited(self, call, chain, inputs, backup=False):
+        """call bound to its provider's rate limiter; the resilience layer reserves capacity
+        on the calling thread before each attempt, within what is left of the deadline"""
+        limiter = self._limiter(backup)
+        if limiter is None:
+            return call
+        tokens, measure = self._reservation(chain, inputs)
+        return limiter.bind(call, tokens, measure)
+    
+    def _alimited(self, call, chain, inputs, backup=False):
+        """Async counterpart of _limited for a coroutine function; the resilience layer awaits
+        capacity before each attempt, within what is left of the deadline"""
+        limiter = self._limiter(backup)
+        if limiter is None:
+            return call
+        tokens, measure = self._reservation(chain, inputs)
+        return limiter.abind(call, tokens, measure)
+    
+    def _limited_stream(self, open_stream, chain, inputs):
+        """Stream counterpart of _limited; the permit is held until the stream finishes"""
+        limiter = self._limiter()
+        if limiter is None:
+            return open_stream
+        tokens, measure = self._reservation(chain, inputs)
+        return limiter.bind(open_stream, tokens, measure, stream=True)
+    
+    def _record_call(self, chain, inputs, start, result=None, cache_hit=False, error=None,
+                     time_to_first_token=None, info=None, coalesced=False):
+        """Send a span for one model call (or cache hit) to the metrics recorder, if any.
+        
+        Token counts use approximate_token_ids; cache hits and calls coalesced onto
+        another in-flight call spend no tokens.
+        """
+        if self.metrics is None:
+            return
+        prompt_tokens = completion_tokens = 0
+        if not cache_hit and not coalesced:
+            prompt_tokens = len(approximate_token_ids(chain.prompt.format(**inputs)))
+            completion_tokens = len(approximate_token_ids(result or ""))
+        self.metrics.record({
+            "kind": "call",
+            "stage": self.stage,
+            "model": self.model_name,
+            "wall_time": time.perf_counter() - start,
+            "time_to_first_token": time_to_first_token,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": estimate_cost(self.model_name, prompt_tokens, completion_tokens),
+            "cache_hit": cache_hit,
+            "coalesced": coalesced,
+            "retries": info["retries"] if info else 0,
+            "hedged": bool(info and info["hedged"]),
+            "error": f"{type(error).__name__}: {error}" if error is not None else None
+        })
+
+
+class OutlineGenerator(BaseGenerator):
     """LLM 1: ChatGroq for generating day-by-day travel plan outline"""
     
-    def __init__(self):
-        self.llm = ChatGroq(
-            groq_api_key=os.getenv("GROQ_API_KEY"),
-            model_name="llama-3.1-8b-instant",
-            temperature=0.7
-        )
+    stage = "outline"
+    provider = "groq"
+    model_name = "llama-3.1-8b-instant"
+    temperature = 0.7
+    backup_provider = "google"
+    backup_model_name = "gemini-1.5-flash"
+    expected_completion_tokens = 400
+    
+    def _create_llm(self):
+        return get_groq_llm(self.model_name, self.temperature)
+    
+    def _create_backup_llm(self):
+        return get_gemini_llm(self.backup_model_name, self.temperature)
+    
+    def _build_chains(self):
+        from langchain.prompts import PromptTemplate
+        from langchain.chains import LLMChain
         
         self.prompt_template = PromptTemplate(
             input_variables=["destination", "duration", "preferences", "chat_history"],
@@ -51,9 +442,115 @@ class OutlineGenerator:
         )
         
         self.chain = LLMChain(llm=self.llm, prompt=self.prompt_template)
+        
+        # Structured mode: the same outline as JSON, validated by itinerary_schema
+        self.structured_prompt_template = PromptTemplate(
+            input_variables=["destination", "duration", "preferences", "chat_history"],
+            template="""
+            You are a travel planning expert. Based on the user's destination, trip duration, and preferences,
+            create a day-by-day travel plan outline.
+
+            Destination: {destination}
+            Trip Duration: {duration} days
+            User Preferences from Previous Conversations: {preferences}
+            Chat History: {chat_history}
+
+            Consider the user's preferences, popular attractions, logical geographical flow,
+            and a balance between different types of activities.
+
+            Respond with JSON only (no code fences or commentary) in exactly this shape,
+            with one entry per day numbered 1 to {duration}:
+            """ + OUTLINE_JSON_SHAPE + """
+
+            JSON Outline:
+            """
+        )
+        
+        self.structured_chain = LLMChain(llm=self.llm, prompt=self.structured_prompt_template)
+        
+        # Incremental re-planning: continue an existing outline when a trip gets longer
+        self.extend_prompt_template = PromptTemplate(
+            input_variables=["destination", "duration", "first_day", "outline", "preferences", "chat_history"],
+            template="""
+            You are a travel planning expert. A trip to {destination} has been extended to
+            {duration} days. Continue its existing outline with the additional days only.
+
+            Existing Outline:
+            {outline}
+
+            User Preferences from Previous Conversations: {preferences}
+            Chat History: {chat_history}
+
+            Keep the same style and a logical geographical flow from the last planned day,
+            and avoid repeating places the existing days already cover.
+
+            Format your response as:
+            Day {first_day}: [Brief description of main activities/theme]
+            ... and so on up to Day {duration}
+
+            Additional Days:
+            """
+        )
+        
+        self.extend_chain = LLMChain(llm=self.llm, prompt=self.extend_prompt_template)
+    
+    def generate_outline(self, destination, duration, preferences, chat_history, use_cache=True):
+        return self._run_chain(
+            use_cache=use_cache,
+            destination=destination,
+            duration=duration,
+            preferences=preferences,
+            chat_history=chat_history
+        )
+    
+    async def agenerate_outline(self, destination, duration, preferences, chat_history, use_cache=True):
+        return await self._arun_chain(
+            use_cache=use_cache,
+            destination=destination,
+            duration=duration,
+            preferences=preferences,
+            chat_history=chat_history
+        )
+    
+    def stream_outline(self, destination, duration, preferences, chat_history, use_cache=True):
+        return self._stream_chain(
+            use_cache=use_cache,
+            destination=destination,
+            duration=duration,
+            preferences=preferences,
+            chat_history=chat_history
+        )
+    
+    def generate_structured_outline(self, destination, duration, preferences, chat_history, use_cache=True):
+        """Outline as a validated list of OutlineDay objects"""
+        return self._run_structured(
+            lambda text: parse_outline_json(text, duration),
+            use_cache=use_cache,
+            chain=self.structured_chain,
+            destination=destination,
+            duration=duration,
+            preferences=preferences,
+            chat_history=chat_history
+        )
+    
+    def extend_outline(self, outline, destination, duration, preferences, chat_history, use_cache=True):
+        """Outline lines for the days after the last "Day N:" of outline, up to duration"""
+        return self._run_chain(
+            use_cache=use_cache,
+            chain=self.extend_chain,
+            destination=destination,
+            duration=duration,
+            first_day=len(parse_outline_days(outline)) + 1,
+            outline=outline,
+            preferences=preferences,
+            chat_history=chat_history
+        )
     
-    def generate_outline(self, destination, duration, preferences, chat_history):
-        return self.chain.run(
+    async def agenerate_structured_outline(self, destination, duration, preferences, chat_history, use_cache=True):
+        return await self._arun_structured(
+            lambda text: parse_outline_json(text, duration),
+            use_cache=use_cache,
+            chain=self.structured_chain,
             destination=destination,
             duration=duration,
             preferences=preferences,
@@ -61,15 +558,27 @@ class OutlineGenerator:
         )
 
 
-class DetailedItineraryGenerator:
+class DetailedItineraryGenerator(BaseGenerator):
     """LLM 2: Gemini for generating detailed itinerary with places, food, activities, timings"""
     
-    def __init__(self):
-        self.llm = GoogleGenerativeAI(
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-            model="gemini-1.5-flash",
-            temperature=0.6
-        )
+    stage = "detailed_itinerary"
+    provider = "google"
+    model_name = "gemini-1.5-flash"
+    temperature = 0.6
+    backup_provider = "groq"
+    backup_model_name = "llama-3.1-8b-instant"
+    # One day's plan; whole-trip completions are larger and settled after the call
+    expected_completion_tokens = 800
+    
+    def _create_llm(self):
+        return get_gemini_llm(self.model_name, self.temperature)
+    
+    def _create_backup_llm(self):
+        return get_groq_llm(self.backup_model_name, self.temperature)
+    
+    def _build_chains(self):
+        from langchain.prompts import PromptTemplate
+        from langchain.chains import LLMChain
         
         self.prompt_template = PromptTemplate(
             input_variables=["outline", "destination", "preferences", "chat_history"],
@@ -97,26 +606,274 @@ class DetailedItineraryGenerator:
         )
         
         self.chain = LLMChain(llm=self.llm, prompt=self.prompt_template)
+        
+        # Single-day prompt used when the outline is fanned out into per-day work units
+        self.day_prompt_template = PromptTemplate(
+            input_variables=["day_number", "day_outline", "outline", "destination", "preferences", "chat_history"],
+            template="""
+            You are a detailed travel itinerary specialist. Expand ONE day of the trip below
+            into a detailed plan with specific places, restaurants, activities, and timings.
+
+            Destination: {destination}
+            Full Trip Outline (for context only): {outline}
+            Day to Detail: Day {day_number}: {day_outline}
+            User Preferences: {preferences}
+            Chat History: {chat_history}
+
+            For this day only, provide:
+            - Specific morning, afternoon, and evening activities
+            - Recommended restaurants/cafes with cuisine types
+            - Exact locations and addresses when possible
+            - Suggested timing for each activity
+            - Transportation tips between locations
+            - Cost estimates where relevant
+
+            Do not repeat the "Day {day_number}" heading and do not describe any other day.
+
+            Day {day_number} Details:
+            """
+        )
+        
+        self.day_chain = LLMChain(llm=self.llm, prompt=self.day_prompt_template)
+        
+        # Structured mode: one day as JSON; the trip context is just the other days' titles
+        self.structured_day_prompt_template = PromptTemplate(
+            input_variables=["day_number", "day_title", "day_summary", "trip_outline", "destination",
+                             "preferences", "chat_history"],
+            template="""
+            You are a detailed travel itinerary specialist. Plan ONE day of the trip below
+            with specific places, restaurants, activities, and timings.
+
+            Destination: {destination}
+            Trip Outline (for context only): {trip_outline}
+            Day to Plan: Day {day_number}: {day_title} - {day_summary}
+            User Preferences: {preferences}
+            Chat History: {chat_history}
+
+            Cover morning, afternoon, and evening, including meals. Give each slot a start time,
+            a specific place, an estimated cost in US dollars (null if unknown), and how to get
+            there from the previous slot.
+
+            Respond with JSON only (no code fences or commentary) in exactly this shape,
+            with "day" set to {day_number}:
+            """ + DAY_JSON_SHAPE + """
+
+            JSON for Day {day_number}:
+            """
+        )
+        
+        self.structured_day_chain = LLMChain(llm=self.llm, prompt=self.structured_day_prompt_template)
+    
+    def generate_detailed_itinerary(self, outline, destination, preferences, chat_history, use_cache=True):
+        return self._run_chain(
+            use_cache=use_cache,
+            outline=outline,
+            destination=destination,
+            preferences=preferences,
+            chat_history=chat_history
+        )
+    
+    async def agenerate_detailed_itinerary(self, outline, destination, preferences, chat_history, use_cache=True):
+        return await self._arun_chain(
+            use_cache=use_cache,
+            outline=outline,
+            destination=destination,
+            preferences=preferences,
+            chat_history=chat_history
+        )
     
-    def generate_detailed_itinerary(self, outline, destination, preferences, chat_history):
-        return self.chain.run(
+    def stream_detailed_itinerary(self, outline, destination, preferences, chat_history, use_cache=True):
+        return self._stream_chain(
+            use_cache=use_cache,
             outline=outline,
             destination=destination,
             preferences=preferences,
             chat_history=chat_history
         )
+    
+    def generate_day_detail(self, day, outline, destination, preferences, chat_history, use_cache=True):
+        """Detail a single (day_number, day_outline) work unit"""
+        day_number, day_outline = day
+        return self._run_chain(
+            use_cache=use_cache,
+            chain=self.day_chain,
+            day_number=day_number,
+            day_outline=day_outline,
+            outline=outline,
+            destination=destination,
+            preferences=preferences,
+            chat_history=chat_history
+        )
+    
+    async def agenerate_day_detail(self, day, outline, destination, preferences, chat_history, use_cache=True):
+        day_number, day_outline = day
+        return await self._arun_chain(
+            use_cache=use_cache,
+            chain=self.day_chain,
+            day_number=day_number,
+            day_outline=day_outline,
+            outline=outline,
+            destination=destination,
+            preferences=preferences,
+            chat_history=chat_history
+        )
+    
+    def generate_structured_day(self, outline_day, trip_outline, destination, preferences, chat_history,
+                                use_cache=True):
+        """Plan one OutlineDay as a validated DayPlan; trip_outline is outline_titles() of the trip"""
+        return self._run_structured(
+            lambda text: parse_day_plan_json(text, outline_day.day),
+            use_cache=use_cache,
+            chain=self.structured_day_chain,
+            day_number=outline_day.day,
+            day_title=outline_day.title,
+            day_summary=outline_day.summary,
+            trip_outline=trip_outline,
+            destination=destination,
+            preferences=preferences,
+            chat_history=chat_history
+        )
+    
+    async def agenerate_structured_day(self, outline_day, trip_outline, destination, preferences, chat_history,
+                                       use_cache=True):
+        return await self._arun_structured(
+            lambda text: parse_day_plan_json(text, outline_day.day),
+            use_cache=use_cache,
+            chain=self.structured_day_chain,
+            day_number=outline_day.day,
+            day_title=outline_day.title,
+            day_summary=outline_day.summary,
+            trip_outline=trip_outline,
+            destination=destination,
+            preferences=preferences,
+            chat_history=chat_history
+        )
+    
+    def generate_structured_itinerary(self, outline_days, destination, preferences, chat_history,
+                                      use_cache=True, max_workers=4):
+        """Plan every day of a structured outline concurrently and return an Itinerary"""
+        trip_outline = outline_titles(outline_days)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(outline_days)))) as pool:
+            plans = list(pool.map(
+                lambda day: self.generate_structured_day(
+                    day, trip_outline, destination, preferences, chat_history, use_cache
+                ),
+                outline_days
+            ))
+        return Itinerary(destination=destination, days=plans)
+    
+    async def agenerate_structured_itinerary(self, outline_days, destination, preferences, chat_history,
+                                             use_cache=True, max_concurrency=4):
+        """Async counterpart of generate_structured_itinerary"""
+        trip_outline = outline_titles(outline_days)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def plan_one(day):
+            async with semaphore:
+                return await self.agenerate_structured_day(
+                    day, trip_outline, destination, preferences, chat_history, use_cache
+                )
+        
+        plans = await asyncio.gather(*(plan_one(day) for day in outline_days))
+        return Itinerary(destination=destination, days=list(plans))
+    
+    def generate_detailed_itinerary_by_day(self, outline, destination, preferences, chat_history,
+                                           use_cache=True, max_workers=4):
+        """Detail every "Day N:" line of the outline concurrently and merge the days in order.
+        
+        Falls back to a single whole-trip completion when the outline has fewer than two days.
+        """
+        days = parse_outline_days(outline)
+        if len(days) < 2:
+            return self.generate_detailed_itinerary(outline, destination, preferences, chat_history, use_cache)
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(days))) as pool:
+            details = list(pool.map(
+                lambda day: self.generate_day_detail(day, outline, destination, preferences, chat_history, use_cache),
+                days
+            ))
+        return merge_day_details(days, details)
+    
+    async def agenerate_detailed_itinerary_by_day(self, outline, destination, preferences, chat_history,
+                                                  use_cache=True, max_concurrency=4):
+        """Async counterpart of generate_detailed_itinerary_by_day"""
+        days = parse_outline_days(outline)
+        if len(days) < 2:
+            return await self.agenerate_detailed_itinerary(outline, destination, preferences, chat_history, use_cache)
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def detail_one(day):
+            async with semaphore:
+                return await self.agenerate_day_detail(day, outline, destination, preferences, chat_history, use_cache)
+        
+        details = await asyncio.gather(*(detail_one(day) for day in days))
+        return merge_day_details(days, details)
+    
+    def stream_detailed_itinerary_by_day(self, outline, destination, preferences, chat_history,
+                                         use_cache=True, max_workers=4):
+        """Streaming counterpart of generate_detailed_itinerary_by_day.
+        
+        Day 1 streams token by token while the remaining days are generated in the
+        background; each later day is yielded whole, in order, as soon as it is ready.
+        """
+        days = parse_outline_days(outline)
+        if len(days) < 2:
+            yield from self.stream_detailed_itinerary(outline, destination, preferences, chat_history, use_cache)
+            return
+        
+        pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers - 1, len(days) - 1)))
+        try:
+            futures = [
+                pool.submit(self.generate_day_detail, day, outline, destination, preferences, chat_history, use_cache)
+                for day in days[1:]
+            ]
+            
+            first_number, first_outline = days[0]
+            # Attach the heading to the first model chunk so time-to-first-token stays meaningful
+            heading = day_heading(first_number, first_outline) + "\n"
+            for text in self._stream_chain(
+                use_cache=use_cache,
+                chain=self.day_chain,
+                day_number=first_number,
+                day_outline=first_outline,
+                outline=outline,
+                destination=destination,
+                preferences=preferences,
+                chat_history=chat_history
+            ):
+                yield heading + text
+                heading = ""
+            if heading:
+                yield heading
+            
+            for (day_number, day_outline), future in zip(days[1:], futures):
+                yield f"\n\n{day_heading(day_number, day_outline)}\n{future.result().strip()}"
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
 
 
-class PackingChecklistGenerator:
+class PackingChecklistGenerator(BaseGenerator):
     """LLM 3: ChatGroq for generating packing checklist based on activities and weather"""
     
-    def __init__(self):
+    stage = "packing_checklist"
+    provider = "groq"
+    model_name = "llama-3.1-8b-instant"  # Using the same model as outline generator
+    temperature = 0.4  # Lower temperature for more consistent packing recommendations
+    backup_provider = "google"
+    backup_model_name = "gemini-1.5-flash"
+    expected_completion_tokens = 600
+    
+    def _create_llm(self):
         # Use ChatGroq for packing checklist generation
-        self.llm = ChatGroq(
-            groq_api_key=os.getenv("GROQ_API_KEY"),
-            model_name="llama-3.1-8b-instant",  # Using the same model as outline generator
-            temperature=0.4  # Lower temperature for more consistent packing recommendations
-        )
+        return get_groq_llm(self.model_name, self.temperature)
+    
+    def _create_backup_llm(self):
+        return get_gemini_llm(self.backup_model_name, self.temperature)
+    
+    def _build_chains(self):
+        from langchain.prompts import PromptTemplate
+        from langchain.chains import LLMChain
         
         self.prompt_template = PromptTemplate(
             input_variables=["itinerary", "destination", "chat_history"],
@@ -157,143 +914,1198 @@ class PackingChecklistGenerator:
         )
         
         self.chain = LLMChain(llm=self.llm, prompt=self.prompt_template)
+        
+        # Pipelined mode: summarize each finished day's packing needs, then merge the summaries
+        self.activity_prompt_template = PromptTemplate(
+            input_variables=["day_number", "day_detail", "destination"],
+            template="""
+            You are a travel packing expert. Read ONE day of a trip itinerary and list only
+            what matters for packing.
+
+            Destination: {destination}
+            Day {day_number} Itinerary: {day_detail}
+
+            Respond with at most 5 short bullet points covering:
+            - Activities that need specific gear or clothing (hiking, swimming, formal dining, etc.)
+            - Environments visited (beach, mountains, city, religious sites, etc.)
+            - Weather or time-of-day considerations
+
+            Packing-relevant notes for Day {day_number}:
+            """
+        )
+        
+        self.activity_chain = LLMChain(llm=self.llm, prompt=self.activity_prompt_template)
+        
+        self.merge_prompt_template = PromptTemplate(
+            input_variables=["activity_notes", "destination", "chat_history"],
+            template="""
+            You are a travel packing expert. Based on the per-day packing notes and destination,
+            create a comprehensive packing checklist that considers the planned activities and expected weather.
+
+            Destination: {destination}
+            Packing Notes by Day: {activity_notes}
+            Chat History: {chat_history}
+
+            Combine the notes into one packing checklist organized by categories:
+
+            CLOTHING:
+            - Weather-appropriate clothing for {destination}
+            - Activity-specific clothing (hiking, swimming, formal dining, etc.)
+
+            ELECTRONICS:
+            - Essential electronics and accessories
+
+            DOCUMENTS:
+            - Travel documents and important papers
+
+            HEALTH & HYGIENE:
+            - Personal care items and medications
+
+            ACTIVITY-SPECIFIC ITEMS:
+            - Items needed for specific activities mentioned in the notes
+
+            MISCELLANEOUS:
+            - Other useful items for the trip
+
+            Be specific and practical. Consider the season, climate, and specific activities planned.
+            Include quantity suggestions where helpful (e.g., "3-4 t-shirts").
+
+            Packing Checklist:
+            """
+        )
+        
+        self.merge_chain = LLMChain(llm=self.llm, prompt=self.merge_prompt_template)
+        
+        # Compact mode: activity/environment tags extracted locally stand in for the itinerary
+        self.features_prompt_template = PromptTemplate(
+            input_variables=["trip_features", "destination"],
+            template="""
+            You are a travel packing expert. Create a packing checklist for a trip to {destination}
+            from this summary of the planned itinerary (each tag shows how many days involve it):
+
+            {trip_features}
+
+            Organize the checklist by categories: CLOTHING, ELECTRONICS, DOCUMENTS,
+            HEALTH & HYGIENE, ACTIVITY-SPECIFIC ITEMS, MISCELLANEOUS.
+
+            Be specific and practical. Consider the likely climate in {destination} and scale
+            quantities to the trip length (e.g., "3-4 t-shirts").
+
+            Packing Checklist:
+            """
+        )
+        
+        self.features_chain = LLMChain(llm=self.llm, prompt=self.features_prompt_template)
+    
+    def generate_packing_checklist(self, itinerary, destination, chat_history, use_cache=True):
+        return self._run_chain(
+            use_cache=use_cache,
+            itinerary=itinerary,
+            destination=destination,
+            chat_history=chat_history
+        )
     
-    def generate_packing_checklist(self, itinerary, destination, chat_history):
-        return self.chain.run(
+    async def agenerate_packing_checklist(self, itinerary, destination, chat_history, use_cache=True):
+        return await self._arun_chain(
+            use_cache=use_cache,
             itinerary=itinerary,
             destination=destination,
             chat_history=chat_history
         )
+    
+    def stream_packing_checklist(self, itinerary, destination, chat_history, use_cache=True):
+        return self._stream_chain(
+            use_cache=use_cache,
+            itinerary=itinerary,
+            destination=destination,
+            chat_history=chat_history
+        )
+    
+    def extract_day_activities(self, day_number, day_detail, destination, use_cache=True):
+        """Summarize the packing-relevant activities of one finished itinerary day"""
+        return self._run_chain(
+            use_cache=use_cache,
+            chain=self.activity_chain,
+            day_number=day_number,
+            day_detail=day_detail,
+            destination=destination
+        )
+    
+    async def aextract_day_activities(self, day_number, day_detail, destination, use_cache=True):
+        return await self._arun_chain(
+            use_cache=use_cache,
+            chain=self.activity_chain,
+            day_number=day_number,
+            day_detail=day_detail,
+            destination=destination
+        )
+    
+    def generate_packing_checklist_from_activities(self, activity_notes, destination, chat_history, use_cache=True):
+        """Merge per-day packing notes into the final checklist"""
+        return self._run_chain(
+            use_cache=use_cache,
+            chain=self.merge_chain,
+            activity_notes=activity_notes,
+            destination=destination,
+            chat_history=chat_history
+        )
+    
+    async def agenerate_packing_checklist_from_activities(self, activity_notes, destination, chat_history,
+                                                          use_cache=True):
+        return await self._arun_chain(
+            use_cache=use_cache,
+            chain=self.merge_chain,
+            activity_notes=activity_notes,
+            destination=destination,
+            chat_history=chat_history
+        )
+    
+    def generate_packing_checklist_from_features(self, itinerary, destination, use_cache=True):
+        """Checklist from tags extracted locally from the itinerary (no itinerary text or chat history is sent)"""
+        return self._run_chain(
+            use_cache=use_cache,
+            chain=self.features_chain,
+            trip_features=format_packing_features(extract_packing_features(itinerary)),
+            destination=destination
+        )
+    
+    async def agenerate_packing_checklist_from_features(self, itinerary, destination, use_cache=True):
+        return await self._arun_chain(
+            use_cache=use_cache,
+            chain=self.features_chain,
+            trip_features=format_packing_features(extract_packing_features(itinerary)),
+            destination=destination
+        )
+    
+    def generate_packing_checklist_from_trip_features(self, trip_features, destination, use_cache=True):
+        """Checklist from already formatted features (see format_packing_features)"""
+        return self._run_chain(
+            use_cache=use_cache,
+            chain=self.features_chain,
+            trip_features=trip_features,
+            destination=destination
+        )
+    
+    async def agenerate_packing_checklist_from_trip_features(self, trip_features, destination, use_cache=True):
+        return await self._arun_chain(
+            use_cache=use_cache,
+            chain=self.features_chain,
+            trip_features=trip_features,
+            destination=destination
+        )
+    
+    def stream_packing_checklist_from_features(self, itinerary, destination, use_cache=True):
+        return self._stream_chain(
+            use_cache=use_cache,
+            chain=self.features_chain,
+            trip_features=format_packing_features(extract_packing_features(itinerary)),
+            destination=destination
+        )
 
 
 class TravelPlanner:
     """Main controller class that orchestrates the three LLM classes and manages memory"""
     
-    def __init__(self, preferences_file="user_preferences.json"):
+    def __init__(self, preferences_file="user_preferences.json", cache_path=DEFAULT_CACHE_PATH,
+                 day_concurrency=4, verbose=True, memory_token_limit=None, preferences_namespace=None,
+                 metrics=None, hedging=False, max_attempts=DEFAULT_MAX_ATTEMPTS, stage_deadlines=None,
+                 compact_packing=True, semantic_cache=None, coalesce=True, rate_limit=True,
+                 checkpoint_path=DEFAULT_CHECKPOINT_PATH):
         self.preferences_file = preferences_file
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
+        # Print pipeline progress lines (disable for batch or service use)
+        self.verbose = verbose
+        # How many days of the detailed itinerary to generate in parallel (None for one whole-trip completion)
+        self.day_concurrency = day_concurrency
+        # Build the packing prompt from locally extracted activity tags instead of the full itinerary
+        self.compact_packing = compact_packing
+        # Session memory is created on first use (see the memory property)
+        self.memory_token_limit = memory_token_limit
+        self._memory = None
+        # Serializes memory reads and writes; the async API saves turns from worker threads
+        self._memory_lock = threading.Lock()
+        
+        # Load persistent preferences (namespaced per user when preferences_namespace is given)
+        self.preference_store = PreferenceStore(preferences_file, namespace=preferences_namespace)
+        self._preferences_version = None
+        self.persistent_preferences = PreferenceIndex(self.load_preferences())
+        
+        # Shared on-disk response cache (pass cache_path=None to disable)
+        self.cache = LLMResponseCache(cache_path) if cache_path else None
+        
+        # Completed stages of unfinished plans, so a retry after a failure resumes where it
+        # stopped (pass checkpoint_path=None to disable)
+        self.checkpoints = CheckpointStore(checkpoint_path) if checkpoint_path else None
+        
+        # Optional SemanticPlanCache that reuses whole plans for near-identical requests
+        # (pass one instance to several planners to share it)
+        self.semantic_cache = semantic_cache
+        
+        # Artifacts of the last free-form plan, the default starting point for replan()
+        self.last_plan = None
+        
+        # Per-stage latency, token and cost spans (pass a shared MetricsRecorder to aggregate planners)
+        self.metrics = metrics or MetricsRecorder()
+        
+        # Per-call deadlines (seconds, by stage), retries on transient errors and optional
+        # hedging of slow calls to the other provider
+        deadlines = dict(STAGE_DEADLINES, **(stage_deadlines or {}))
+        resilience = {
+            stage: ResilientCaller(deadline=deadlines.get(stage), max_attempts=max_attempts, hedge=hedging)
+            for stage in ("outline", "detailed_itinerary", "packing_checklist")
+        }
+        
+        # Identical model calls in flight anywhere in the process (e.g. many sessions planning
+        # a trending destination) share one completion
+        self.single_flight = default_single_flight if coalesce else None
+        
+        # Per-provider/model request and token buckets with adaptive concurrency, shared
+        # process-wide because the providers' limits apply to the whole API key
+        self.rate_limiters = default_rate_limiters if rate_limit else None
+        
+        # Generators are cheap to create; each builds its LLM client and chains on first use
+        self.outline_generator = OutlineGenerator(
+            cache=self.cache, metrics=self.metrics, resilience=resilience["outline"],
+            single_flight=self.single_flight, rate_limiters=self.rate_limiters
+        )
+        self.detailed_generator = DetailedItineraryGenerator(
+            cache=self.cache, metrics=self.metrics, resilience=resilience["detailed_itinerary"],
+            single_flight=self.single_flight, rate_limiters=self.rate_limiters
+        )
+        self.packing_generator = PackingChecklistGenerator(
+            cache=self.cache, metrics=self.metrics, resilience=resilience["packing_checklist"],
+            single_flight=self.single_flight, rate_limiters=self.rate_limiters
         )
+    
+    @property
+    def memory(self):
+        """Session memory, created the first time it is needed"""
+        if self._memory is None:
+            self._memory = self._build_memory(self.memory_token_limit)
+        return self._memory
+    
+    def _build_memory(self, memory_token_limit):
+        """Create the session memory.
         
-        # Load persistent preferences
-        self.persistent_preferences = self.load_preferences()
+        Without a limit the full conversation is kept verbatim. With memory_token_limit set,
+        the most recent turns are kept verbatim up to that many tokens and older turns are
+        rolled into a running summary, so the chat history sent to each prompt stays bounded.
+        """
+        if not memory_token_limit:
+            from langchain.memory import ConversationBufferMemory
+            return ConversationBufferMemory(
+                memory_key="chat_history",
+                return_messages=True
+            )
         
-        self.outline_generator = OutlineGenerator()
-        self.detailed_generator = DetailedItineraryGenerator()
-        self.packing_generator = PackingChecklistGenerator()
+        from langchain.memory import ConversationSummaryBufferMemory
+        summary_llm = get_groq_llm(
+            "llama-3.1-8b-instant", 0, custom_get_token_ids=approximate_token_ids
+        )
+        return ConversationSummaryBufferMemory(
+            llm=summary_llm,
+            max_token_limit=memory_token_limit,
+            memory_key="chat_history",
+            return_messages=True
+        )
     
     def load_preferences(self):
-        """Load preferences from JSON file"""
+        """Load preferences from the shared preference store"""
         try:
-            if os.path.exists(self.preferences_file):
-                with open(self.preferences_file, 'r') as f:
-                    return json.load(f)
-            return []
+            self._preferences_version = self.preference_store.version()
+            return self.preference_store.load()
         except Exception as e:
             print(f"Warning: Could not load preferences file: {e}")
             return []
     
     def save_preferences(self):
-        """Save preferences to JSON file"""
+        """Write the full preference list as a fresh snapshot (adds and removes only append to the log)"""
         try:
-            with open(self.preferences_file, 'w') as f:
-                json.dump(self.persistent_preferences, f, indent=2)
+            self.preference_store.save(self.persistent_preferences.as_list())
+            self._preferences_version = self.preference_store.version()
         except Exception as e:
             print(f"Warning: Could not save preferences: {e}")
     
+    def refresh_preferences(self):
+        """Pick up preferences written by other processes since the last load"""
+        if self.preference_store.version() != self._preferences_version:
+            self.persistent_preferences = PreferenceIndex(self.load_preferences())
+    
     def extract_preferences_from_memory(self):
-        """Extract user preferences from conversation history and persistent storage"""
-        # Combine persistent preferences with current session preferences
-        all_preferences = self.persistent_preferences.copy()
-        
-        # Add preferences from current session memory
-        chat_history = self.memory.chat_memory.messages
-        for message in chat_history:
-            content = message.content
-            if any(keyword in content.lower() for keyword in ['prefer', 'like', 'love', 'enjoy', 'hate', 'dislike', 'preference']):
-                if "User preference:" in content:
-                    preference_text = content.split("User preference:")[-1].strip()
-                    if preference_text and preference_text not in all_preferences:
-                        all_preferences.append(preference_text)
-                elif "Preference noted:" in content:
-                    preference_text = content.split("Preference noted:")[-1].strip()
-                    if preference_text and preference_text not in all_preferences:
-                        all_preferences.append(preference_text)
-        
-        return " | ".join(all_preferences) if all_preferences else "No specific preferences stored yet."
-    
-    def plan_trip(self, destination, duration):
-        """Main method to orchestrate the complete travel planning pipeline"""
-        
-        print(f"\n🌍 Planning your {duration}-day trip to {destination}...")
-        print("=" * 50)
+        """Preferences string for the prompts.
+        
+        Every preference added this session goes through add_preference, so the index
+        already holds them; the joined string is cached until the index changes.
+        """
+        self.refresh_preferences()
+        return self.persistent_preferences.as_prompt()
+    
+    def plan_trip(self, destination, duration, use_cache=True, pipelined=False, structured=False):
+        """Main method to orchestrate the complete travel planning pipeline.
+        
+        With pipelined=True the itinerary and packing stages overlap: each day is tagged
+        for packing (or, without compact_packing, has its packing notes extracted) as soon
+        as that day's details finish, and only the checklist step waits for the whole trip.
+        
+        With structured=True the outline and itinerary are generated as validated JSON
+        (see itinerary_schema), the packing stage reads a compact digest of the parsed
+        itinerary instead of its prose, and the result also carries an "itinerary" key
+        holding the Itinerary. If the models keep returning invalid JSON the plan falls
+        back to free-form text.
+        
+        With a semantic cache configured (and use_cache=True), a stored plan for the same
+        duration whose destination and preferences are near-identical is returned without
+        calling any model; chat history is not compared.
+        
+        Each completed stage is checkpointed under the plan's ID, so if a later stage
+        fails, calling plan_trip again with the same request resumes after the last
+        completed stage instead of paying for the whole pipeline again.
+        """
+        
+        self._log(f"\n🌍 Planning your {duration}-day trip to {destination}...")
+        self._log("=" * 50)
         
         # Get stored preferences
-        stored_preferences = self.extract_preferences_from_memory()
-        chat_history = str(self.memory.chat_memory.messages)
+        stored_preferences, chat_history = self._planning_context()
+        
+        cached = self._semantic_lookup(destination, duration, stored_preferences, structured, use_cache)
+        if cached is not None:
+            return cached
+        
+        if structured:
+            checkpoint = self._checkpoint_id(destination, duration, stored_preferences, chat_history, "structured")
+            try:
+                result = self._plan_structured(
+                    destination, duration, stored_preferences, chat_history, use_cache, checkpoint
+                )
+            except ItinerarySchemaError as e:
+                print(f"Warning: Structured planning failed ({e}), falling back to free-form text")
+                self._discard_checkpoints(checkpoint)
+            else:
+                self._remember_trip(destination, duration)
+                self._plan_finished(destination, duration, stored_preferences, result, checkpoint=checkpoint)
+                return result
         
+        checkpoint = self._checkpoint_id(
+            destination, duration, stored_preferences, chat_history, "pipelined" if pipelined else "text"
+        )
+        saved = self._resume(checkpoint, use_cache)
         try:
-            # Step 1: Generate outline using ChatGroq
-            print("\n📋 Step 1: Generating day-by-day outline...")
-            outline = self.outline_generator.generate_outline(
-                destination, duration, stored_preferences, chat_history
-            )
-            print("✅ Outline generated!")
-            
-            # Step 2: Generate detailed itinerary using Gemini
-            print("\n📅 Step 2: Creating detailed itinerary...")
-            detailed_itinerary = self.detailed_generator.generate_detailed_itinerary(
-                outline, destination, stored_preferences, chat_history
-            )
-            print("✅ Detailed itinerary created!")
+            if "outline" in saved:
+                outline = saved["outline"]
+                self._log("\n📋 Step 1: ✅ Outline restored from checkpoint")
+            else:
+                # Step 1: Generate outline using ChatGroq
+                self._log("\n📋 Step 1: Generating day-by-day outline...")
+                with self.metrics.stage_span("outline"):
+                    outline = self.outline_generator.generate_outline(
+                        destination, duration, stored_preferences, chat_history, use_cache=use_cache
+                    )
+                self._save_checkpoint(checkpoint, "outline", outline)
+                self._log("✅ Outline generated!")
             
-            # Step 3: Generate packing checklist using ChatGroq
-            print("\n🎒 Step 3: Generating packing checklist...")
-            packing_checklist = self.packing_generator.generate_packing_checklist(
-                detailed_itinerary, destination, chat_history
-            )
-            print("✅ Packing checklist ready!")
+            days = parse_outline_days(outline) if pipelined else []
+            if len(days) >= 2:
+                # Steps 2 & 3 overlapped: detail days with Gemini while ChatGroq extracts packing needs
+                self._log("\n⚡ Steps 2-3: Creating detailed itinerary and packing checklist in parallel...")
+                with self.metrics.stage_span(PIPELINED_STAGE):
+                    detailed_itinerary, packing_checklist = self._run_pipelined_stages(
+                        days, outline, destination, stored_preferences, chat_history, use_cache, checkpoint, saved
+                    )
+                self._log("✅ Detailed itinerary and packing checklist ready!")
+            else:
+                if "detailed_itinerary" in saved:
+                    detailed_itinerary = saved["detailed_itinerary"]
+                    self._log("\n📅 Step 2: ✅ Detailed itinerary restored from checkpoint")
+                else:
+                    # Step 2: Generate detailed itinerary using Gemini
+                    self._log("\n📅 Step 2: Creating detailed itinerary...")
+                    with self.metrics.stage_span("detailed_itinerary"):
+                        detailed_itinerary = self._generate_detailed_itinerary(
+                            outline, destination, stored_preferences, chat_history, use_cache
+                        )
+                    self._save_checkpoint(checkpoint, "detailed_itinerary", detailed_itinerary)
+                    self._log("✅ Detailed itinerary created!")
+                
+                # Step 3: Generate packing checklist using ChatGroq
+                self._log("\n🎒 Step 3: Generating packing checklist...")
+                with self.metrics.stage_span("packing_checklist"):
+                    packing_checklist = self._generate_packing_checklist(
+                        detailed_itinerary, destination, chat_history, use_cache
+                    )
+                self._log("✅ Packing checklist ready!")
             
             # Store this conversation in memory
-            self.memory.save_context(
-                {"input": f"Plan trip to {destination} for {duration} days"},
-                {"output": f"Generated complete travel plan including outline, detailed itinerary, and packing list"}
-            )
+            self._remember_trip(destination, duration)
             
-            return {
+            result = {
                 "outline": outline,
                 "detailed_itinerary": detailed_itinerary,
                 "packing_checklist": packing_checklist
             }
+            self._plan_finished(destination, duration, stored_preferences, result, checkpoint=checkpoint)
+            return result
             
         except Exception as e:
-            print(f"❌ Error in travel planning pipeline: {e}")
+            self._log(f"❌ Error in travel planning pipeline: {e}")
+            if self.checkpoints is not None:
+                self._log("💾 Completed stages were saved; plan the same trip again to resume")
             raise
     
+    async def aplan_trip(self, destination, duration, use_cache=True, pipelined=False, structured=False):
+        """Async counterpart of plan_trip.
+        
+        Progress lines are not printed so that concurrent plans don't interleave their output.
+        """
+        stored_preferences, chat_history = await self._aplanning_context()
+        
+        cached = self._semantic_lookup(
+            destination, duration, stored_preferences, structured, use_cache, remember=False
+        )
+        if cached is not None:
+            await self._aremember_trip(destination, duration)
+            return cached
+        
+        if structured:
+            checkpoint = self._checkpoint_id(destination, duration, stored_preferences, chat_history, "structured")
+            try:
+                result = await self._aplan_structured(
+                    destination, duration, stored_preferences, chat_history, use_cache, checkpoint
+                )
+            except ItinerarySchemaError as e:
+                print(f"Warning: Structured planning failed ({e}), falling back to free-form text")
+                self._discard_checkpoints(checkpoint)
+            else:
+                await self._aremember_trip(destination, duration)
+                self._plan_finished(destination, duration, stored_preferences, result, checkpoint=checkpoint)
+                return result
+        
+        checkpoint = self._checkpoint_id(
+            destination, duration, stored_preferences, chat_history, "pipelined" if pipelined else "text"
+        )
+        saved = self._resume(checkpoint, use_cache)
+        if "outline" in saved:
+            outline = saved["outline"]
+        else:
+            with self.metrics.stage_span("outline"):
+                outline = await self.outline_generator.agenerate_outline(
+                    destination, duration, stored_preferences, chat_history, use_cache=use_cache
+                )
+            self._save_checkpoint(checkpoint, "outline", outline)
+        
+        days = parse_outline_days(outline) if pipelined else []
+        if len(days) >= 2:
+            with self.metrics.stage_span(PIPELINED_STAGE):
+                detailed_itinerary, packing_checklist = await self._arun_pipelined_stages(
+                    days, outline, destination, stored_preferences, chat_history, use_cache, checkpoint, saved
+                )
+        else:
+            if "detailed_itinerary" in saved:
+                detailed_itinerary = saved["detailed_itinerary"]
+            else:
+                with self.metrics.stage_span("detailed_itinerary"):
+                    detailed_itinerary = await self._agenerate_detailed_itinerary(
+                        outline, destination, stored_preferences, chat_history, use_cache
+                    )
+                self._save_checkpoint(checkpoint, "detailed_itinerary", detailed_itinerary)
+            with self.metrics.stage_span("packing_checklist"):
+                packing_checklist = await self._agenerate_packing_checklist(
+                    detailed_itinerary, destination, chat_history, use_cache
+                )
+        
+        await self._aremember_trip(destination, duration)
+        
+        result = {
+            "outline": outline,
+            "detailed_itinerary": detailed_itinerary,
+            "packing_checklist": packing_checklist
+        }
+        self._plan_finished(destination, duration, stored_preferences, result, checkpoint=checkpoint)
+        return result
+    
+    async def aplan_many(self, requests, max_concurrency=4, use_cache=True, return_exceptions=False,
+                         pipelined=False, structured=False):
+        """Plan many trips concurrently from one event loop.
+        
+        requests is an iterable of {"destination": ..., "duration": ...} dicts or
+        (destination, duration) tuples. Results come back in request order; with
+        return_exceptions=True a failed trip yields its exception instead of
+        cancelling the whole batch, mirroring asyncio.gather.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def plan_one(request):
+            if isinstance(request, dict):
+                destination, duration = request["destination"], request["duration"]
+            else:
+                destination, duration = request
+            async with semaphore:
+                return await self.aplan_trip(
+                    destination, duration, use_cache=use_cache, pipelined=pipelined, structured=structured
+                )
+        
+        return await asyncio.gather(
+            *(plan_one(request) for request in requests),
+            return_exceptions=return_exceptions
+        )
+    
+    def replan(self, destination=None, duration=None, previous=None, use_cache=True):
+        """Re-plan a trip, regenerating only the artifacts whose inputs changed.
+        
+        previous is a PlanArtifacts, by default the last free-form plan made by this
+        planner (see last_plan); destination and duration default to its own. Every
+        outline line, day and packing checklist is kept while the content hash of its
+        inputs is unchanged. A longer trip only generates its extra outline lines and
+        days, a shorter one is truncated, and the packing checklist is regenerated
+        only when the itinerary it is built from changes. A new destination or a
+        changed preference invalidates the outline and every day. Chat history is
+        not part of any hash.
+        
+        Returns the same dict as plan_trip plus "rebuilt", which records what was
+        regenerated: {"outline": "reused" | "truncated" | "extended" | "generated",
+        "days": [day numbers], "packing_checklist": bool}.
+        """
+        previous = previous or self.last_plan
+        if previous is None and (destination is None or duration is None):
+            raise ValueError("replan needs a destination and duration when there is no previous plan")
+        destination = previous.destination if destination is None else destination
+        duration = duration or previous.duration
+        
+        self._log(f"\n🔁 Re-planning your {duration}-day trip to {destination}...")
+        self._log("=" * 50)
+        stored_preferences, chat_history = self._planning_context()
+        
+        # Outline: keep the previous lines when destination and preferences are unchanged
+        days = None
+        new_outline_hash = outline_hash(destination, stored_preferences)
+        if previous is not None and previous.outline_hash == new_outline_hash and previous.days:
+            days = [(day.day, day.outline) for day in previous.days[:duration]]
+            if [number for number, _ in days] != list(range(1, len(days) + 1)):
+                days = None
+            elif len(previous.days) > duration:
+                outline_action = "truncated"
+            elif len(days) == duration:
+                outline_action = "reused"
+            else:
+                self._log(f"\n📋 Outlining days {len(days) + 1}-{duration}...")
+                with self.metrics.stage_span("outline"):
+                    days = self._extend_outline_days(days, destination, duration, stored_preferences,
+                                                     chat_history, use_cache)
+                outline_action = "extended"
+        
+        if days is None:
+            self._log("\n📋 Generating day-by-day outline...")
+            with self.metrics.stage_span("outline"):
+                outline = self.outline_generator.generate_outline(
+                    destination, duration, stored_preferences, chat_history, use_cache=use_cache
+                )
+            days = parse_outline_days(outline)
+            outline_action = "generated"
+            if not days:
+                # Nothing to re-plan per day; the outline is cached, so plan_trip picks it up
+                self._log("⚠️ The outline has no day headings, planning the whole trip instead")
+                result = self.plan_trip(destination, duration, use_cache=use_cache)
+                result["rebuilt"] = {"outline": "generated", "days": list(range(1, duration + 1)),
+                                     "packing_checklist": True}
+                return result
+        outline = "\n".join(f"Day {number}: {text}" for number, text in days)
+        
+        # Days: reuse every detail whose day number, outline line, destination and preferences match
+        day_artifacts = []
+        for number, text in days:
+            input_hash = day_hash(destination, stored_preferences, number, text)
+            old = previous.day(number) if previous is not None else None
+            detail = old.detail if old is not None and old.input_hash == input_hash else None
+            day_artifacts.append(DayArtifact(day=number, outline=text, detail=detail, input_hash=input_hash))
+        
+        stale = [artifact for artifact in day_artifacts if artifact.detail is None]
+        if stale:
+            self._log(f"\n📅 Detailing day(s) {', '.join(str(artifact.day) for artifact in stale)}...")
+            with self.metrics.stage_span("detailed_itinerary"):
+                with ThreadPoolExecutor(max_workers=min(self.day_concurrency or 1, len(stale))) as pool:
+                    details = pool.map(
+                        lambda artifact: self.detailed_generator.generate_day_detail(
+                            (artifact.day, artifact.outline), outline, destination, stored_preferences,
+                            chat_history, use_cache
+                        ),
+                        stale
+                    )
+                    for artifact, detail in zip(stale, details):
+                        artifact.detail = detail.strip()
+        detailed_itinerary = merge_day_details(days, [artifact.detail for artifact in day_artifacts])
+        
+        # Packing: only when the itinerary features (or the itinerary itself) changed
+        new_packing_hash = packing_hash(destination, self._packing_input(detailed_itinerary))
+        refresh_packing = previous is None or previous.packing_hash != new_packing_hash
+        if refresh_packing:
+            self._log("\n🎒 Refreshing packing checklist...")
+            with self.metrics.stage_span("packing_checklist"):
+                packing_checklist = self._generate_packing_checklist(
+                    detailed_itinerary, destination, chat_history, use_cache
+                )
+        else:
+            packing_checklist = previous.packing_checklist
+        self._log("✅ Plan updated!")
+        
+        self._remember_trip(destination, duration)
+        
+        result = {
+            "outline": outline,
+            "detailed_itinerary": detailed_itinerary,
+            "packing_checklist": packing_checklist,
+            "rebuilt": {
+                "outline": outline_action,
+                "days": [artifact.day for artifact in stale],
+                "packing_checklist": refresh_packing
+            }
+        }
+        self._plan_finished(destination, duration, stored_preferences, result, PlanArtifacts(
+            destination=destination.strip(),
+            duration=duration,
+            outline_hash=new_outline_hash,
+            days=day_artifacts,
+            packing_hash=new_packing_hash,
+            packing_checklist=packing_checklist
+        ))
+        return result
+    
+    def _extend_outline_days(self, days, destination, duration, preferences, chat_history, use_cache):
+        """days (numbered 1..n) plus outline lines for days n+1..duration, or None if the model
+        did not return exactly those days"""
+        extension = self.outline_generator.extend_outline(
+            "\n".join(f"Day {number}: {text}" for number, text in days),
+            destination, duration, preferences, chat_history, use_cache=use_cache
+        )
+        added = [(number, text) for number, text in parse_outline_days(extension) if len(days) < number <= duration]
+        if [number for number, _ in added] != list(range(len(days) + 1, duration + 1)):
+            print(f"Warning: Outline extension did not cover days {len(days) + 1}-{duration}, regenerating the outline")
+            return None
+        return days + added
+    
+    def plan_trip_stream(self, destination, duration, use_cache=True):
+        """Streaming variant of plan_trip that yields stage-tagged events as tokens arrive.
+        
+        Each event is a dict with "stage" and "type" keys:
+        - "stage_start": a stage is about to call its model
+        - "token": a chunk of generated text in event["text"]
+        - "stage_complete": the stage finished; carries "time_to_first_token" and "elapsed" seconds
+        - "result": the final event (stage "complete") with the same dict plan_trip returns
+        
+        A semantic cache hit replays the stored plan as one token event per stage, and so
+        do stages restored from the checkpoints of an earlier attempt that failed.
+        """
+        stored_preferences, chat_history = self._planning_context()
+        
+        cached = self._semantic_lookup(destination, duration, stored_preferences, False, use_cache)
+        if cached is not None:
+            yield from self._replay_stream(cached)
+            return
+        
+        # Same plan ID as plan_trip, so a failed stream can be resumed by either
+        checkpoint = self._checkpoint_id(destination, duration, stored_preferences, chat_history, "text")
+        saved = self._resume(checkpoint, use_cache)
+        if "outline" in saved:
+            outline = saved["outline"]
+            yield from self._replay_stage("outline", outline)
+        else:
+            outline = yield from self._stream_stage(
+                "outline",
+                self.outline_generator.stream_outline(
+                    destination, duration, stored_preferences, chat_history, use_cache=use_cache
+                )
+            )
+            self._save_checkpoint(checkpoint, "outline", outline)
+        if "detailed_itinerary" in saved:
+            detailed_itinerary = saved["detailed_itinerary"]
+            yield from self._replay_stage("detailed_itinerary", detailed_itinerary)
+        else:
+            detailed_itinerary = yield from self._stream_stage(
+                "detailed_itinerary",
+                self._stream_detailed_itinerary(
+                    outline, destination, stored_preferences, chat_history, use_cache
+                )
+            )
+            self._save_checkpoint(checkpoint, "detailed_itinerary", detailed_itinerary)
+        packing_checklist = yield from self._stream_stage(
+            "packing_checklist",
+            self._stream_packing_checklist(detailed_itinerary, destination, chat_history, use_cache)
+        )
+        
+        self._remember_trip(destination, duration)
+        
+        result = {
+            "outline": outline,
+            "detailed_itinerary": detailed_itinerary,
+            "packing_checklist": packing_checklist
+        }
+        self._plan_finished(destination, duration, stored_preferences, result, checkpoint=checkpoint)
+        yield {"stage": "complete", "type": "result", "result": result}
+    
+    def _replay_stream(self, result):
+        """Stream events for an already finished plan"""
+        for stage in ("outline", "detailed_itinerary", "packing_checklist"):
+            yield from self._replay_stage(stage, result[stage])
+        yield {"stage": "complete", "type": "result", "result": result}
+    
+    @staticmethod
+    def _replay_stage(stage, text):
+        """Stream events for a stage whose text is already known"""
+        yield {"stage": stage, "type": "stage_start"}
+        yield {"stage": stage, "type": "token", "text": text}
+        yield {"stage": stage, "type": "stage_complete", "time_to_first_token": 0.0, "elapsed": 0.0}
+    
+    def _stream_stage(self, stage, chunks):
+        """Re-yield a stage's text chunks as events and return the full stage text"""
+        yield {"stage": stage, "type": "stage_start"}
+        
+        with self.metrics.stage_span(stage) as span:
+            start = time.perf_counter()
+            time_to_first_token = None
+            parts = []
+            for text in chunks:
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - start
+                parts.append(text)
+                yield {"stage": stage, "type": "token", "text": text}
+            span["time_to_first_token"] = time_to_first_token
+        
+        yield {
+            "stage": stage,
+            "type": "stage_complete",
+            "time_to_first_token": time_to_first_token,
+            "elapsed": span["wall_time"]
+        }
+        return "".join(parts)
+    
+    def _plan_structured(self, destination, duration, preferences, chat_history, use_cache, checkpoint=None):
+        """Structured pipeline behind plan_trip(structured=True)"""
+        saved = self._resume(checkpoint, use_cache)
+        if "outline" in saved:
+            outline_days = [OutlineDay(**day) for day in saved["outline"]]
+            self._log("\n📋 Step 1: ✅ Outline restored from checkpoint")
+        else:
+            self._log("\n📋 Step 1: Generating structured day-by-day outline...")
+            with self.metrics.stage_span("outline"):
+                outline_days = self.outline_generator.generate_structured_outline(
+                    destination, duration, preferences, chat_history, use_cache=use_cache
+                )
+            self._save_checkpoint(checkpoint, "outline", [asdict(day) for day in outline_days])
+            self._log("✅ Outline generated!")
+        
+        if "detailed_itinerary" in saved:
+            itinerary = Itinerary.from_dict(saved["detailed_itinerary"])
+            self._log("\n📅 Step 2: ✅ Detailed itinerary restored from checkpoint")
+        else:
+            self._log("\n📅 Step 2: Creating structured itinerary...")
+            with self.metrics.stage_span("detailed_itinerary"):
+                itinerary = self.detailed_generator.generate_structured_itinerary(
+                    outline_days, destination, preferences, chat_history, use_cache,
+                    max_workers=self.day_concurrency or 1
+                )
+            self._save_checkpoint(checkpoint, "detailed_itinerary", itinerary.to_dict())
+            self._log("✅ Detailed itinerary created!")
+        
+        # The digest lists each day's activities and places, a fraction of the itinerary's tokens
+        self._log("\n🎒 Step 3: Generating packing checklist...")
+        with self.metrics.stage_span("packing_checklist"):
+            if self.compact_packing:
+                packing_checklist = self.packing_generator.generate_packing_checklist_from_features(
+                    packing_digest(itinerary), destination, use_cache
+                )
+            else:
+                packing_checklist = self.packing_generator.generate_packing_checklist_from_activities(
+                    packing_digest(itinerary), destination, chat_history, use_cache
+                )
+        self._log("✅ Packing checklist ready!")
+        
+        return {
+            "outline": render_outline(outline_days),
+            "detailed_itinerary": render_itinerary(itinerary),
+            "packing_checklist": packing_checklist,
+            "itinerary": itinerary
+        }
+    
+    async def _aplan_structured(self, destination, duration, preferences, chat_history, use_cache, checkpoint=None):
+        """Async counterpart of _plan_structured"""
+        saved = self._resume(checkpoint, use_cache)
+        if "outline" in saved:
+            outline_days = [OutlineDay(**day) for day in saved["outline"]]
+        else:
+            with self.metrics.stage_span("outline"):
+                outline_days = await self.outline_generator.agenerate_structured_outline(
+                    destination, duration, preferences, chat_history, use_cache=use_cache
+                )
+            self._save_checkpoint(checkpoint, "outline", [asdict(day) for day in outline_days])
+        if "detailed_itinerary" in saved:
+            itinerary = Itinerary.from_dict(saved["detailed_itinerary"])
+        else:
+            with self.metrics.stage_span("detailed_itinerary"):
+                itinerary = await self.detailed_generator.agenerate_structured_itinerary(
+                    outline_days, destination, preferences, chat_history, use_cache,
+                    max_concurrency=self.day_concurrency or 1
+                )
+            self._save_checkpoint(checkpoint, "detailed_itinerary", itinerary.to_dict())
+        with self.metrics.stage_span("packing_checklist"):
+            if self.compact_packing:
+                packing_checklist = await self.packing_generator.agenerate_packing_checklist_from_features(
+                    packing_digest(itinerary), destination, use_cache
+                )
+            else:
+                packing_checklist = await self.packing_generator.agenerate_packing_checklist_from_activities(
+                    packing_digest(itinerary), destination, chat_history, use_cache
+                )
+        
+        return {
+            "outline": render_outline(outline_days),
+            "detailed_itinerary": render_itinerary(itinerary),
+            "packing_checklist": packing_checklist,
+            "itinerary": itinerary
+        }
+    
+    def _generate_detailed_itinerary(self, outline, destination, preferences, chat_history, use_cache):
+        """Run the detailed itinerary stage, fanning out per day when day_concurrency is set"""
+        if self.day_concurrency:
+            return self.detailed_generator.generate_detailed_itinerary_by_day(
+                outline, destination, preferences, chat_history, use_cache, max_workers=self.day_concurrency
+            )
+        return self.detailed_generator.generate_detailed_itinerary(
+            outline, destination, preferences, chat_history, use_cache
+        )
+    
+    async def _agenerate_detailed_itinerary(self, outline, destination, preferences, chat_history, use_cache):
+        if self.day_concurrency:
+            return await self.detailed_generator.agenerate_detailed_itinerary_by_day(
+                outline, destination, preferences, chat_history, use_cache, max_concurrency=self.day_concurrency
+            )
+        return await self.detailed_generator.agenerate_detailed_itinerary(
+            outline, destination, preferences, chat_history, use_cache
+        )
+    
+    def _stream_detailed_itinerary(self, outline, destination, preferences, chat_history, use_cache):
+        if self.day_concurrency:
+            return self.detailed_generator.stream_detailed_itinerary_by_day(
+                outline, destination, preferences, chat_history, use_cache, max_workers=self.day_concurrency
+            )
+        return self.detailed_generator.stream_detailed_itinerary(
+            outline, destination, preferences, chat_history, use_cache
+        )
+    
+    def _generate_packing_checklist(self, itinerary, destination, chat_history, use_cache):
+        """Run the packing stage, from extracted itinerary features when compact_packing is set"""
+        if self.compact_packing:
+            return self.packing_generator.generate_packing_checklist_from_features(itinerary, destination, use_cache)
+        return self.packing_generator.generate_packing_checklist(
+            itinerary, destination, chat_history, use_cache=use_cache
+        )
+    
+    async def _agenerate_packing_checklist(self, itinerary, destination, chat_history, use_cache):
+        if self.compact_packing:
+            return await self.packing_generator.agenerate_packing_checklist_from_features(
+                itinerary, destination, use_cache
+            )
+        return await self.packing_generator.agenerate_packing_checklist(
+            itinerary, destination, chat_history, use_cache=use_cache
+        )
+    
+    def _stream_packing_checklist(self, itinerary, destination, chat_history, use_cache):
+        if self.compact_packing:
+            return self.packing_generator.stream_packing_checklist_from_features(itinerary, destination, use_cache)
+        return self.packing_generator.stream_packing_checklist(
+            itinerary, destination, chat_history, use_cache=use_cache
+        )
+    
+    def _run_pipelined_stages(self, days, outline, destination, preferences, chat_history, use_cache,
+                              checkpoint=None, saved=None):
+        """Detail each day and extract its packing notes as soon as it finishes, then merge.
+        
+        Gemini day details and ChatGroq note extraction run in separate pools so the
+        two providers work side by side. Returns (detailed_itinerary, packing_checklist).
+        The details and notes are checkpointed before the merge, and taken from saved
+        when an earlier attempt got that far. With compact_packing each day is tagged
+        locally instead (see _run_compact_pipelined_stages).
+        """
+        if self.compact_packing:
+            return self._run_compact_pipelined_stages(
+                days, outline, destination, preferences, chat_history, use_cache, checkpoint, saved
+            )
+        saved = saved or {}
+        if "detailed_itinerary" in saved and "packing_notes" in saved:
+            packing_checklist = self.packing_generator.generate_packing_checklist_from_activities(
+                saved["packing_notes"], destination, chat_history, use_cache
+            )
+            return saved["detailed_itinerary"], packing_checklist
+        
+        workers = self.day_concurrency or 4
+        with ThreadPoolExecutor(max_workers=workers) as detail_pool, \
+                ThreadPoolExecutor(max_workers=workers) as activity_pool:
+            detail_futures = {
+                detail_pool.submit(
+                    self.detailed_generator.generate_day_detail,
+                    day, outline, destination, preferences, chat_history, use_cache
+                ): index
+                for index, day in enumerate(days)
+            }
+            
+            details = [None] * len(days)
+            activity_futures = [None] * len(days)
+            for future in as_completed(detail_futures):
+                index = detail_futures[future]
+                details[index] = future.result()
+                activity_futures[index] = activity_pool.submit(
+                    self.packing_generator.extract_day_activities,
+                    days[index][0], details[index], destination, use_cache
+                )
+            
+            notes = [future.result() for future in activity_futures]
+        
+        detailed_itinerary, packing_notes = merge_day_details(days, details), merge_day_details(days, notes)
+        self._save_checkpoint(checkpoint, "detailed_itinerary", detailed_itinerary)
+        self._save_checkpoint(checkpoint, "packing_notes", packing_notes)
+        packing_checklist = self.packing_generator.generate_packing_checklist_from_activities(
+            packing_notes, destination, chat_history, use_cache
+        )
+        return detailed_itinerary, packing_checklist
+    
+    async def _arun_pipelined_stages(self, days, outline, destination, preferences, chat_history, use_cache,
+                                     checkpoint=None, saved=None):
+        """Async counterpart of _run_pipelined_stages"""
+        if self.compact_packing:
+            return await self._arun_compact_pipelined_stages(
+                days, outline, destination, preferences, chat_history, use_cache, checkpoint, saved
+            )
+        saved = saved or {}
+        if "detailed_itinerary" in saved and "packing_notes" in saved:
+            packing_checklist = await self.packing_generator.agenerate_packing_checklist_from_activities(
+                saved["packing_notes"], destination, chat_history, use_cache
+            )
+            return saved["detailed_itinerary"], packing_checklist
+        
+        workers = self.day_concurrency or 4
+        detail_semaphore = asyncio.Semaphore(workers)
+        activity_semaphore = asyncio.Semaphore(workers)
+        
+        async def detail_and_extract(day):
+            async with detail_semaphore:
+                detail = await self.detailed_generator.agenerate_day_detail(
+                    day, outline, destination, preferences, chat_history, use_cache
+                )
+            async with activity_semaphore:
+                notes = await self.packing_generator.aextract_day_activities(
+                    day[0], detail, destination, use_cache
+                )
+            return detail, notes
+        
+        results = await asyncio.gather(*(detail_and_extract(day) for day in days))
+        details = [detail for detail, _ in results]
+        notes = [note for _, note in results]
+        
+        detailed_itinerary, packing_notes = merge_day_details(days, details), merge_day_details(days, notes)
+        self._save_checkpoint(checkpoint, "detailed_itinerary", detailed_itinerary)
+        self._save_checkpoint(checkpoint, "packing_notes", packing_notes)
+        packing_checklist = await self.packing_generator.agenerate_packing_checklist_from_activities(
+            packing_notes, destination, chat_history, use_cache
+        )
+        return detailed_itinerary, packing_checklist
+    
+    def _run_compact_pipelined_stages(self, days, outline, destination, preferences, chat_history, use_cache,
+                                      checkpoint=None, saved=None):
+        """Pipelined stages with compact_packing: each day is tagged locally as soon as its
+        details finish, and one features prompt (no chat history) makes the checklist.
+        
+        The tags are the same extract_packing_features would find in the merged itinerary,
+        so the prompt matches _packing_input() and replan's packing hash.
+        """
+        saved = saved or {}
+        if "detailed_itinerary" in saved:
+            detailed_itinerary = saved["detailed_itinerary"]
+            features = extract_packing_features(detailed_itinerary)
+        else:
+            workers = self.day_concurrency or 4
+            details = [None] * len(days)
+            day_features = [None] * len(days)
+            with ThreadPoolExecutor(max_workers=workers) as detail_pool:
+                detail_futures = {
+                    detail_pool.submit(
+                        self.detailed_generator.generate_day_detail,
+                        day, outline, destination, preferences, chat_history, use_cache
+                    ): index
+                    for index, day in enumerate(days)
+                }
+                for future in as_completed(detail_futures):
+                    index = detail_futures[future]
+                    details[index] = future.result()
+                    day_features[index] = self._day_packing_features(days[index], details[index])
+            detailed_itinerary = merge_day_details(days, details)
+            self._save_checkpoint(checkpoint, "detailed_itinerary", detailed_itinerary)
+            features = combine_day_features([tags for day in day_features for tags in day])
+        packing_checklist = self.packing_generator.generate_packing_checklist_from_trip_features(
+            format_packing_features(features), destination, use_cache
+        )
+        return detailed_itinerary, packing_checklist
+    
+    async def _arun_compact_pipelined_stages(self, days, outline, destination, preferences, chat_history,
+                                             use_cache, checkpoint=None, saved=None):
+        """Async counterpart of _run_compact_pipelined_stages"""
+        saved = saved or {}
+        if "detailed_itinerary" in saved:
+            detailed_itinerary = saved["detailed_itinerary"]
+            features = extract_packing_features(detailed_itinerary)
+        else:
+            detail_semaphore = asyncio.Semaphore(self.day_concurrency or 4)
+            
+            async def detail_and_tag(day):
+                async with detail_semaphore:
+                    detail = await self.detailed_generator.agenerate_day_detail(
+                        day, outline, destination, preferences, chat_history, use_cache
+                    )
+                return detail, self._day_packing_features(day, detail)
+            
+            results = await asyncio.gather(*(detail_and_tag(day) for day in days))
+            detailed_itinerary = merge_day_details(days, [detail for detail, _ in results])
+            self._save_checkpoint(checkpoint, "detailed_itinerary", detailed_itinerary)
+            features = combine_day_features([tags for _, day in results for tags in day])
+        packing_checklist = await self.packing_generator.agenerate_packing_checklist_from_trip_features(
+            format_packing_features(features), destination, use_cache
+        )
+        return detailed_itinerary, packing_checklist
+    
+    @staticmethod
+    def _day_packing_features(day, detail):
+        """extract_day_features of one day's section of the merged itinerary (split the same way
+        extract_packing_features splits the whole itinerary)"""
+        section = merge_day_details([day], [detail])
+        return [extract_day_features(text) for _, text in parse_outline_days(section)]
+    
+    def _log(self, message):
+        """Print a progress line when running verbosely"""
+        if self.verbose:
+            print(message)
+    
+    def _planning_context(self):
+        """Preferences and chat history strings shared by all three prompts"""
+        # Includes the running summary of older turns when the memory is token-bounded
+        with self._memory_lock:
+            chat_history = self.memory.load_memory_variables({})[self.memory.memory_key]
+        return self.extract_preferences_from_memory(), str(chat_history)
+    
+    async def _aplanning_context(self):
+        """Async counterpart of _planning_context (waits for in-flight memory writes off the event loop)"""
+        return await asyncio.to_thread(self._planning_context)
+    
+    def _remember_trip(self, destination, duration):
+        """Record a completed plan in the session memory"""
+        # With a token limit this summarizes the oldest turns, which is a model call
+        with self._memory_lock:
+            self.memory.save_context(
+                {"input": f"Plan trip to {destination} for {duration} days"},
+                {"output": f"Generated complete travel plan including outline, detailed itinerary, and packing list"}
+            )
+    
+    async def _aremember_trip(self, destination, duration):
+        """Async counterpart of _remember_trip, run in a worker thread so it never blocks the event loop"""
+        await asyncio.to_thread(self._remember_trip, destination, duration)
+    
+    def _semantic_lookup(self, destination, duration, preferences, structured, use_cache, remember=True):
+        """Stored plan of a near-identical earlier request, or None (always None with use_cache=False)
+        
+        A hit is recorded in the session memory unless remember is False.
+        """
+        if self.semantic_cache is None or not use_cache:
+            return None
+        result = self.semantic_cache.lookup(
+            destination, duration, preferences, "structured" if structured else "text"
+        )
+        if result is not None:
+            self._log("♻️ Reusing the plan of a near-identical earlier request")
+            if remember:
+                self._remember_trip(destination, duration)
+        return result
+    
+    def _checkpoint_id(self, destination, duration, preferences, chat_history, variant):
+        """Plan ID that this request's checkpoints are saved under, or None when checkpointing is off"""
+        if self.checkpoints is None:
+            return None
+        return plan_id(destination, duration, preferences, chat_history, variant)
+    
+    def _resume(self, checkpoint, use_cache=True):
+        """{stage: output} completed by an earlier, failed attempt at the same plan.
+        
+        With use_cache=False nothing is resumed and the earlier checkpoints are dropped, so the
+        fresh run's own checkpoints never mix with stale stages.
+        """
+        if checkpoint is None:
+            return {}
+        if not use_cache:
+            self.checkpoints.discard(checkpoint)
+            return {}
+        saved = self.checkpoints.load(checkpoint)
+        if saved:
+            self._log(f"💾 Resuming plan {checkpoint[:8]} after its completed {' and '.join(saved)} stage(s)")
+        return saved
+    
+    def _save_checkpoint(self, checkpoint, stage, output):
+        if checkpoint is not None:
+            self.checkpoints.save(checkpoint, stage, output)
+    
+    def _discard_checkpoints(self, checkpoint):
+        if checkpoint is not None:
+            self.checkpoints.discard(checkpoint)
+    
+    def _plan_finished(self, destination, duration, preferences, result, artifacts=None, checkpoint=None):
+        """Drop the plan's checkpoints, offer it to the semantic cache and keep its artifacts for replan()"""
+        self._discard_checkpoints(checkpoint)
+        structured = "itinerary" in result
+        if self.semantic_cache is not None:
+            # A structured plan that fell back to text is stored as text
+            self.semantic_cache.add(
+                destination, duration, preferences,
+                {key: value for key, value in result.items() if key != "rebuilt"},
+                "structured" if structured else "text"
+            )
+        if not structured:
+            self.last_plan = artifacts or PlanArtifacts.from_result(
+                result, destination, duration, preferences, self._packing_input(result["detailed_itinerary"])
+            )
+    
+    def _packing_input(self, itinerary):
+        """What the packing prompt is built from, for the packing artifact's content hash"""
+        if self.compact_packing:
+            return format_packing_features(extract_packing_features(itinerary))
+        return itinerary
+    
     def add_preference(self, preference):
         """Allow users to add preferences that will be stored persistently"""
-        if preference not in self.persistent_preferences:
-            self.persistent_preferences.append(preference)
-            self.save_preferences()
+        if self.persistent_preferences.add(preference):
+            self._record_preference_change(self.preference_store.add, preference)
         
         # Also add to current session memory
-        self.memory.save_context(
-            {"input": f"User preference: {preference}"},
-            {"output": f"Preference noted: {preference}"}
-        )
-        print(f"✅ Preference saved: {preference}")
+        with self._memory_lock:
+            self.memory.save_context(
+                {"input": f"User preference: {preference}"},
+                {"output": f"Preference noted: {preference}"}
+            )
+        self._log(f"✅ Preference saved: {preference}")
     
     def remove_preference(self, preference):
         """Remove a preference from persistent storage"""
-        if preference in self.persistent_preferences:
-            self.persistent_preferences.remove(preference)
-            self.save_preferences()
+        if self.persistent_preferences.remove(preference):
+            self._record_preference_change(self.preference_store.remove, preference)
             return True
         return False
     
+    def _record_preference_change(self, operation, preference):
+        """Append one add/remove to the store, keeping our view of its version current"""
+        try:
+            # The store only returns a version when nothing else was written since our last
+            # load, so our own write is skipped but changes by other sessions still get reloaded
+            version = operation(preference, expected_version=self._preferences_version)
+            if version is not None:
+                self._preferences_version = version
+        except Exception as e:
+            print(f"Warning: Could not save preferences: {e}")
+    
     def show_stored_preferences(self):
         """Display currently stored preferences"""
+        self.refresh_preferences()
         if self.persistent_preferences:
             print(f"\n💡 Stored Preferences ({len(self.persistent_preferences)}):")
             for i, pref in enumerate(self.persistent_preferences, 1):
@@ -303,7 +2115,28 @@ class TravelPlanner:
     
     def get_all_preferences(self):
         """Get all preferences as a list"""
-        return self.persistent_preferences.copy()
+        self.refresh_preferences()
+        return self.persistent_preferences.as_list()
+    
+    def cache_stats(self):
+        """Get LLM response cache hit/miss counters, or None when caching is disabled"""
+        return self.cache.stats() if self.cache is not None else None
+    
+    def checkpoint_stats(self):
+        """Plans resumed from checkpoints and checkpoints currently saved, or None when disabled"""
+        return self.checkpoints.stats() if self.checkpoints is not None else None
+    
+    def coalescing_stats(self):
+        """Model calls made and saved by single-flight coalescing (process-wide), or None when disabled"""
+        return self.single_flight.stats() if self.single_flight is not None else None
+    
+    def rate_limit_stats(self):
+        """Concurrency limit, calls, throttles and waiting time per provider/model, or None when disabled"""
+        return self.rate_limiters.stats() if self.rate_limiters is not None else None
+    
+    def semantic_cache_report(self):
+        """Semantic cache hit rates per candidate threshold (see SemanticPlanCache.report), or None"""
+        return self.semantic_cache.report() if self.semantic_cache is not None else None
 
 
 def main():
@@ -318,7 +2151,7 @@ def main():
     
     # Initialize the travel planner
     try:
-        planner = TravelPlanner()
+        planner = TravelPlanner(memory_token_limit=DEFAULT_MEMORY_TOKEN_LIMIT)
         print("✅ AI models initialized successfully!")
         
         # Show existing preferences if any
@@ -358,24 +2191,18 @@ def main():
                     print("Please enter a valid number.")
             
             try:
-                # Generate the complete travel plan
-                results = planner.plan_trip(destination, duration)
-                
-                # Display results
-                print("\n" + "="*60)
-                print("📋 DAY-BY-DAY OUTLINE")
-                print("="*60)
-                print(results["outline"])
-                
-                print("\n" + "="*60)
-                print("📅 DETAILED ITINERARY")
-                print("="*60)
-                print(results["detailed_itinerary"])
-                
-                print("\n" + "="*60)
-                print("🎒 PACKING CHECKLIST")
-                print("="*60)
-                print(results["packing_checklist"])
+                # Generate the complete travel plan, printing each section as it streams in
+                print(f"\n🌍 Planning your {duration}-day trip to {destination}...")
+                for event in planner.plan_trip_stream(destination, duration):
+                    if event["type"] == "stage_start":
+                        print("\n" + "="*60)
+                        print(STAGE_TITLES[event["stage"]])
+                        print("="*60)
+                    elif event["type"] == "token":
+                        print(event["text"], end="", flush=True)
+                    elif event["type"] == "stage_complete":
+                        print(f"\n\n⏱️ First token after {event['time_to_first_token'] or 0:.2f}s, "
+                              f"completed in {event['elapsed']:.2f}s")
                 
                 print("\n🎉 Your complete travel plan is ready!")
                 
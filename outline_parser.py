@@ -0,0 +1,50 @@
+# Helpers for splitting generated outlines into per-day work units
+
+import re
+
+
+# Matches "Day 3: ...", "**Day 3:** ...", "### Day 3 - ..." and similar headings
+DAY_HEADING_PATTERN = re.compile(
+    r"^[\s#*_\-]*Day\s+(\d+)\s*[*_]*\s*[:.\-–—]\s*[*_]*\s*(.*)$",
+    re.IGNORECASE
+)
+
+
+def parse_outline_days(outline):
+    """Split an outline into (day_number, text) tuples, one per "Day N:" heading.
+
+    Lines following a heading (sub-bullets, notes) belong to that day. Text before
+    the first heading is ignored. Returns an empty list when no headings are found.
+    """
+    days = []
+    current_number = None
+    current_lines = []
+
+    for line in outline.splitlines():
+        match = DAY_HEADING_PATTERN.match(line)
+        if match:
+            if current_number is not None:
+                days.append((current_number, "\n".join(current_lines).strip()))
+            current_number = int(match.group(1))
+            current_lines = [match.group(2).strip()]
+        elif current_number is not None:
+            current_lines.append(line.rstrip())
+
+    if current_number is not None:
+        days.append((current_number, "\n".join(current_lines).strip()))
+
+    return days
+
+
+def day_heading(day_number, day_outline):
+    """Heading line used when merging per-day details back into one itinerary"""
+    title = day_outline.splitlines()[0].strip() if day_outline else ""
+    return f"Day {day_number}: {title}" if title else f"Day {day_number}"
+
+
+def merge_day_details(days, details):
+    """Join per-day details back into a single itinerary in outline order"""
+    sections = []
+    for (day_number, day_outline), detail in zip(days, details):
+        sections.append(f"{day_heading(day_number, day_outline)}\n{detail.strip()}")
+    return "\n\n".join(sections)
@@ -0,0 +1,109 @@
+# Local feature extraction for the packing checklist prompt
+# Reduces an itinerary to activity, environment and condition tags with day counts, so the
+# packing model gets a few lines instead of the whole itinerary and chat history
+
+import re
+
+from outline_parser import parse_outline_days
+
+
+# Tag -> keywords, matched as whole words or phrases (plus a plural or -ing/-ed ending)
+ACTIVITY_TAGS = {
+    "hiking": ("hike", "hiking", "trek", "trekking", "trail", "summit", "climb"),
+    "swimming": ("swim", "swimming", "snorkel", "snorkeling", "snorkelling", "dive", "diving", "scuba",
+                 "surf", "kayak", "paddleboard"),
+    "boat trips": ("boat", "cruise", "ferry", "ferries", "sail", "catamaran"),
+    "cycling": ("cycle", "cycling", "bike", "biking", "bicycle"),
+    "snow sports": ("ski", "skiing", "snowboard", "sledding", "ice skating"),
+    "camping": ("camp", "camping", "campsite"),
+    "wildlife & safari": ("safari", "wildlife", "game drive", "birdwatching"),
+    "religious sites": ("temple", "mosque", "church", "churches", "cathedral", "shrine", "monastery",
+                        "monasteries"),
+    "museums & galleries": ("museum", "gallery", "galleries", "exhibition"),
+    "fine dining": ("fine dining", "michelin", "dress code", "upscale", "tasting menu"),
+    "nightlife": ("nightlife", "bar", "club", "pub", "live music"),
+    "long walks": ("walking tour", "stroll", "walk", "on foot"),
+    "spa & hot springs": ("spa", "hot spring", "onsen", "hammam", "sauna"),
+    "markets & shopping": ("market", "shopping", "bazaar", "souk")
+}
+ENVIRONMENT_TAGS = {
+    "beach": ("beach", "beaches", "coast", "seaside", "island", "lagoon"),
+    "mountains": ("mountain", "alpine", "volcano", "volcanoes", "peak", "highlands"),
+    "desert": ("desert", "dune", "sahara"),
+    "rainforest & jungle": ("rainforest", "jungle", "cloud forest"),
+    "lakes & rivers": ("lake", "river", "waterfall", "fjord"),
+    "countryside": ("countryside", "village", "vineyard", "farm", "rural"),
+    "city": ("city", "cities", "downtown", "old town", "neighborhood", "neighbourhood", "district")
+}
+CONDITION_TAGS = {
+    "sun exposure": ("sun", "sunny", "sunscreen", "sunbathing", "heat"),
+    "rain": ("rain", "rainy", "monsoon", "wet season"),
+    "cold": ("cold", "snow", "snowy", "glacier", "winter", "freezing"),
+    "early starts": ("sunrise", "dawn", "early morning"),
+    "evenings out": ("evening", "night", "sunset", "dinner")
+}
+TAG_GROUPS = (
+    ("Activities", ACTIVITY_TAGS),
+    ("Environments", ENVIRONMENT_TAGS),
+    ("Conditions", CONDITION_TAGS)
+)
+
+
+def _compile(tags):
+    return {
+        tag: re.compile(
+            r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")(?:s|es|ing|ed)?\b",
+            re.IGNORECASE
+        )
+        for tag, keywords in tags.items()
+    }
+
+
+_PATTERNS = [(group, _compile(tags)) for group, tags in TAG_GROUPS]
+
+
+def extract_packing_features(itinerary):
+    """Count, per tag group, how many itinerary days mention each tag.
+
+    Days are split on "Day N:" headings; an itinerary without them counts as one day.
+    Returns {"days": n, "Activities": {tag: days}, "Environments": {...}, "Conditions": {...}}.
+    """
+    days = [text for _, text in parse_outline_days(itinerary)] or [itinerary]
+    return combine_day_features([extract_day_features(text) for text in days])
+
+
+def extract_day_features(text):
+    """{group: set of tags} mentioned in one day's text"""
+    return {
+        group: {tag for tag, pattern in patterns.items() if pattern.search(text)}
+        for group, patterns in _PATTERNS
+    }
+
+
+def combine_day_features(day_features):
+    """extract_packing_features()'s result from the extract_day_features() of each day in order,
+    so days can be tagged as they are generated"""
+    features = {"days": len(day_features)}
+    for group, patterns in _PATTERNS:
+        counts = {}
+        for tag in patterns:
+            matched = sum(1 for day in day_features if tag in day[group])
+            if matched:
+                counts[tag] = matched
+        # Most frequent first so the prompt leads with what matters most
+        features[group] = dict(sorted(counts.items(), key=lambda item: -item[1]))
+    return features
+
+
+def format_packing_features(features):
+    """Compact prompt text for extracted features, e.g. "Activities: hiking (3 days), ..." """
+    lines = [f"Trip length: {features['days']} days"]
+    for group, _ in TAG_GROUPS:
+        counts = features.get(group)
+        if counts:
+            lines.append(f"{group}: " + ", ".join(
+                f"{tag} ({count} day{'s' if count != 1 else ''})" for tag, count in counts.items()
+            ))
+        else:
+            lines.append(f"{group}: none detected")
+    return "\n".join(lines)
@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Travel Planning Service
+A local HTTP/JSON service around TravelPlanner for other systems to call.
+
+Plans are submitted as jobs to a bounded queue and run by a fixed pool of workers.
+Each user gets their own TravelPlanner (session memory and a preferences namespace
+prefixed with "svc-", so no service user can reach the CLI's and app's shared
+preferences), created on first use and evicted least-recently-used. The model clients, response
+cache and metrics are shared by all users.
+
+Endpoints (the user is named in the JSON body or the X-User-Id header):
+    POST /plans                       {"user", "destination", "duration", "use_cache"?, "structured"?}
+                                      -> 202 {"job_id", ...}; 429 when the queue is full
+    GET  /plans/<job_id>              job status, plus "result" or "error" once finished
+    GET  /plans/<job_id>/stream       the job's events as JSON lines (as plan_trip_stream yields them)
+    GET  /users/<user>/preferences    stored preferences
+    POST /users/<user>/preferences    {"preference"}
+    GET  /health                      queue, worker and planner counts, coalesced calls, rate limits, checkpoints and per-stage metrics
+
+Usage:
+    python planning_service.py --port 8000 --workers 8
+"""
+
+import argparse
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the current directory to Python path to import main
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import TravelPlanner, DEFAULT_MEMORY_TOKEN_LIMIT
+from preferences import PreferenceStore
+from llm_cache import DEFAULT_CACHE_PATH
+from instrumentation import MetricsRecorder
+
+
+DEFAULT_WORKERS = 8
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_MAX_PLANNERS = 500
+# Queued or running jobs one user may have at a time
+DEFAULT_MAX_JOBS_PER_USER = 2
+# Finished jobs stay pollable for this long
+DEFAULT_JOB_TTL_SECONDS = 15 * 60
+MAX_BODY_BYTES = 64 * 1024
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Prepended to user IDs to form their preferences namespace; the unprefixed "default"
+# namespace is the base preferences file used by the CLI and Streamlit app
+NAMESPACE_PREFIX = "svc-"
+
+
+def preferences_namespace(user):
+    """Preferences namespace of a service user"""
+    return NAMESPACE_PREFIX + user
+
+
+class ServiceError(Exception):
+    """A request the service rejects, with the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PlanJob:
+    """One submitted plan; events are appended as the plan streams in"""
+
+    def __init__(self, user, destination, duration, use_cache=True, structured=False):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.destination = destination
+        self.duration = duration
+        self.use_cache = use_cache
+        self.structured = structured
+        self.status = "queued"
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._changed = threading.Condition()
+
+    def publish(self, event):
+        with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self._changed:
+            self.result = result
+            self.error = error
+            self.status = "error" if error else "done"
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def finished(self):
+        return self.status in ("done", "error")
+
+    def events_from(self, index, timeout=None):
+        """Events after the first index ones, waiting up to timeout for new ones; (events, finished)"""
+        with self._changed:
+            if len(self.events) <= index and not self.finished():
+                self._changed.wait(timeout)
+            return self.events[index:], self.finished()
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "user": self.user,
+            "destination": self.destination,
+            "duration": self.duration,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "error":
+            data["error"] = self.error
+        return data
+
+
+def serializable_result(result):
+    """A plan result as plain JSON types (structured results hold an Itinerary object)"""
+    result = dict(result)
+    if result.get("itinerary") is not None:
+        result["itinerary"] = result["itinerary"].to_dict()
+    return result
+
+
+class PlannerEntry:
+    """A user's planner, the lock that serializes its use and how many callers have it checked out"""
+
+    __slots__ = ("planner", "lock", "pins")
+
+    def __init__(self, planner):
+        self.planner = planner
+        self.lock = threading.Lock()
+        self.pins = 0
+
+
+class PlannerRegistry:
+    """Per-user TravelPlanners, created on demand and evicted least-recently-used.
+
+    Each planner has a lock so one user's plans run one at a time (session memory is
+    not thread-safe). A checked-out planner is pinned and never evicted until it is
+    released, so the registry may briefly hold more than max_planners.
+    """
+
+    def __init__(self, factory, max_planners=DEFAULT_MAX_PLANNERS):
+        self.factory = factory
+        self.max_planners = max_planners
+        self._planners = OrderedDict()
+        self._lock = threading.Lock()
+
+    def checkout(self, user):
+        """Pinned PlannerEntry for user; hold its lock while using the planner and release() it after"""
+        with self._lock:
+            entry = self._planners.get(user)
+            if entry is None:
+                entry = self._planners[user] = PlannerEntry(self.factory(user))
+            entry.pins += 1
+            self._planners.move_to_end(user)
+            self._evict()
+            return entry
+
+    def release(self, entry):
+        """Unpin an entry from checkout(), evicting planners that were kept over the limit while pinned"""
+        with self._lock:
+            entry.pins -= 1
+            self._evict()
+
+    def _evict(self):
+        for user in list(self._planners):
+            if len(self._planners) <= self.max_planners:
+                break
+            if not self._planners[user].pins:
+                del self._planners[user]
+
+    def __len__(self):
+        return len(self._planners)
+
+
+class PlanningService:
+    """Bounded job queue, worker pool and per-user planners"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, max_planners=DEFAULT_MAX_PLANNERS,
+                 max_jobs_per_user=DEFAULT_MAX_JOBS_PER_USER, job_ttl=DEFAULT_JOB_TTL_SECONDS,
+                 preferences_file="user_preferences.json", cache_path=DEFAULT_CACHE_PATH,
+                 memory_token_limit=DEFAULT_MEMORY_TOKEN_LIMIT, metrics=None, semantic_cache=None, hedging=False):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_jobs_per_user = max_jobs_per_user
+        self.job_ttl = job_ttl
+        self.preferences_file = preferences_file
+        self.memory_token_limit = memory_token_limit
+        self.metrics = metrics or MetricsRecorder()
+        self.semantic_cache = semantic_cache
+        # One set of generators (model clients, response cache, retry policy) serves every user
+        self._shared = TravelPlanner(
+            preferences_file=preferences_file, cache_path=cache_path, verbose=False,
+            metrics=self.metrics, hedging=hedging
+        )
+        self.planners = PlannerRegistry(self._create_planner, max_planners)
+        # Unbounded so a parked job can always be requeued; submit() enforces queue_size
+        self._queue = queue.Queue()
+        # Jobs waiting for their user's planner, which the job running on it requeues
+        self._parked = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _create_planner(self, user):
+        planner = TravelPlanner(
+            preferences_file=self.preferences_file,
+            cache_path=None,
+            checkpoint_path=None,
+            verbose=False,
+            memory_token_limit=self.memory_token_limit,
+            preferences_namespace=preferences_namespace(user),
+            metrics=self.metrics,
+            semantic_cache=self.semantic_cache
+        )
+        planner.cache = self._shared.cache
+        planner.checkpoints = self._shared.checkpoints
+        planner.outline_generator = self._shared.outline_generator
+        planner.detailed_generator = self._shared.detailed_generator
+        planner.packing_generator = self._shared.packing_generator
+        return planner
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"planner-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Let the workers exit once the jobs already queued are done"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, user, destination, duration, use_cache=True, structured=False):
+        """Queue a plan and return its PlanJob, or raise ServiceError"""
+        job = PlanJob(user, destination, duration, use_cache, structured)
+        with self._lock:
+            self._purge_finished()
+            active = sum(1 for other in self._jobs.values() if other.user == user and not other.finished())
+            if active >= self.max_jobs_per_user:
+                raise ServiceError(429, f"User already has {active} plans in progress")
+            if self._queue.qsize() >= self.queue_size:
+                raise ServiceError(429, "Planning queue is full, retry later")
+            self._queue.put_nowait(job)
+            self._jobs[job.id] = job
+        return job
+
+    def job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise ServiceError(404, f"Unknown job {job_id}")
+        return job
+
+    def preferences(self, user):
+        """Stored preferences, read from the user's store without creating a planner or files"""
+        store = self._preference_store(user)
+        if not os.path.exists(store.path) and not os.path.exists(store.log_path):
+            return []
+        return store.load()
+
+    def add_preference(self, user, preference):
+        """Append a preference to the user's store; their planner picks it up before its next plan"""
+        store = self._preference_store(user)
+        if preference not in store.load():
+            store.add(preference)
+        return store.load()
+
+    def _preference_store(self, user):
+        return PreferenceStore(self.preferences_file, namespace=preferences_namespace(user))
+
+    def _unlock(self, user, entry):
+        """Release a user's planner lock and requeue the next job parked behind it"""
+        with self._lock:
+            entry.lock.release()
+            parked = self._parked.get(user)
+            if parked:
+                self._queue.put_nowait(parked.popleft())
+                if not parked:
+                    del self._parked[user]
+
+    def health(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == "running")
+            parked = sum(len(jobs) for jobs in self._parked.values())
+        return {
+            "queued": self._queue.qsize() + parked,
+            "running": running,
+            "workers": self.workers,
+            "planners": len(self.planners),
+            "coalescing": self._shared.coalescing_stats(),
+            "rate_limits": self._shared.rate_limit_stats(),
+            "checkpoints": self._shared.checkpoint_stats(),
+            "stages": self.metrics.summary()
+        }
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            entry = self.planners.checkout(job.user)
+            try:
+                with self._lock:
+                    if not entry.lock.acquire(blocking=False):
+                        # The user's previous plan is still running; rather than tie up this
+                        # worker, park the job until that plan's _unlock() requeues it
+                        self._parked.setdefault(job.user, deque()).append(job)
+                        continue
+                try:
+                    job.status = "running"
+                    job.started_at = time.time()
+                    job.finish(result=self._run(entry.planner, job))
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    job.publish({"stage": "complete", "type": "error", "error": error})
+                    job.finish(error=error)
+                finally:
+                    self._unlock(job.user, entry)
+            finally:
+                self.planners.release(entry)
+
+    @staticmethod
+    def _run(planner, job):
+        """Plan one job, publishing its events; returns the JSON-ready result"""
+        if job.structured:
+            result = serializable_result(planner.plan_trip(
+                job.destination, job.duration, use_cache=job.use_cache, structured=True
+            ))
+            job.publish({"stage": "complete", "type": "result", "result": result})
+            return result
+        result = None
+        for event in planner.plan_trip_stream(job.destination, job.duration, use_cache=job.use_cache):
+            job.publish(event)
+            if event["type"] == "result":
+                result = event["result"]
+        return result
+
+    def _purge_finished(self):
+        cutoff = time.time() - self.job_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished() and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+class PlanningRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints of PlanningService (the server's .service)"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        service = self.server.service
+        parts = [part for part in self.path.split("?", 1)[0].split("/") if part]
+        try:
+            if method == "POST" and parts == ["plans"]:
+                body = self._read_json()
+                job = service.submit(
+                    self._user(body),
+                    self._destination(body),
+                    self._duration(body),
+                    use_cache=bool(body.get("use_cache", True)),
+                    structured=bool(body.get("structured", False))
+                )
+                self._send_json(202, {
+                    "job_id": job.id,
+                    "status": job.status,
+                    "poll": f"/plans/{job.id}",
+                    "stream": f"/plans/{job.id}/stream"
+                })
+            elif method == "GET" and len(parts) == 2 and parts[0] == "plans":
+                self._send_json(200, service.job(parts[1]).to_dict())
+            elif method == "GET" and len(parts) == 3 and parts[0] == "plans" and parts[2] == "stream":
+                self._stream(service.job(parts[1]))
+            elif len(parts) == 3 and parts[0] == "users" and parts[2] == "preferences":
+                user = self._user({"user": parts[1]})
+                if method == "GET":
+                    self._send_json(200, {"user": user, "preferences": service.preferences(user)})
+                else:
+                    preference = str(self._read_json().get("preference", "")).strip()
+                    if not preference:
+                        raise ServiceError(400, "preference must be a non-empty string")
+                    self._send_json(200, {"user": user, "preferences": service.add_preference(user, preference)})
+            elif method == "GET" and parts == ["health"]:
+                self._send_json(200, service.health())
+            else:
+                raise ServiceError(404, f"No endpoint {method} {self.path}")
+        except ServiceError as e:
+            self._send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ServiceError(413, "Request body too large")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ServiceError(400, "Request body must be JSON")
+        if not isinstance(body, dict):
+            raise ServiceError(400, "Request body must be a JSON object")
+        return body
+
+    def _user(self, body):
+        user = str(body.get("user") or self.headers.get("X-User-Id") or "")
+        if not USER_ID_PATTERN.match(user):
+            raise ServiceError(400, "user must be 1-64 letters, digits, '_' or '-'")
+        return user
+
+    @staticmethod
+    def _destination(body):
+        destination = str(body.get("destination") or "").strip()
+        if not destination:
+            raise ServiceError(400, "destination is required")
+        return destination
+
+    @staticmethod
+    def _duration(body):
+        try:
+            duration = int(body.get("duration"))
+        except (TypeError, ValueError):
+            raise ServiceError(400, "duration must be a number of days")
+        if not 1 <= duration <= 60:
+            raise ServiceError(400, "duration must be between 1 and 60 days")
+        return duration
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "5")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, job):
+        """Write the job's events as JSON lines, from the first, until it finishes"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        index = 0
+        finished = False
+        while not finished:
+            events, finished = job.events_from(index, timeout=15)
+            index += len(events)
+            # An empty chunk would end the response, so idle periods send a blank line instead
+            lines = "".join(json.dumps(event, default=str) + "\n" for event in events) or "\n"
+            self._write_chunk(lines.encode("utf-8"))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        # Keep the request log out of stderr unless asked for
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class PlanningHTTPServer(ThreadingHTTPServer):
+    """One thread per connection, with a listen backlog sized for bursts of clients"""
+
+    daemon_threads = True
+    # socketserver's default of 5 resets connections when hundreds of users arrive at once
+    request_queue_size = 1024
+
+
+def make_server(service, host="127.0.0.1", port=8000, verbose=False):
+    """HTTP server for service"""
+    server = PlanningHTTPServer((host, port), PlanningRequestHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main():
+    """Parse arguments and serve until interrupted"""
+    parser = argparse.ArgumentParser(description="Serve trip planning over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Plans run concurrently")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Plans waiting before 429s")
+    parser.add_argument("--max-planners", type=int, default=DEFAULT_MAX_PLANNERS,
+                        help="Users whose session state is kept in memory")
+    parser.add_argument("--max-jobs-per-user", type=int, default=DEFAULT_MAX_JOBS_PER_USER,
+                        help="Plans one user may have queued or running")
+    parser.add_argument("--preferences-file", default="user_preferences.json",
+                        help="Base preferences file (one namespace per user)")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help="LLM response cache shared by all users")
+    parser.add_argument("--hedging", action="store_true", help="Hedge slow model calls to the other provider")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    service = PlanningService(
+        workers=args.workers,
+        queue_size=args.queue_size,
+        max_planners=args.max_planners,
+        max_jobs_per_user=args.max_jobs_per_user,
+        preferences_file=args.preferences_file,
+        cache_path=args.cache_path,
+        hedging=args.hedging
+    )
+    service.start()
+    server = make_server(service, args.host, args.port, args.verbose)
+    print(f"🚀 Planning service on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Shutting down...")
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+# User preference storage for the travel planner
+
+import json
+import os
+import re
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+NO_PREFERENCES_TEXT = "No specific preferences stored yet."
+DEFAULT_NAMESPACE = "default"
+# Fold the operation log into a fresh snapshot once it grows past this many bytes
+DEFAULT_COMPACT_BYTES = 64 * 1024
+
+
+class PreferenceIndex:
+    """Order-preserving set of preferences with a cached, pre-joined prompt string"""
+
+    def __init__(self, preferences=()):
+        # dict keys give O(1) membership while keeping insertion order
+        self._items = dict.fromkeys(preference for preference in preferences if preference)
+        self._prompt = None
+
+    def add(self, preference):
+        """Add a preference, returning False if it was already present"""
+        if not preference or preference in self._items:
+            return False
+        self._items[preference] = None
+        self._prompt = None
+        return True
+
+    def remove(self, preference):
+        """Remove a preference, returning False if it was not present"""
+        if preference not in self._items:
+            return False
+        del self._items[preference]
+        self._prompt = None
+        return True
+
+    def as_list(self):
+        """Preferences in the order they were added"""
+        return list(self._items)
+
+    def as_prompt(self):
+        """Preferences joined for the prompts, rebuilt only after the index changes"""
+        if self._prompt is None:
+            self._prompt = " | ".join(self._items) if self._items else NO_PREFERENCES_TEXT
+        return self._prompt
+
+    def __contains__(self, preference):
+        return preference in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+
+@contextmanager
+def _file_lock(lock_path, exclusive=True):
+    """Hold an advisory lock on lock_path (shared locks fall back to exclusive on Windows)"""
+    with open(lock_path, "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class PreferenceStore:
+    """Crash-safe preference file shared by several CLI or Streamlit processes.
+
+    State is a JSON snapshot (the same list format user_preferences.json always had)
+    plus an append-only operation log next to it. Adds and removes append one line
+    under an exclusive file lock; once the log grows past compact_bytes it is folded
+    into a new snapshot that is written to a temp file and atomically renamed.
+
+    Each namespace gets its own files: the default namespace uses path itself, any
+    other namespace uses "<name>.<namespace><ext>" alongside it.
+    """
+
+    def __init__(self, path="user_preferences.json", namespace=None, compact_bytes=DEFAULT_COMPACT_BYTES):
+        self.namespace = namespace or DEFAULT_NAMESPACE
+        if self.namespace == DEFAULT_NAMESPACE:
+            self.path = path
+        else:
+            base, ext = os.path.splitext(path)
+            safe_namespace = re.sub(r"[^A-Za-z0-9_-]", "_", self.namespace)
+            self.path = f"{base}.{safe_namespace}{ext or '.json'}"
+        self.log_path = self.path + ".log"
+        self.lock_path = self.path + ".lock"
+        self.compact_bytes = compact_bytes
+
+    def load(self):
+        """Return the current preferences: the snapshot with the operation log replayed on top"""
+        with _file_lock(self.lock_path, exclusive=False):
+            return self._read_state().as_list()
+
+    def add(self, preference, expected_version=None):
+        """Record an added preference with a single appended log line (see _append for the return value)"""
+        return self._append({"op": "add", "value": preference}, expected_version)
+
+    def remove(self, preference, expected_version=None):
+        """Record a removed preference with a single appended log line (see _append for the return value)"""
+        return self._append({"op": "remove", "value": preference}, expected_version)
+
+    def save(self, preferences):
+        """Replace the stored preferences with an atomic snapshot and an empty log"""
+        with _file_lock(self.lock_path):
+            self._write_snapshot(list(preferences))
+
+    def compact(self):
+        """Fold the operation log into the snapshot"""
+        with _file_lock(self.lock_path):
+            self._write_snapshot(self._read_state().as_list())
+
+    def version(self):
+        """Cheap change token; differs whenever any process has written new state"""
+        return (self._stat(self.path), self._stat(self.log_path))
+
+    def _append(self, operation, expected_version=None):
+        """Append operation and return the new version if the store was at expected_version
+        before the write (a compare-and-swap of the caller's view), else None.
+
+        The comparison, the write and the new version are all taken under the file lock,
+        so no other writer can slip in between them.
+        """
+        with _file_lock(self.lock_path):
+            current = self.version() == expected_version
+            with open(self.log_path, "a+b") as f:
+                line = json.dumps(operation) + "\n"
+                # Start on a fresh line if a previous writer crashed mid-line
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = "\n" + line
+                f.write(line.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.getsize(self.log_path) > self.compact_bytes:
+                self._write_snapshot(self._read_state().as_list())
+            return self.version() if current else None
+
+    def _read_state(self):
+        """Read snapshot and log; caller must hold the lock"""
+        state = PreferenceIndex()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    for preference in json.load(f):
+                        state.add(preference)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not load preferences file: {e}")
+
+        # Replaying is idempotent, so a crash between snapshot rename and log truncation is harmless
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r") as f:
+                for line in f:
+                    try:
+                        operation = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write carries no committed change
+                        continue
+                    if operation.get("op") == "add":
+                        state.add(operation.get("value"))
+                    elif operation.get("op") == "remove":
+                        state.remove(operation.get("value"))
+        return state
+
+    def _write_snapshot(self, preferences):
+        """Atomically replace the snapshot and truncate the log; caller must hold the lock"""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(preferences, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        open(self.log_path, "w").close()
+
+    @staticmethod
+    def _stat(path):
+        try:
+            info = os.stat(path)
+            return (info.st_mtime_ns, info.st_size)
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,354 @@
+# Provider-aware rate limiting of model calls
+# Every call to a provider/model first takes a slot under that model's adaptive concurrency
+# limit, which grows by one per window of successful calls and halves when the provider answers
+# with a throttle, plus a request and its estimated tokens from per-minute token buckets when
+# the model has configured limits
+
+import asyncio
+import threading
+import time
+from concurrent.futures import CancelledError
+
+from resilience import is_throttled, retry_after
+
+
+# Free-tier ceilings of the models the planner uses. Not applied by default, since paid plans
+# allow far more; opt in with RateLimiterRegistry.apply(FREE_TIER_LIMITS)
+FREE_TIER_LIMITS = {
+    ("groq", "llama-3.1-8b-instant"): {"requests_per_minute": 30, "tokens_per_minute": 6000},
+    ("google", "gemini-1.5-flash"): {"requests_per_minute": 15, "tokens_per_minute": 1000000}
+}
+# Adaptive concurrency: starting point and bounds of the number of calls in flight per model
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 32
+# Multiplicative decrease applied on a throttling response
+DECREASE_FACTOR = 0.5
+# Seconds new calls are held back after a throttle that carries no Retry-After
+THROTTLE_PAUSE = 1.0
+# How often async waiters re-check for a free concurrency slot
+ASYNC_POLL_INTERVAL = 0.05
+
+
+class RateLimitTimeout(TimeoutError):
+    """No rate-limit capacity became available within the caller's timeout"""
+
+
+class TokenBucket:
+    """per_minute units of capacity, refilled continuously"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount, now):
+        """Seconds until amount (capped at the capacity) can be taken"""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def adjust(self, amount):
+        """Take (positive) or return (negative) amount; the level may go into debt"""
+        self.level = min(self.capacity, self.level - amount)
+
+
+class _Permit:
+    __slots__ = ("tokens", "started")
+
+    def __init__(self, tokens, started):
+        self.tokens = tokens
+        self.started = started
+
+
+class ProviderLimiter:
+    """Request, token and concurrency limits for one provider/model, shared by every caller.
+
+    call(), acall() and stream() take a zero-argument callable (a coroutine function for
+    acall, a function returning an iterator of chunks for stream), the number of tokens to
+    reserve and optionally measure(text), the tokens the finished call actually used.
+    call(), acall() and stream() also accept a permit already taken with acquire() or aacquire().
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, initial_concurrency=INITIAL_CONCURRENCY,
+                 min_concurrency=MIN_CONCURRENCY, max_concurrency=MAX_CONCURRENCY):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._changed = threading.Condition()
+
+    def _try_acquire(self, tokens):
+        """(permit, None) when capacity is free, else (None, seconds to wait or None for a release)"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return None, self._paused_until - now
+        if self.in_flight >= max(1, int(self.concurrency)):
+            return None, None
+        wait = max(
+            self.requests.wait_time(1, now) if self.requests else 0.0,
+            self.tokens.wait_time(tokens, now) if self.tokens else 0.0
+        )
+        if wait > 0:
+            return None, wait
+        if self.requests:
+            self.requests.adjust(1)
+        if self.tokens:
+            self.tokens.adjust(tokens)
+        self.in_flight += 1
+        self.calls += 1
+        return _Permit(tokens, now), None
+
+    def acquire(self, tokens=0, timeout=None):
+        """Block until the call may start, returning the permit to pass to release()"""
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        with self._changed:
+            while True:
+                permit, wait = self._try_acquire(tokens)
+                if permit is not None:
+                    self.waited += time.monotonic() - started
+                    return permit
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RateLimitTimeout(f"No rate-limit capacity within {timeout}s")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._changed.wait(wait)
+
+    async def aacquire(self, tokens=0, timeout=None):
+        """Async counterpart of acquire that never blocks the event loop"""
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        while True:
+            with self._changed:
+                permit, wait = self._try_acquire(tokens)
+                if permit is not None:
+                    self.waited += time.monotonic() - started
+                    return permit
+            wait = ASYNC_POLL_INTERVAL if wait is None else wait
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitTimeout(f"No rate-limit capacity within {timeout}s")
+                wait = min(wait, remaining)
+            await asyncio.sleep(wait)
+
+    def release(self, permit, used_tokens=None, error=None):
+        """Finish a call: settle its token estimate and adapt the concurrency limit.
+
+        A throttling error halves the limit (once per round of calls that started before
+        the previous decrease) and holds back new calls; a success adds 1/limit to it.
+        Other errors, including cancellation, leave the limit as it is.
+        """
+        with self._changed:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if self.tokens and used_tokens is not None:
+                self.tokens.adjust(used_tokens - permit.tokens)
+            if error is not None and is_throttled(error):
+                self.throttled += 1
+                if permit.started >= self._last_decrease:
+                    self.concurrency = max(self.min_concurrency, self.concurrency * DECREASE_FACTOR)
+                    self._last_decrease = now
+                pause = retry_after(error) or THROTTLE_PAUSE
+                self._paused_until = max(self._paused_until, now + pause)
+            elif error is None:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self._changed.notify_all()
+
+    def cancel(self, permit):
+        """Give back a permit whose call never started: its slot, request and reserved tokens"""
+        with self._changed:
+            self.in_flight -= 1
+            self.calls -= 1
+            if self.requests:
+                self.requests.adjust(-1)
+            if self.tokens:
+                self.tokens.adjust(-permit.tokens)
+            self._changed.notify_all()
+
+    def bind(self, fn, tokens=0, measure=None, stream=False):
+        """LimitedCall running fn (or streaming it, with stream=True) under this limiter"""
+        return LimitedCall(self, fn, tokens, measure, stream)
+
+    def abind(self, coro_fn, tokens=0, measure=None):
+        """AsyncLimitedCall running coro_fn under this limiter"""
+        return AsyncLimitedCall(self, coro_fn, tokens, measure)
+
+    def call(self, fn, tokens=0, measure=None, timeout=None, permit=None):
+        permit = permit or self.acquire(tokens, timeout)
+        try:
+            result = fn()
+        except BaseException as e:
+            self.release(permit, error=e)
+            raise
+        self.release(permit, used_tokens=measure(result) if measure else None)
+        return result
+
+    async def acall(self, coro_fn, tokens=0, measure=None, timeout=None, permit=None):
+        permit = permit or await self.aacquire(tokens, timeout)
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            self.release(permit, error=e)
+            raise
+        self.release(permit, used_tokens=measure(result) if measure else None)
+        return result
+
+    def stream(self, open_stream, tokens=0, measure=None, timeout=None, permit=None):
+        """Re-yield open_stream()'s chunks, holding the permit until the stream ends or is closed"""
+        permit = permit or self.acquire(tokens, timeout)
+        parts = []
+        try:
+            for chunk in open_stream():
+                # Chat models stream message chunks, completion models plain strings
+                parts.append(getattr(chunk, "content", chunk) or "")
+                yield chunk
+        except BaseException as e:
+            self.release(permit, error=e)
+            raise
+        self.release(permit, used_tokens=measure("".join(parts)) if measure else None)
+
+    def stats(self):
+        with self._changed:
+            return {
+                "concurrency_limit": round(self.concurrency, 2),
+                "in_flight": self.in_flight,
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "waited_s": round(self.waited, 3)
+            }
+
+
+class LimitedCall:
+    """A zero-argument callable bound to a ProviderLimiter (see ProviderLimiter.bind).
+
+    Calling it waits for a permit and then runs the call. reserve(timeout) instead takes the
+    permit right away, on the calling thread, and returns a ReservedCall that runs the call
+    under it later, e.g. on an executor thread, so the wait counts against the caller's deadline.
+    """
+
+    def __init__(self, limiter, fn, tokens=0, measure=None, stream=False):
+        self.limiter = limiter
+        self.fn = fn
+        self.tokens = tokens
+        self.measure = measure
+        self.stream = stream
+
+    def __call__(self):
+        return self.run()
+
+    def reserve(self, timeout=None):
+        """Wait up to timeout seconds for a permit, or raise RateLimitTimeout"""
+        return ReservedCall(self, self.limiter.acquire(self.tokens, timeout))
+
+    def run(self, permit=None):
+        run = self.limiter.stream if self.stream else self.limiter.call
+        return run(self.fn, self.tokens, self.measure, permit=permit)
+
+
+class AsyncLimitedCall(LimitedCall):
+    """LimitedCall for a coroutine function: calling it returns a coroutine, and areserve()
+    is the awaitable counterpart of reserve()"""
+
+    def __init__(self, limiter, coro_fn, tokens=0, measure=None):
+        super().__init__(limiter, coro_fn, tokens, measure)
+
+    def reserve(self, timeout=None):
+        raise TypeError("Use areserve() for an AsyncLimitedCall")
+
+    async def areserve(self, timeout=None):
+        """Wait up to timeout seconds for a permit, or raise RateLimitTimeout"""
+        return AsyncReservedCall(self, await self.limiter.aacquire(self.tokens, timeout))
+
+    def run(self, permit=None):
+        return self.limiter.acall(self.fn, self.tokens, self.measure, permit=permit)
+
+
+class ReservedCall:
+    """A LimitedCall holding its permit; it runs at most once, and never after abandon()"""
+
+    def __init__(self, call, permit):
+        self.call = call
+        self._permit = permit
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        return self.call.run(self._claim())
+
+    def abandon(self):
+        """Give the permit back unless the call has already started"""
+        with self._lock:
+            permit, self._permit = self._permit, None
+        if permit is not None:
+            self.call.limiter.cancel(permit)
+
+    def _claim(self):
+        with self._lock:
+            permit, self._permit = self._permit, None
+        if permit is None:
+            raise CancelledError("Call was abandoned before it started")
+        return permit
+
+
+class AsyncReservedCall(ReservedCall):
+    """ReservedCall of an AsyncLimitedCall; the permit is only claimed once the coroutine
+    starts running, so a task cancelled before that can still abandon() it"""
+
+    def __call__(self):
+        return self._run()
+
+    async def _run(self):
+        return await self.call.run(self._claim())
+
+
+class RateLimiterRegistry:
+    """One ProviderLimiter per provider and model, created on first use.
+
+    Models without configured limits are only paced by the adaptive concurrency limit.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = dict(limits or {})
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, model):
+        with self._lock:
+            limiter = self._limiters.get((provider, model))
+            if limiter is None:
+                limiter = self._limiters[(provider, model)] = ProviderLimiter(
+                    **self.limits.get((provider, model), {})
+                )
+            return limiter
+
+    def configure(self, provider, model, **limits):
+        """Replace a model's limits (keyword arguments of ProviderLimiter), e.g. for a paid tier"""
+        with self._lock:
+            self.limits[(provider, model)] = limits
+            self._limiters.pop((provider, model), None)
+
+    def apply(self, limits):
+        """configure() every model of a {(provider, model): limits} mapping, e.g. FREE_TIER_LIMITS"""
+        for (provider, model), model_limits in limits.items():
+            self.configure(provider, model, **model_limits)
+
+    def stats(self):
+        """ProviderLimiter.stats() of every model called so far, keyed "provider/model" """
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {f"{provider}/{model}": limiter.stats() for (provider, model), limiter in limiters.items()}
+
+
+# Shared by every planner in the process, since the providers' limits apply to the whole API key
+default_rate_limiters = RateLimiterRegistry()
@@ -0,0 +1,95 @@
+# Intermediate plan artifacts for incremental re-planning
+# A plan is kept as its outline lines, per-day details and packing checklist, each with a
+# content hash of the inputs it was generated from; TravelPlanner.replan regenerates only
+# the artifacts whose hash no longer matches
+
+import hashlib
+import json
+from dataclasses import dataclass
+
+from outline_parser import parse_outline_days, merge_day_details
+
+
+def content_hash(*parts):
+    """Stable hash of an artifact's inputs (chat history is deliberately never included)"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def outline_hash(destination, preferences):
+    """The outline's days depend on the destination and preferences, not on the trip length"""
+    return content_hash("outline", destination.strip(), preferences)
+
+
+def day_hash(destination, preferences, day_number, day_outline):
+    return content_hash("day", destination.strip(), preferences, day_number, day_outline)
+
+
+def packing_hash(destination, packing_input):
+    """packing_input is the extracted features text (compact packing) or the whole itinerary"""
+    return content_hash("packing", destination.strip(), packing_input)
+
+
+@dataclass
+class DayArtifact:
+    """One day's outline line and detailed plan"""
+    __slots__ = ("day", "outline", "detail", "input_hash")
+    day: int
+    outline: str
+    detail: object  # str, or None when it could not be recovered and must be regenerated
+    input_hash: str
+
+
+@dataclass
+class PlanArtifacts:
+    """Everything replan() needs to know about a finished plan"""
+    __slots__ = ("destination", "duration", "outline_hash", "days", "packing_hash", "packing_checklist")
+    destination: str
+    duration: int
+    outline_hash: str
+    days: list
+    packing_hash: object
+    packing_checklist: object
+
+    def outline_text(self):
+        return "\n".join(f"Day {day.day}: {day.outline}" for day in self.days)
+
+    def itinerary_text(self):
+        return merge_day_details(
+            [(day.day, day.outline) for day in self.days], [day.detail for day in self.days]
+        )
+
+    def day(self, day_number):
+        """The DayArtifact for day_number, or None"""
+        return next((day for day in self.days if day.day == day_number), None)
+
+    @classmethod
+    def from_result(cls, result, destination, duration, preferences, packing_input):
+        """Artifacts of a plan_trip result, recovered from its text.
+
+        Day details are only recovered from itineraries merged per day (each day under a
+        "Day N: <outline line>" heading); other days are left for replan to regenerate.
+        """
+        outline_days = parse_outline_days(result["outline"])
+        detailed = dict(parse_outline_days(result["detailed_itinerary"]))
+        days = []
+        for day_number, day_outline in outline_days:
+            detail = None
+            title = day_outline.splitlines()[0].strip() if day_outline else ""
+            heading, _, body = detailed.get(day_number, "").partition("\n")
+            if heading.strip() == title and body.strip():
+                detail = body.strip()
+            days.append(DayArtifact(
+                day=day_number,
+                outline=day_outline,
+                detail=detail,
+                input_hash=day_hash(destination, preferences, day_number, day_outline)
+            ))
+        return cls(
+            destination=destination.strip(),
+            duration=duration,
+            outline_hash=outline_hash(destination, preferences),
+            days=days,
+            packing_hash=packing_hash(destination, packing_input),
+            packing_checklist=result["packing_checklist"]
+        )
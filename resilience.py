@@ -0,0 +1,299 @@
+# Resilient model invocation for the three generators
+# Every call runs under a per-stage deadline with jittered exponential retries on transient
+# provider errors and can, optionally, be hedged: once the primary runs past its recent p95
+# latency, the same prompt is sent to the other provider and the first answer wins
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+# Seconds one model call of each stage may take, retries included
+STAGE_DEADLINES = {
+    "outline": 30,
+    "detailed_itinerary": 120,
+    "packing_checklist": 45
+}
+DEFAULT_MAX_ATTEMPTS = 3
+# Full-jitter backoff: attempt n sleeps a random time up to min(MAX, BASE * 2**n)
+BASE_RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 8.0
+# Hedging waits until this many successful calls have been timed
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 100
+
+# HTTP statuses and exception class-name fragments that mean "try again"
+TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+TRANSIENT_ERROR_NAMES = ("Timeout", "Connect", "RateLimit", "ServiceUnavailable", "InternalServer",
+                         "ResourceExhausted", "DeadlineExceeded", "Unavailable")
+THROTTLE_ERROR_NAMES = ("RateLimit", "ResourceExhausted")
+
+# Deadlines and hedges need calls off the caller's thread; a call that misses its deadline
+# is abandoned here rather than interrupted. Rate-limited calls take their permit on the
+# caller's thread before being submitted, so an abandoned call that has not started yet
+# gives its permit back and never reaches the provider
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm-call")
+
+
+class StageDeadlineExceeded(TimeoutError):
+    """A model call did not finish within its stage's deadline"""
+
+
+def _status_code(error):
+    """HTTP status carried by a provider error, or None"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        # google.api_core exceptions carry the HTTP status as .code
+        status = getattr(error, "code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(error):
+    """Whether an error from Groq, Gemini or the HTTP layer is worth retrying"""
+    if isinstance(error, StageDeadlineExceeded):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if _status_code(error) in TRANSIENT_STATUS_CODES:
+        return True
+    return any(
+        marker in cls.__name__ for cls in type(error).__mro__ for marker in TRANSIENT_ERROR_NAMES
+    )
+
+
+def is_throttled(error):
+    """Whether the provider rejected a call for exceeding its rate limits"""
+    if _status_code(error) == 429:
+        return True
+    return any(
+        marker in cls.__name__ for cls in type(error).__mro__ for marker in THROTTLE_ERROR_NAMES
+    )
+
+
+def retry_after(error):
+    """Seconds the provider asked to wait (its Retry-After header), or None"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientCaller:
+    """Deadline, retry and hedging policy for one generator's model calls.
+
+    call() and acall() take a zero-argument callable (a coroutine function for acall)
+    for the primary provider and optionally one for the backup provider. A callable with
+    a reserve(timeout) method (rate_limit.LimitedCall) is reserved within the remaining
+    deadline before each attempt, as is one with an areserve(timeout) coroutine method
+    (rate_limit.AsyncLimitedCall) in acall(). An info dict
+    passed in is filled with "retries" and "hedged" (True when the backup's answer
+    was used) whether or not the call succeeds.
+    """
+
+    def __init__(self, deadline=None, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=BASE_RETRY_DELAY,
+                 max_delay=MAX_RETRY_DELAY, hedge=False, hedge_percentile=95, hedge_min_samples=HEDGE_MIN_SAMPLES):
+        self.deadline = deadline
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def hedge_delay(self):
+        """Seconds to wait for the primary before hedging, or None if hedging is off or unwarmed"""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        rank = max(1, int(round(self.hedge_percentile / 100 * len(ordered))))
+        return ordered[min(rank, len(ordered)) - 1]
+
+    def call(self, primary, backup=None, info=None):
+        """Run primary() under the deadline with retries (and a hedge to backup() if enabled)"""
+        info = {} if info is None else info
+        info.update(retries=0, hedged=False)
+        deadline = time.monotonic() + self.deadline if self.deadline else None
+        while True:
+            try:
+                result, info["hedged"] = self._attempt(primary, backup, deadline)
+                return result
+            except Exception as e:
+                delay = self._retry_delay(e, info["retries"], deadline)
+                if delay is None:
+                    raise
+                info["retries"] += 1
+                time.sleep(delay)
+
+    async def acall(self, primary, backup=None, info=None):
+        """Async counterpart of call; a missed deadline cancels the outstanding requests"""
+        info = {} if info is None else info
+        info.update(retries=0, hedged=False)
+        deadline = time.monotonic() + self.deadline if self.deadline else None
+        while True:
+            try:
+                result, info["hedged"] = await self._aattempt(primary, backup, deadline)
+                return result
+            except Exception as e:
+                delay = self._retry_delay(e, info["retries"], deadline)
+                if delay is None:
+                    raise
+                info["retries"] += 1
+                await asyncio.sleep(delay)
+
+    def stream(self, open_stream, info=None):
+        """Re-yield open_stream()'s chunks, retrying failures that happen before the first chunk.
+
+        Once text has been yielded a failure is raised as is, and streams are never hedged;
+        the deadline only bounds how long retries keep being attempted.
+        """
+        info = {} if info is None else info
+        info.update(retries=0, hedged=False)
+        deadline = time.monotonic() + self.deadline if self.deadline else None
+        while True:
+            started = time.monotonic()
+            yielded = False
+            try:
+                for chunk in self._reserve(open_stream, deadline)():
+                    yielded = True
+                    yield chunk
+                self._observe(time.monotonic() - started)
+                return
+            except Exception as e:
+                delay = None if yielded else self._retry_delay(e, info["retries"], deadline)
+                if delay is None:
+                    raise
+                info["retries"] += 1
+                time.sleep(delay)
+
+    def _attempt(self, primary, backup, deadline):
+        """One try: returns (result, backup_won) or raises the failure"""
+        hedge_after = self.hedge_delay() if backup is not None else None
+        started = time.monotonic()
+        if deadline is None and hedge_after is None:
+            result = primary()
+            self._observe(time.monotonic() - started)
+            return result, False
+
+        primary = self._reserve(primary, deadline)
+        primary_future = _executor.submit(primary)
+        calls = {primary_future: primary}
+        pending = {primary_future}
+        if hedge_after is not None:
+            done, _ = wait(pending, timeout=self._remaining(deadline, hedge_after))
+            if not done and self._remaining(deadline) != 0:
+                try:
+                    # A hedge is only worth sending if the backup has capacity right now
+                    backup = self._reserve(backup, deadline, 0)
+                except TimeoutError:
+                    backup = None
+                if backup is not None:
+                    backup_future = _executor.submit(backup)
+                    calls[backup_future] = backup
+                    pending.add(backup_future)
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=self._remaining(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                self._abandon(calls[future] for future in pending)
+                raise StageDeadlineExceeded(f"Model call exceeded its {self.deadline}s deadline")
+            for future in done:
+                if future.exception() is None:
+                    # When the backup wins this is a lower bound on the primary's latency
+                    self._observe(time.monotonic() - started)
+                    for other in pending:
+                        other.cancel()
+                    self._abandon(calls[other] for other in pending)
+                    return future.result(), future is not primary_future
+                error = error or future.exception()
+        raise error
+
+    async def _aattempt(self, primary, backup, deadline):
+        """Async counterpart of _attempt"""
+        hedge_after = self.hedge_delay() if backup is not None else None
+        started = time.monotonic()
+        primary = await self._areserve(primary, deadline)
+        calls = [primary]
+        primary_task = asyncio.ensure_future(primary())
+        tasks = [primary_task]
+        try:
+            if hedge_after is not None:
+                done, _ = await asyncio.wait(tasks, timeout=self._remaining(deadline, hedge_after))
+                if not done and self._remaining(deadline) != 0:
+                    try:
+                        # As in _attempt, only hedge when the backup has capacity right now
+                        backup = await self._areserve(backup, deadline, 0)
+                    except TimeoutError:
+                        backup = None
+                    if backup is not None:
+                        calls.append(backup)
+                        tasks.append(asyncio.ensure_future(backup()))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=self._remaining(deadline), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise StageDeadlineExceeded(f"Model call exceeded its {self.deadline}s deadline")
+                for task in done:
+                    if task.exception() is None:
+                        self._observe(time.monotonic() - started)
+                        return task.result(), task is not primary_task
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # A task cancelled before it first ran never took over its permit
+            self._abandon(calls)
+
+    def _reserve(self, call, deadline, cap=None):
+        """call with its rate-limit permit taken now, within the remaining deadline (and cap), if it has one"""
+        reserve = getattr(call, "reserve", None)
+        return call if reserve is None else reserve(self._remaining(deadline, cap))
+
+    async def _areserve(self, call, deadline, cap=None):
+        """Async counterpart of _reserve for calls with an areserve() method"""
+        areserve = getattr(call, "areserve", None)
+        return call if areserve is None else await areserve(self._remaining(deadline, cap))
+
+    @staticmethod
+    def _abandon(calls):
+        """Give back the permits of reserved calls that have not started, so they never run"""
+        for call in calls:
+            abandon = getattr(call, "abandon", None)
+            if abandon is not None:
+                abandon()
+
+    def _retry_delay(self, error, retries, deadline):
+        """Jittered backoff before the next attempt, or None if the error should be raised"""
+        if retries + 1 >= self.max_attempts or not is_transient(error):
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retries))
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _observe(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    @staticmethod
+    def _remaining(deadline, cap=None):
+        """Seconds left before deadline (never negative), optionally capped; None means no limit"""
+        if deadline is None:
+            return cap
+        remaining = max(0.0, deadline - time.monotonic())
+        return remaining if cap is None else min(remaining, cap)
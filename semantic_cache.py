@@ -0,0 +1,257 @@
+# Semantic near-duplicate cache for whole trip plans
+# A request can only reuse a plan for the same normalized destination (qualifiers included, so
+# "Paris" never matches "Paris, Texas"), duration and plan shape; within that, preferences are
+# embedded locally with hashed word, word-order and character n-grams and compared by cosine,
+# e.g. "Japan" / "I really love museums" vs "japan " / "love museums!"
+
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict, deque
+
+import numpy as np
+
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.9
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+# Hashed feature buckets for each of the word and word-order halves of a vector
+EMBEDDING_DIM = 256
+CHAR_NGRAM_WEIGHT = 0.5
+# Share of the similarity that comes from word order (bigrams), so "nature over museums"
+# and "museums over nature" stay apart
+WORD_ORDER_WEIGHT = 0.5
+# Best similarity of each recent lookup, kept for the threshold report
+REPORT_WINDOW = 500
+REPORT_THRESHOLDS = (0.8, 0.85, 0.9, 0.95, 0.98)
+
+# Filler words that change the wording of a preference but not its meaning; sentiment and
+# negation words ("love", "hate", "prefer", "not", "no") are kept
+STOPWORDS = frozenset(
+    "i im me my we our a an the and or to of in on at for with is are be am really very quite".split()
+)
+NO_PREFERENCES = "no stated preferences"
+
+
+def normalize_text(text):
+    """Lowercase, strip accents and punctuation and collapse whitespace"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return " ".join("".join(char if char.isalnum() else " " for char in text).split())
+
+
+def _bucket(feature):
+    """Stable (index, sign) for a feature; signed hashing keeps collisions from only adding up"""
+    value = zlib.crc32(feature.encode("utf-8"))
+    return value % EMBEDDING_DIM, 1.0 if value & 0x80000000 else -1.0
+
+
+def _add_word_features(vector, words):
+    """Add hashed word and character-trigram features of words to vector"""
+    for word in words:
+        index, sign = _bucket("w:" + word)
+        vector[index] += sign
+        padded = f"#{word}#"
+        trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        for trigram in trigrams:
+            index, sign = _bucket("c:" + trigram)
+            # Each word's trigrams share a fixed weight so long words don't dominate
+            vector[index] += sign * CHAR_NGRAM_WEIGHT / len(trigrams)
+
+
+def _add_order_features(vector, words):
+    """Add hashed word-bigram features of words to vector"""
+    for first, second in zip(words, words[1:]):
+        index, sign = _bucket(f"b:{first} {second}")
+        vector[index] += sign
+
+
+def _unit(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def destination_key(destination):
+    """Normalized destination a plan can be reused for; qualifiers such as ", Texas" are kept"""
+    return normalize_text(destination)
+
+
+def embed_preferences(preferences):
+    """Unit vector for the preferences string, ignoring filler words but not word order.
+
+    Its dot product with another request's is roughly (1 - WORD_ORDER_WEIGHT) * word cosine
+    + WORD_ORDER_WEIGHT * bigram cosine.
+    """
+    words = [word for word in normalize_text(preferences).split() if word not in STOPWORDS]
+    if not words:
+        words = NO_PREFERENCES.split()
+    word_vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    order_vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    _add_word_features(word_vector, words)
+    _add_order_features(order_vector, words)
+    return _unit(np.concatenate([
+        _unit(word_vector) * np.sqrt(1 - WORD_ORDER_WEIGHT),
+        _unit(order_vector) * np.sqrt(WORD_ORDER_WEIGHT)
+    ])).astype(np.float32)
+
+
+class _Entry:
+    __slots__ = ("destination", "duration", "preferences", "variant", "result", "created_at", "row")
+
+    def __init__(self, destination, duration, preferences, variant, result):
+        self.destination = destination
+        self.duration = duration
+        self.preferences = preferences
+        self.variant = variant
+        self.result = result
+        self.created_at = time.time()
+        self.row = None
+
+
+class _Partition:
+    """Vectors and entries for one (destination, duration, variant); rows stay packed at the front"""
+
+    def __init__(self, dim):
+        self.vectors = np.zeros((16, dim), dtype=np.float32)
+        self.entries = []
+
+    def add(self, vector, entry):
+        if len(self.entries) == len(self.vectors):
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+        entry.row = len(self.entries)
+        self.vectors[entry.row] = vector
+        self.entries.append(entry)
+
+    def remove(self, entry):
+        """Move the last row into the freed slot"""
+        last = self.entries.pop()
+        if last is not entry:
+            self.vectors[entry.row] = self.vectors[last.row]
+            last.row = entry.row
+            self.entries[entry.row] = last
+
+    def best_match(self, vector):
+        """(similarity, entry) of the closest stored request, or (None, None) when empty"""
+        if not self.entries:
+            return None, None
+        scores = self.vectors[:len(self.entries)] @ vector
+        row = int(np.argmax(scores))
+        return float(scores[row]), self.entries[row]
+
+
+class SemanticPlanCache:
+    """In-memory cache of finished plans keyed by request similarity.
+
+    A lookup hits when an unexpired plan for the same normalized destination, duration
+    and plan shape (variant) has a preferences similarity of at least threshold; the least recently used plan
+    is evicted beyond max_entries. Thread-safe, so one instance can be shared by
+    several planners.
+    """
+
+    def __init__(self, threshold=DEFAULT_SIMILARITY_THRESHOLD, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._partitions = {}
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._recent = deque(maxlen=REPORT_WINDOW)
+
+    def lookup(self, destination, duration, preferences, variant="text"):
+        """A copy of the stored plan for a near-identical request, or None"""
+        vector = embed_preferences(preferences)
+        with self._lock:
+            partition = self._partitions.get((destination_key(destination), duration, variant))
+            similarity, entry = partition.best_match(vector) if partition else (None, None)
+            while entry is not None and self._expired(entry):
+                self._remove(entry)
+                similarity, entry = partition.best_match(vector)
+
+            hit = similarity is not None and similarity >= self.threshold
+            self._recent.append({
+                "destination": destination,
+                "duration": duration,
+                "matched_destination": entry.destination if entry else None,
+                "similarity": similarity,
+                "hit": hit
+            })
+            if not hit:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._lru.move_to_end(id(entry))
+            return dict(entry.result)
+
+    def add(self, destination, duration, preferences, result, variant="text"):
+        """Store a finished plan, replacing an existing entry for an identical request"""
+        vector = embed_preferences(preferences)
+        entry = _Entry(destination, duration, preferences, variant, dict(result))
+        key = (destination_key(destination), duration, variant)
+        with self._lock:
+            partition = self._partitions.get(key)
+            similarity, existing = partition.best_match(vector) if partition else (None, None)
+            if existing is not None and similarity >= 0.9999:
+                # May drop the emptied partition, so look it up again below
+                self._remove(existing)
+            partition = self._partitions.get(key)
+            if partition is None:
+                partition = self._partitions[key] = _Partition(len(vector))
+            partition.add(vector, entry)
+            self._lru[id(entry)] = entry
+            while len(self._lru) > self.max_entries:
+                self._remove(next(iter(self._lru.values())))
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+            self._lru.clear()
+
+    def stats(self):
+        """Hit/miss counters since creation"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "entries": len(self._lru),
+                "threshold": self.threshold
+            }
+
+    def report(self, thresholds=REPORT_THRESHOLDS, examples=10):
+        """Hit-rate report for tuning the threshold.
+
+        For each candidate threshold, the hit rate the recent lookups would have had
+        (ignoring entries the lower threshold would have added or evicted), plus the
+        most recent lookups with the destination they matched and its similarity.
+        """
+        with self._lock:
+            recent = list(self._recent)
+        scores = [item["similarity"] for item in recent]
+        report = self.stats()
+        report["lookups_in_window"] = len(recent)
+        report["thresholds"] = [
+            {
+                "threshold": threshold,
+                "hit_rate": (sum(1 for score in scores if score is not None and score >= threshold) / len(scores)
+                             if scores else None)
+            }
+            for threshold in sorted(set(thresholds) | {self.threshold})
+        ]
+        report["recent"] = recent[-examples:] if examples else []
+        return report
+
+    def _expired(self, entry):
+        return bool(self.ttl_seconds) and time.time() - entry.created_at > self.ttl_seconds
+
+    def _remove(self, entry):
+        key = (destination_key(entry.destination), entry.duration, entry.variant)
+        partition = self._partitions[key]
+        partition.remove(entry)
+        if not partition.entries:
+            del self._partitions[key]
+        del self._lru[id(entry)]
@@ -0,0 +1,161 @@
+# Single-flight coalescing of identical in-flight model calls
+# When several sessions ask for the same stage with the same inputs at the same moment,
+# the first call (the leader) goes to the model and every concurrent duplicate (a
+# follower) waits for and shares its result, whether it runs in a thread or an asyncio task
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class _LeaderCancelled(Exception):
+    """The leader's task was cancelled; followers start a call of their own instead"""
+
+
+class _Stream:
+    """Chunks of one in-flight stream, readable by any number of consumers"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.changed = threading.Condition()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key onto one execution.
+
+    call(), acall() and stream() take the key and a zero-argument callable (a
+    coroutine function for acall, a generator function for stream). An info dict
+    passed in gets "coalesced": True when the caller shared another call's result.
+    A leader's error is raised to its followers too.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, registry, key, factory, info):
+        """(entry, is_leader) for key, registering a new entry when nothing is in flight"""
+        with self._lock:
+            entry = registry.get(key)
+            leader = entry is None
+            if leader:
+                entry = registry[key] = factory()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if info is not None:
+            info["coalesced"] = not leader
+        return entry, leader
+
+    def _leave(self, registry, key, entry):
+        with self._lock:
+            if registry.get(key) is entry:
+                del registry[key]
+
+    def call(self, key, fn, info=None):
+        """fn(), or the result of an identical call already in flight"""
+        while True:
+            future, leader = self._join(self._calls, key, Future, info)
+            if not leader:
+                try:
+                    return future.result()
+                except _LeaderCancelled:
+                    continue
+            try:
+                result = fn()
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                self._leave(self._calls, key, future)
+
+    async def acall(self, key, coro_fn, info=None):
+        """Async counterpart of call; can share a call with threads and with other event loops"""
+        while True:
+            future, leader = self._join(self._calls, key, Future, info)
+            if not leader:
+                try:
+                    # Shielded so a cancelled follower never cancels the shared call
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except _LeaderCancelled:
+                    continue
+            try:
+                result = await coro_fn()
+            except asyncio.CancelledError:
+                future.set_exception(_LeaderCancelled())
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                self._leave(self._calls, key, future)
+
+    def stream(self, key, produce, info=None):
+        """Iterate produce()'s chunks, or those of an identical stream already in flight.
+
+        The stream is pumped on its own thread, so it runs to completion (and its
+        result is cached) even if the consumer that started it stops reading.
+        Consumers that join late first receive the chunks produced so far.
+        """
+        entry, leader = self._join(self._streams, key, _Stream, info)
+        if leader:
+            threading.Thread(
+                target=self._pump, args=(key, entry, produce), name="single-flight-stream", daemon=True
+            ).start()
+        return self._read(entry)
+
+    def _pump(self, key, entry, produce):
+        try:
+            for chunk in produce():
+                with entry.changed:
+                    entry.chunks.append(chunk)
+                    entry.changed.notify_all()
+        except BaseException as e:
+            entry.error = e
+        finally:
+            self._leave(self._streams, key, entry)
+            with entry.changed:
+                entry.done = True
+                entry.changed.notify_all()
+
+    @staticmethod
+    def _read(entry):
+        index = 0
+        while True:
+            with entry.changed:
+                while index == len(entry.chunks) and not entry.done:
+                    entry.changed.wait()
+                chunks = entry.chunks[index:]
+                finished = entry.done
+            index += len(chunks)
+            yield from chunks
+            if finished and index == len(entry.chunks):
+                if entry.error is not None:
+                    raise entry.error
+                return
+
+    def stats(self):
+        """How many calls went to the model, how many were saved by sharing one, and how many are in flight"""
+        with self._lock:
+            total = self.leaders + self.coalesced
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "saved_rate": self.coalesced / total if total else None,
+                "in_flight": len(self._calls) + len(self._streams)
+            }
+
+
+# Shared by every planner in the process, so separate sessions coalesce with each other
+default_single_flight = SingleFlight()
@@ -7,7 +7,7 @@ A beautiful web interface for the AI Travel Planner using Streamlit
 import streamlit as st
 import os
 import sys
-from datetime import datetime
+import time
 import json
 from dotenv import load_dotenv
 
@@ -18,11 +18,25 @@ load_dotenv()
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from main import TravelPlanner
+    from main import TravelPlanner, DEFAULT_MEMORY_TOKEN_LIMIT, DURATION_OPTIONS
+    from instrumentation import MetricsRecorder, DEFAULT_METRICS_PATH
+    from semantic_cache import SemanticPlanCache, destination_key
+    import api_key_validation
+    from trip_history import TripHistoryStore, api_key_owner
 except ImportError as e:
     st.error(f"Error importing TravelPlanner: {e}")
     st.stop()
 
+# Trips shown per page in the History tab
+HISTORY_PAGE_SIZE = 10
+
+# Section headings for each streamed pipeline stage
+STAGE_HEADERS = {
+    "outline": "📋 Day-by-Day Outline",
+    "detailed_itinerary": "📅 Detailed Itinerary",
+    "packing_checklist": "🎒 Packing Checklist"
+}
+
 # Page configuration
 st.set_page_config(
     page_title="🏖️ AI Travel Itinerary Planner",
@@ -86,8 +100,9 @@ st.markdown("""
 # Initialize session state
 if 'travel_planner' not in st.session_state:
     st.session_state.travel_planner = None
-if 'trip_history' not in st.session_state:
-    st.session_state.trip_history = []
+if 'history_cursors' not in st.session_state:
+    # Cursor of the last trip on each previous History page (empty on the first page)
+    st.session_state.history_cursors = []
 if 'preferences' not in st.session_state:
     st.session_state.preferences = []
 if 'api_keys_configured' not in st.session_state:
@@ -97,44 +112,139 @@ if 'groq_api_key' not in st.session_state:
 if 'google_api_key' not in st.session_state:
     st.session_state.google_api_key = ""
 
-def validate_api_keys(groq_key=None, google_key=None):
-    """Validate API keys by making test requests"""
-    validation_results = {"groq": False, "google": False}
+@st.cache_resource
+def get_history_store():
+    """Trip history database shared by all sessions of this app, each under its own owner"""
+    return TripHistoryStore()
+
+def history_owner():
+    """Owner of this user's trips in the shared history database. Derived from their Groq
+    API key, so the trips come back after a reload or in a new tab"""
+    owner = api_key_owner(os.getenv("GROQ_API_KEY") or "")
+    if st.session_state.get("history_owner_seen") != owner:
+        # Once per session and key, so the owner's trips outlive the retention period
+        get_history_store().touch(owner)
+        st.session_state.history_owner_seen = owner
+    return owner
+
+@st.cache_resource
+def get_metrics_recorder():
+    """Pipeline metrics shared by all sessions, also appended to a JSON-lines file"""
+    return MetricsRecorder(sink_path=DEFAULT_METRICS_PATH)
+
+@st.cache_resource
+def get_semantic_cache():
+    """Near-duplicate plan cache shared by all sessions"""
+    return SemanticPlanCache()
+
+def format_seconds(value):
+    """Metrics table cell for a duration that may be missing"""
+    return f"{value:.2f}s" if value is not None else "–"
+
+@st.fragment(run_every=5)
+def show_pipeline_metrics():
+    """Rolling per-stage latency percentiles across every session of this app"""
+    summary = get_metrics_recorder().summary()
+    if not summary:
+        st.caption("No plans generated yet.")
+        return
     
-    # Test Groq API key
-    if groq_key or os.getenv("GROQ_API_KEY"):
-        try:
-            from langchain_groq import ChatGroq
-            test_llm = ChatGroq(
-                groq_api_key=groq_key or os.getenv("GROQ_API_KEY"),
-                model_name="llama-3.1-8b-instant",
-                temperature=0.1
-            )
-            # Make a simple test request
-            response = test_llm.invoke("Hello")
-            if response and hasattr(response, 'content'):
-                validation_results["groq"] = True
-        except Exception as e:
-            validation_results["groq"] = False
+    rows = []
+    for stage, stats in summary.items():
+        rows.append({
+            "Stage": STAGE_HEADERS.get(stage, stage.replace("_", " ").title()),
+            "Runs": stats["runs"],
+            "p50": format_seconds(stats["p50"]),
+            "p95": format_seconds(stats["p95"]),
+            "First token p50": format_seconds(stats["ttft_p50"]),
+            "Avg tokens in/out": (f"{stats['avg_prompt_tokens']:.0f} / {stats['avg_completion_tokens']:.0f}"
+                                  if stats["avg_prompt_tokens"] is not None else "–")
+        })
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+    total_cost = sum(stats["cost_usd"] for stats in summary.values())
+    st.caption(f"Last {get_metrics_recorder().window} runs per stage · est. cost ${total_cost:.4f}")
+    coalesced = sum(stats["coalesced"] for stats in summary.values())
+    if coalesced:
+        st.caption(f"🔗 {coalesced} model calls shared with identical requests already in flight")
+    semantic = get_semantic_cache().stats()
+    if semantic["hit_rate"] is not None:
+        st.caption(f"♻️ Reused plans: {semantic['hits']} of {semantic['hits'] + semantic['misses']} "
+                   f"({semantic['hit_rate']:.0%}) at similarity ≥ {semantic['threshold']}")
+
+def show_structured_result(result):
+    """Render a plan_trip(structured=True) result, with one timetable per day"""
+    st.subheader(STAGE_HEADERS["outline"])
+    st.markdown(result["outline"])
     
-    # Test Google API key
-    if google_key or os.getenv("GOOGLE_API_KEY"):
-        try:
-            from langchain_google_genai import GoogleGenerativeAI
-            test_llm = GoogleGenerativeAI(
-                google_api_key=google_key or os.getenv("GOOGLE_API_KEY"),
-                model="gemini-1.5-flash",
-                temperature=0.1
+    st.subheader(STAGE_HEADERS["detailed_itinerary"])
+    itinerary = result.get("itinerary")
+    if itinerary is None:
+        # The models did not return valid JSON and the planner fell back to free-form text
+        st.markdown(result["detailed_itinerary"])
+    else:
+        for plan in itinerary.days:
+            st.markdown(f"**Day {plan.day}: {plan.title}**" if plan.title else f"**Day {plan.day}**")
+            st.dataframe(
+                [
+                    {
+                        "Time": slot.time,
+                        "Activity": slot.activity,
+                        "Place": slot.place,
+                        "Cost (USD)": f"{slot.cost_usd:,.0f}" if slot.cost_usd is not None else "",
+                        "Transport": slot.transport or ""
+                    }
+                    for slot in plan.slots
+                ],
+                hide_index=True,
+                use_container_width=True
             )
-            # Make a simple test request
-            response = test_llm.invoke("Hello")
-            # Check for valid response - GoogleGenerativeAI returns string directly
-            if response and str(response).strip():
-                validation_results["google"] = True
-        except Exception as e:
-            validation_results["google"] = False
+            st.caption(f"Estimated cost: ~${plan.cost():,.0f}")
+        st.markdown(f"**💰 Estimated total: ~${itinerary.total_cost():,.0f}**")
     
-    return validation_results
+    st.subheader(STAGE_HEADERS["packing_checklist"])
+    st.markdown(result["packing_checklist"])
+
+def show_replanned_result(result):
+    """Render a replan() result with a note on what was regenerated"""
+    rebuilt = result["rebuilt"]
+    changes = []
+    if rebuilt["outline"] != "reused":
+        changes.append(f"outline {rebuilt['outline']}")
+    if rebuilt["days"]:
+        changes.append("new plans for day " + ", ".join(str(day) for day in rebuilt["days"]))
+    if rebuilt["packing_checklist"]:
+        changes.append("packing checklist refreshed")
+    st.caption("🔁 Updated your last plan: " + ("; ".join(changes) if changes else "nothing needed to change"))
+    
+    for stage in ("outline", "detailed_itinerary", "packing_checklist"):
+        st.subheader(STAGE_HEADERS[stage])
+        st.markdown(result[stage])
+
+def validate_api_keys(groq_key=None, google_key=None):
+    """Validate API keys with lightweight probes run concurrently, cached across sessions"""
+    return api_key_validation.validate_api_keys(
+        groq_key or os.getenv("GROQ_API_KEY"),
+        google_key or os.getenv("GOOGLE_API_KEY")
+    )
+
+def format_key_status(result):
+    """Sidebar label for one validation result"""
+    if result is None:
+        return "⚠️ Could not check"
+    return "✅ Valid" if result else "❌ Invalid"
+
+@st.fragment(run_every=1)
+def show_pending_api_key_status(groq_key, google_key):
+    """Placeholder status that polls until the background validation finishes.
+    
+    Polls the results cache rather than start_validation, which would begin a new
+    check once the first one finished; the full rerun then shows the results instead
+    of this fragment, which stops the polling.
+    """
+    st.markdown("- Groq: ⏳ Checking...")
+    st.markdown("- Google: ⏳ Checking...")
+    if api_key_validation.cached_results(groq_key, google_key) is not None:
+        st.rerun()
 
 def save_api_keys_to_env(groq_key, google_key):
     """Save API keys to .env file"""
@@ -238,9 +348,6 @@ def show_api_key_dialog():
                         os.environ["LANGCHAIN_TRACING_V2"] = "false"
                         
                         st.session_state.api_keys_configured = True
-                        # Clear validation cache to force re-validation with new keys
-                        if 'api_validation_cache' in st.session_state:
-                            del st.session_state.api_validation_cache
                         st.success("✅ API keys validated and saved successfully!")
                         st.rerun()
                     else:
@@ -248,9 +355,13 @@ def show_api_key_dialog():
                 else:
                     # Show specific validation errors
                     error_messages = []
-                    if not validation_results["groq"]:
+                    if validation_results["groq"] is None:
+                        error_messages.append("❌ Could not reach Groq to check the API key")
+                    elif not validation_results["groq"]:
                         error_messages.append("❌ Groq API key is invalid")
-                    if not validation_results["google"]:
+                    if validation_results["google"] is None:
+                        error_messages.append("❌ Could not reach Google to check the API key")
+                    elif not validation_results["google"]:
                         error_messages.append("❌ Google API key is invalid")
                     
                     for error in error_messages:
@@ -282,7 +393,11 @@ def initialize_travel_planner():
             if not os.getenv("LANGCHAIN_TRACING_V2"):
                 os.environ["LANGCHAIN_TRACING_V2"] = "false"
             
-            st.session_state.travel_planner = TravelPlanner()
+            st.session_state.travel_planner = TravelPlanner(
+                memory_token_limit=DEFAULT_MEMORY_TOKEN_LIMIT,
+                metrics=get_metrics_recorder(),
+                semantic_cache=get_semantic_cache()
+            )
             st.success("✅ TravelPlanner initialized successfully!")
             return True
         except Exception as e:
@@ -326,24 +441,22 @@ def main():
         google_key = os.getenv("GOOGLE_API_KEY")
         
         if groq_key and google_key:
-            # Validate API keys (cache the result for performance)
-            if 'api_validation_cache' not in st.session_state:
-                with st.spinner("🔍 Checking API keys..."):
-                    st.session_state.api_validation_cache = validate_api_keys()
-            
-            groq_status = "✅ Valid" if st.session_state.api_validation_cache["groq"] else "❌ Invalid"
-            google_status = "✅ Valid" if st.session_state.api_validation_cache["google"] else "❌ Invalid"
+            # Results are shared across sessions; if none are cached yet, check in the
+            # background and let the rest of the page render meanwhile
+            validation_results = api_key_validation.cached_results(groq_key, google_key)
+            if validation_results is None:
+                api_key_validation.start_validation(groq_key, google_key)
+                show_pending_api_key_status(groq_key, google_key)
+            else:
+                st.markdown(f"- Groq: {format_key_status(validation_results['groq'])}")
+                st.markdown(f"- Google: {format_key_status(validation_results['google'])}")
         else:
-            groq_status = "❌ Not set"
-            google_status = "❌ Not set"
-        
-        st.markdown(f"- Groq: {groq_status}")
-        st.markdown(f"- Google: {google_status}")
+            st.markdown("- Groq: ❌ Not set")
+            st.markdown("- Google: ❌ Not set")
         
         # Add refresh button for validation
         if st.button("🔄 Refresh Status", help="Re-validate API keys"):
-            with st.spinner("🔍 Re-validating API keys..."):
-                st.session_state.api_validation_cache = validate_api_keys()
+            api_key_validation.invalidate(groq_key, google_key)
             st.rerun()
         
         if st.button("🔑 Change API Keys"):
@@ -355,13 +468,15 @@ def main():
                 del os.environ['GROQ_API_KEY']
             if 'GOOGLE_API_KEY' in os.environ:
                 del os.environ['GOOGLE_API_KEY']
-            # Reset TravelPlanner instance and validation cache
+            # Reset TravelPlanner instance
             st.session_state.travel_planner = None
             st.session_state.api_keys_configured = False
-            if 'api_validation_cache' in st.session_state:
-                del st.session_state.api_validation_cache
             st.rerun()
         
+        st.markdown("---")
+        st.markdown("### 📊 Pipeline Metrics")
+        show_pipeline_metrics()
+        
         st.markdown("---")
         st.markdown("### 💡 Tips")
         st.markdown("""
@@ -392,55 +507,83 @@ def main():
                 
                 duration = st.selectbox(
                     "📅 Trip Duration",
-                    options=[3, 5, 7, 10, 14, 21, 30],
+                    options=DURATION_OPTIONS,
                     format_func=lambda x: f"{x} days",
                     help="Select the duration of your trip"
                 )
                 
+                regenerate = st.checkbox(
+                    "🔄 Regenerate (skip cached results)",
+                    help="Ask the AI models again instead of reusing a previously generated plan"
+                )
+                
+                structured = st.checkbox(
+                    "🧩 Structured itinerary",
+                    help="Show each day as a timetable with places, costs and transport (not streamed)"
+                )
+                
                 submitted = st.form_submit_button("🚀 Generate Travel Plan", use_container_width=True)
                 
                 if submitted:
                     if not destination:
                         st.error("Please enter a destination")
                     else:
-                        with st.spinner("🌍 Creating your personalized travel plan..."):
-                            try:
-                                result = st.session_state.travel_planner.plan_trip(destination, duration)
-                                
-                                # Store in history
-                                trip_data = {
-                                    "destination": destination,
-                                    "duration": duration,
-                                    "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                                    "result": result
-                                }
-                                st.session_state.trip_history.insert(0, trip_data)
-                                
-                                st.success("🎉 Travel plan generated successfully!")
-                                
-                                # Display results
-                                st.markdown("---")
-                                
-                                # Day-by-day outline
-                                st.markdown('<div class="result-section">', unsafe_allow_html=True)
-                                st.subheader("📋 Day-by-Day Outline")
-                                st.markdown(result["outline"])
-                                st.markdown('</div>', unsafe_allow_html=True)
-                                
-                                # Detailed itinerary
-                                st.markdown('<div class="result-section">', unsafe_allow_html=True)
-                                st.subheader("📅 Detailed Itinerary")
-                                st.markdown(result["detailed_itinerary"])
-                                st.markdown('</div>', unsafe_allow_html=True)
-                                
-                                # Packing checklist
-                                st.markdown('<div class="result-section">', unsafe_allow_html=True)
-                                st.subheader("🎒 Packing Checklist")
-                                st.markdown(result["packing_checklist"])
-                                st.markdown('</div>', unsafe_allow_html=True)
-                                
-                            except Exception as e:
-                                st.error(f"❌ Error generating travel plan: {e}")
+                        try:
+                            st.markdown("---")
+                            result = None
+                            last_plan = st.session_state.travel_planner.last_plan
+                            
+                            if structured:
+                                with st.spinner("🧩 Planning your structured itinerary..."):
+                                    result = st.session_state.travel_planner.plan_trip(
+                                        destination, duration, use_cache=not regenerate, structured=True
+                                    )
+                                show_structured_result(result)
+                            elif (not regenerate and last_plan is not None
+                                  and destination_key(last_plan.destination) == destination_key(destination)):
+                                # Tweaking the last trip: keep every day and stage whose inputs are unchanged.
+                                # The destination only differs in case, accents, punctuation or spacing, so reuse the stored
+                                # spelling, which is what the plan's content hashes were built from
+                                with st.spinner("🔁 Updating your plan..."):
+                                    result = st.session_state.travel_planner.replan(duration=duration)
+                                show_replanned_result(result)
+                            else:
+                                # Render each section as its tokens stream in
+                                for event in st.session_state.travel_planner.plan_trip_stream(
+                                    destination, duration, use_cache=not regenerate
+                                ):
+                                    stage = event["stage"]
+                                    if event["type"] == "stage_start":
+                                        st.markdown('<div class="result-section">', unsafe_allow_html=True)
+                                        st.subheader(STAGE_HEADERS[stage])
+                                        section = st.empty()
+                                        timing = st.empty()
+                                        st.markdown('</div>', unsafe_allow_html=True)
+                                        section.info("⏳ Waiting for the AI model...")
+                                        stage_text = ""
+                                        last_render = 0.0
+                                    elif event["type"] == "token":
+                                        stage_text += event["text"]
+                                        # Throttle re-renders so long sections don't redraw on every token
+                                        if time.monotonic() - last_render > 0.1:
+                                            section.markdown(stage_text + "▌")
+                                            last_render = time.monotonic()
+                                    elif event["type"] == "stage_complete":
+                                        section.markdown(stage_text)
+                                        timing.caption(
+                                            f"⏱️ First token after {event['time_to_first_token'] or 0:.2f}s · "
+                                            f"completed in {event['elapsed']:.1f}s"
+                                        )
+                                    elif event["type"] == "result":
+                                        result = event["result"]
+                            
+                            # Store in history
+                            get_history_store().add(destination, duration, result, owner=history_owner())
+                            
+                            st.success("🎉 Travel plan generated successfully!")
+                            
+                        except Exception as e:
+                            st.error(f"❌ Error generating travel plan: {e}")
         
         with col2:
             # Current preferences display
@@ -503,29 +646,76 @@ def main():
     with tab3:
         st.header("📚 Trip History")
         
-        if st.session_state.trip_history:
-            for i, trip in enumerate(st.session_state.trip_history):
+        history_store = get_history_store()
+        owner = history_owner()
+        
+        destination_filter = st.text_input(
+            "🔎 Filter by destination",
+            placeholder="e.g., Japan",
+            help="Show only trips to this destination"
+        )
+        if destination_filter != st.session_state.get("history_filter", ""):
+            # A new filter starts again from the newest trips
+            st.session_state.history_filter = destination_filter
+            st.session_state.history_cursors = []
+        
+        cursors = st.session_state.history_cursors
+        # Fetch one extra summary to know whether an older page exists
+        trips = history_store.list_page(
+            owner=owner,
+            page_size=HISTORY_PAGE_SIZE + 1,
+            before=cursors[-1] if cursors else None,
+            destination=destination_filter
+        )
+        has_older = len(trips) > HISTORY_PAGE_SIZE
+        trips = trips[:HISTORY_PAGE_SIZE]
+        
+        if trips:
+            for trip in trips:
                 with st.expander(f"🗺️ {trip['destination']} - {trip['duration']} days ({trip['date']})"):
                     col1, col2 = st.columns([3, 1])
                     
                     with col1:
                         st.markdown("**Day-by-Day Outline:**")
-                        st.markdown(trip['result']['outline'][:500] + "..." if len(trip['result']['outline']) > 500 else trip['result']['outline'])
+                        st.markdown(trip['outline_preview'])
                         
-                        if st.button("📖 View Full Plan", key=f"view_{i}"):
-                            st.markdown("### 📋 Full Day-by-Day Outline")
-                            st.markdown(trip['result']['outline'])
-                            
-                            st.markdown("### 📅 Full Detailed Itinerary")
-                            st.markdown(trip['result']['detailed_itinerary'])
-                            
-                            st.markdown("### 🎒 Full Packing Checklist")
-                            st.markdown(trip['result']['packing_checklist'])
+                        if st.button("📖 View Full Plan", key=f"view_{trip['id']}"):
+                            # Full plan texts are only read from disk when asked for
+                            plan = history_store.get_plan(trip['id'], owner=owner)
+                            if plan is None:
+                                st.warning("This trip is no longer available.")
+                            else:
+                                st.markdown("### 📋 Full Day-by-Day Outline")
+                                st.markdown(plan['outline'])
+                                
+                                st.markdown("### 📅 Full Detailed Itinerary")
+                                st.markdown(plan['detailed_itinerary'])
+                                
+                                st.markdown("### 🎒 Full Packing Checklist")
+                                st.markdown(plan['packing_checklist'])
                     
                     with col2:
-                        if st.button("🗑️ Delete", key=f"delete_{i}"):
-                            st.session_state.trip_history.pop(i)
+                        if st.button("🗑️ Delete", key=f"delete_{trip['id']}"):
+                            history_store.delete(trip['id'], owner=owner)
                             st.rerun()
+            
+            col_newer, col_page, col_older = st.columns([1, 2, 1])
+            with col_newer:
+                if cursors and st.button("⬅️ Newer", use_container_width=True):
+                    cursors.pop()
+                    st.rerun()
+            with col_page:
+                st.markdown(f"<p style='text-align: center;'>Page {len(cursors) + 1}</p>", unsafe_allow_html=True)
+            with col_older:
+                if has_older and st.button("Older ➡️", use_container_width=True):
+                    cursors.append(trips[-1]['cursor'])
+                    st.rerun()
+        elif cursors:
+            # The page emptied out (e.g. its trips were deleted); step back
+            cursors.pop()
+            st.rerun()
+        elif destination_filter:
+            st.info(f"No trips to {destination_filter} yet.")
         else:
             st.info("No trips planned yet. Start planning your first adventure!")
     
@@ -0,0 +1,167 @@
+# Persistent trip history for the Streamlit app
+# Summaries and full plan texts live in separate tables so listing a page never reads the plans;
+# trips of owners who have not been seen for the retention period are purged
+
+import hashlib
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+
+DEFAULT_HISTORY_PATH = "trip_history.sqlite3"
+DEFAULT_OWNER = "default"
+PREVIEW_LENGTH = 500
+# Trips of an owner who has not been seen for this long are deleted
+DEFAULT_RETENTION_SECONDS = 90 * 24 * 60 * 60
+# Inactive owners are swept at most this often
+PURGE_INTERVAL_SECONDS = 60 * 60
+
+
+def api_key_owner(api_key):
+    """History owner for whoever uses api_key: a fingerprint that lasts across sessions
+    without the key itself being stored"""
+    return hashlib.sha256(f"trip-history:{api_key}".encode("utf-8")).hexdigest()[:32]
+
+
+class TripHistoryStore:
+    """SQLite-backed trip history with keyset-paginated summaries and on-demand full plans"""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, retention_seconds=DEFAULT_RETENTION_SECONDS):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS trips (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                destination TEXT NOT NULL COLLATE NOCASE,
+                duration INTEGER NOT NULL,
+                outline_preview TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_trips_owner_date ON trips (owner, created_at, id);
+            CREATE INDEX IF NOT EXISTS idx_trips_owner_destination ON trips (owner, destination, created_at, id);
+
+            CREATE TABLE IF NOT EXISTS trip_plans (
+                trip_id INTEGER PRIMARY KEY REFERENCES trips (id) ON DELETE CASCADE,
+                outline TEXT NOT NULL,
+                detailed_itinerary TEXT NOT NULL,
+                packing_checklist TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS owners (
+                owner TEXT PRIMARY KEY,
+                last_seen REAL NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+        self.purge_inactive()
+
+    def touch(self, owner=DEFAULT_OWNER):
+        """Record that owner is still around, so their trips are kept"""
+        with self._lock:
+            self._touch(owner, time.time())
+            self._conn.commit()
+        if time.time() - self._last_purge > PURGE_INTERVAL_SECONDS:
+            self.purge_inactive()
+
+    def _touch(self, owner, now):
+        self._conn.execute(
+            "INSERT INTO owners (owner, last_seen) VALUES (?, ?) "
+            "ON CONFLICT (owner) DO UPDATE SET last_seen = excluded.last_seen",
+            (owner, now)
+        )
+
+    def purge_inactive(self):
+        """Delete the trips of owners not seen within the retention period (or never recorded) and return how many"""
+        self._last_purge = time.time()
+        if not self.retention_seconds:
+            return 0
+        cutoff = self._last_purge - self.retention_seconds
+        with self._lock:
+            self._conn.execute("DELETE FROM owners WHERE last_seen < ?", (cutoff,))
+            cursor = self._conn.execute("DELETE FROM trips WHERE owner NOT IN (SELECT owner FROM owners)")
+            self._conn.commit()
+        return cursor.rowcount
+
+    def add(self, destination, duration, result, owner=DEFAULT_OWNER):
+        """Store a plan returned by TravelPlanner.plan_trip and return its trip ID"""
+        outline = result["outline"]
+        preview = outline[:PREVIEW_LENGTH] + "..." if len(outline) > PREVIEW_LENGTH else outline
+        now = time.time()
+        with self._lock:
+            self._touch(owner, now)
+            cursor = self._conn.execute(
+                "INSERT INTO trips (owner, created_at, destination, duration, outline_preview) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (owner, now, destination, duration, preview)
+            )
+            trip_id = cursor.lastrowid
+            self._conn.execute(
+                "INSERT INTO trip_plans (trip_id, outline, detailed_itinerary, packing_checklist) "
+                "VALUES (?, ?, ?, ?)",
+                (trip_id, outline, result["detailed_itinerary"], result["packing_checklist"])
+            )
+            self._conn.commit()
+        return trip_id
+
+    def list_page(self, owner=DEFAULT_OWNER, page_size=10, before=None, destination=None):
+        """Return up to page_size trip summaries, newest first.
+
+        before is the "cursor" of the last summary on the previous page; seeking from it
+        through the (owner, created_at, id) index keeps every page equally cheap no matter
+        how deep into the history it is. destination filters by exact, case-insensitive match.
+        """
+        query = "SELECT id, created_at, destination, duration, outline_preview FROM trips WHERE owner = ?"
+        params = [owner]
+        if destination:
+            query += " AND destination = ?"
+            params.append(destination.strip())
+        if before is not None:
+            query += " AND (created_at, id) < (?, ?)"
+            params.extend(before)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(page_size)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {
+                "id": row["id"],
+                "destination": row["destination"],
+                "duration": row["duration"],
+                "date": datetime.fromtimestamp(row["created_at"]).strftime("%Y-%m-%d %H:%M"),
+                "outline_preview": row["outline_preview"],
+                "cursor": (row["created_at"], row["id"])
+            }
+            for row in rows
+        ]
+
+    def get_plan(self, trip_id, owner=DEFAULT_OWNER):
+        """Load the full outline, itinerary and checklist of one of owner's trips, or None if it is gone"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT p.outline, p.detailed_itinerary, p.packing_checklist FROM trip_plans p "
+                "JOIN trips t ON t.id = p.trip_id WHERE p.trip_id = ? AND t.owner = ?",
+                (trip_id, owner)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def delete(self, trip_id, owner=DEFAULT_OWNER):
+        """Remove one of owner's trips and its plan"""
+        with self._lock:
+            self._conn.execute("DELETE FROM trips WHERE id = ? AND owner = ?", (trip_id, owner))
+            self._conn.commit()
+
+    def close(self):
+        """Close the underlying SQLite connection"""
+        with self._lock:
+            self._conn.close()
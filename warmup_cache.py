@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Cache Warm-up Job
+Precomputes outlines, itineraries and packing checklists for popular destinations at
+every duration the app offers, so peak-hour requests for common trips are answered
+from the LLM response cache without calling a model.
+
+The destinations file has one destination per line (blank lines and # comments are
+ignored). Trips are planned with the shared preferences file, as the app plans them,
+which is what makes their cache keys match (chat history is not part of the key).
+Use the spelling users type, since cache keys are case-sensitive.
+
+Finished trips are recorded in a state file; re-running skips trips warmed within
+--max-age-hours (keep it below the cache TTL) and retries the ones that failed, so
+the job can be interrupted, stopped at the end of its off-peak window, or run nightly.
+
+Usage:
+    python warmup_cache.py destinations.txt --trips-per-minute 6 --window 01:00-06:00
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Add the current directory to Python path to import main
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import DURATION_OPTIONS
+from batch_plan import BatchPlanner, percentile
+from llm_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES, DEFAULT_TTL_SECONDS
+from preferences import PreferenceIndex, PreferenceStore
+
+
+DEFAULT_STATE_PATH = "warmup_state.jsonl"
+# Re-warm a day before cached responses expire
+DEFAULT_MAX_AGE_HOURS = DEFAULT_TTL_SECONDS / 3600 - 24
+
+
+def read_destinations(path):
+    """Destinations listed in a text file, without duplicates, in file order"""
+    destinations = []
+    with open(path, 'r') as f:
+        for line in f:
+            destination = line.split("#", 1)[0].strip()
+            if destination and destination not in destinations:
+                destinations.append(destination)
+    return destinations
+
+
+def preferences_fingerprint(preferences_file):
+    """Short hash of the preferences prompt; warmed trips go stale when preferences change"""
+    preferences = PreferenceIndex(PreferenceStore(preferences_file).load()).as_prompt()
+    return hashlib.sha256(preferences.encode("utf-8")).hexdigest()[:12]
+
+
+def trip_key(destination, duration, fingerprint):
+    return f"{destination}|{duration}|{fingerprint}"
+
+
+def load_state(state_path, max_age_seconds):
+    """Keys of trips warmed recently enough to skip"""
+    if not os.path.exists(state_path):
+        return set()
+    cutoff = time.time() - max_age_seconds
+    fresh = set()
+    with open(state_path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash
+                continue
+            if entry.get("completed_at", 0) >= cutoff:
+                fresh.add(entry["key"])
+    return fresh
+
+
+def estimated_cache_entries(destinations, durations):
+    """Responses a full warm-up stores: an outline, one entry per itinerary day and a packing list per trip"""
+    return len(destinations) * sum(duration + 2 for duration in durations)
+
+
+class OffPeakWindow:
+    """Daily local-time window such as "01:00-06:00" (may wrap past midnight)"""
+
+    def __init__(self, spec):
+        try:
+            start, end = spec.split("-")
+            self.start = datetime.time.fromisoformat(start.strip())
+            self.end = datetime.time.fromisoformat(end.strip())
+        except ValueError:
+            raise ValueError(f"Invalid window {spec!r}, expected HH:MM-HH:MM")
+
+    def contains(self, now):
+        moment = now.time()
+        if self.start <= self.end:
+            return self.start <= moment < self.end
+        return moment >= self.start or moment < self.end
+
+    def seconds_until_open(self, now):
+        if self.contains(now):
+            return 0.0
+        opening = datetime.datetime.combine(now.date(), self.start)
+        if opening <= now:
+            opening += datetime.timedelta(days=1)
+        return (opening - now).total_seconds()
+
+
+class CacheWarmer:
+    """Plans every destination x duration trip through the response cache at a limited rate"""
+
+    def __init__(self, workers=2, trips_per_minute=6, preferences_file="user_preferences.json",
+                 cache_path=DEFAULT_CACHE_PATH, refresh=False, window=None):
+        self.workers = workers
+        # Trips started per minute; each costs two model calls plus one per itinerary day
+        self.trips_per_minute = trips_per_minute
+        self.preferences_file = preferences_file
+        self.window = window
+        # refresh=True regenerates trips even if their responses are still cached
+        self.planner = BatchPlanner(
+            workers=workers, preferences_file=preferences_file, use_cache=not refresh, cache_path=cache_path
+        )
+
+    def pending_trips(self, destinations, durations, state_path, max_age_seconds):
+        """(key, destination, duration) for every trip not warmed recently, shortest trips first"""
+        done = load_state(state_path, max_age_seconds)
+        fingerprint = preferences_fingerprint(self.preferences_file)
+        return [
+            (key, destination, duration)
+            for duration in sorted(durations)
+            for destination in destinations
+            for key in [trip_key(destination, duration, fingerprint)]
+            if key not in done
+        ]
+
+    def _wait_for_window(self):
+        """Block until the off-peak window opens"""
+        delay = self.window.seconds_until_open(datetime.datetime.now())
+        if delay > 0:
+            print(f"🌙 Waiting {delay / 3600:.1f}h for the off-peak window to open...")
+            time.sleep(delay)
+
+    def run(self, trips, state_path):
+        """Warm the given trips, returning the collected statistics"""
+        if self.window is not None:
+            self._wait_for_window()
+
+        interval = 60.0 / self.trips_per_minute if self.trips_per_minute else 0.0
+        next_start = time.monotonic()
+        latencies = []
+        succeeded = 0
+        failed = 0
+        skipped = 0
+        start = time.perf_counter()
+
+        with open(state_path, 'a') as state, ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {}
+
+            def drain(return_when):
+                nonlocal succeeded, failed
+                finished, _ = wait(pending, return_when=return_when)
+                for future in finished:
+                    key = pending.pop(future)
+                    record = future.result()
+                    latencies.append(record["latency_s"])
+                    if record["status"] == "ok":
+                        succeeded += 1
+                        state.write(json.dumps({"key": key, "completed_at": time.time()}) + "\n")
+                        state.flush()
+                        print(f"🔥 {record['destination']}, {record['duration']} days ({record['latency_s']:.1f}s)")
+                    else:
+                        failed += 1
+                        print(f"❌ {record['destination']}, {record['duration']} days: {record['error']}")
+
+            for index, (key, destination, duration) in enumerate(trips):
+                if self.window is not None and not self.window.contains(datetime.datetime.now()):
+                    skipped = len(trips) - index
+                    print(f"🌅 Off-peak window closed; {skipped} trips left for the next run")
+                    break
+                # Pace trip starts evenly instead of bursting against the provider rate limits
+                time.sleep(max(0.0, next_start - time.monotonic()))
+                next_start = max(next_start, time.monotonic()) + interval
+
+                request = {"destination": destination, "duration": duration}
+                pending[pool.submit(self.planner.plan, key, request)] = key
+                if len(pending) >= self.workers:
+                    drain(FIRST_COMPLETED)
+            while pending:
+                drain(FIRST_COMPLETED)
+
+        elapsed = time.perf_counter() - start
+        return {
+            "succeeded": succeeded,
+            "failed": failed,
+            "skipped": skipped,
+            "elapsed_s": elapsed,
+            "latency_p50_s": percentile(latencies, 50),
+            "latency_p90_s": percentile(latencies, 90)
+        }
+
+
+def main():
+    """Parse arguments and warm the cache"""
+    parser = argparse.ArgumentParser(description="Precompute plans for popular destinations into the response cache")
+    parser.add_argument("destinations", help="Text file with one destination per line")
+    parser.add_argument("--durations", type=int, nargs="+", default=DURATION_OPTIONS,
+                        help="Trip lengths to warm (default: the app's duration options)")
+    parser.add_argument("--workers", type=int, default=2, help="Number of trips planned concurrently")
+    parser.add_argument("--trips-per-minute", type=float, default=6,
+                        help="Maximum trips started per minute (0 for no limit)")
+    parser.add_argument("--window", help="Only start trips within this local time window, e.g. 01:00-06:00")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH, help="File recording warmed trips")
+    parser.add_argument("--max-age-hours", type=float, default=DEFAULT_MAX_AGE_HOURS,
+                        help="Re-warm trips last warmed longer ago than this")
+    parser.add_argument("--preferences-file", default="user_preferences.json",
+                        help="Preferences the app plans with")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help="LLM response cache the app reads")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Regenerate responses even when they are already cached")
+    args = parser.parse_args()
+
+    try:
+        window = OffPeakWindow(args.window) if args.window else None
+        destinations = read_destinations(args.destinations)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    entries = estimated_cache_entries(destinations, args.durations)
+    if entries > DEFAULT_MAX_ENTRIES:
+        print(f"Warning: A full warm-up stores about {entries} responses, more than the cache keeps "
+              f"({DEFAULT_MAX_ENTRIES}); the oldest will be evicted")
+
+    warmer = CacheWarmer(
+        workers=args.workers,
+        trips_per_minute=args.trips_per_minute,
+        preferences_file=args.preferences_file,
+        cache_path=args.cache_path,
+        refresh=args.refresh,
+        window=window
+    )
+    trips = warmer.pending_trips(destinations, args.durations, args.state, args.max_age_hours * 3600)
+    total = len(destinations) * len(args.durations)
+    print(f"🚀 Warming {len(trips)} of {total} trips ({total - len(trips)} still fresh) "
+          f"with {args.workers} workers...")
+    try:
+        stats = warmer.run(trips, args.state)
+    except KeyboardInterrupt:
+        print(f"\n🛑 Interrupted. Re-run the same command to resume from {args.state}")
+        return 1
+
+    print("\n" + "=" * 60)
+    print(f"Warmed:   {stats['succeeded']} trips ({stats['failed']} failed, {stats['skipped']} left for later)")
+    print(f"Elapsed:  {stats['elapsed_s']:.1f}s")
+    print(f"Latency:  p50 {stats['latency_p50_s']:.2f}s | p90 {stats['latency_p90_s']:.2f}s")
+    return 0 if stats["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())